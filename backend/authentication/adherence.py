@@ -0,0 +1,265 @@
+"""Adherence rollups and streaks.
+
+A reminder is due on every day from its creation until yesterday, except
+the days it was switched off (ReminderPause), and on any day it has a
+ReminderLog. Days are dates in the reminder's own time zone.
+
+AdherenceRollup keeps due vs taken day counts per day and per week, for
+each reminder and for each user's reminders combined, so reading a year
+of adherence reads ~52 week rows instead of every log.
+
+Rollups are rebuilt a week at a time from that week's logs: writing
+logs refreshes the weeks they fall in (refresh_adherence), and the
+rollup_adherence command rebuilds recent weeks nightly so that days
+with no log at all count as missed. Streaks are recounted from the day
+rollups, walking back only as far as the current streak goes.
+
+Rebuilds and recounts run in one transaction that first locks the user
+rows, so concurrent refreshes of the same user take turns instead of
+both writing rows from stale counts.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .archive import reminder_log_days
+from .models import AdherenceRollup, AdherenceStreak, Reminder, ReminderPause, User, local_today
+
+ADHERENCE_WEEKS = 52
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _weeks_filter(field, weeks):
+    condition = Q()
+    for week in weeks:
+        condition |= Q(**{f'{field}__range': (week, week + timedelta(days=6))})
+    return condition
+
+
+def _user_today(timezones, now=None):
+    # Overall days run up to the date of the user's furthest-ahead time zone
+    return max((local_today(name, now) for name in set(timezones)), default=timezone.localdate(now))
+
+
+def _lock_users(user_ids):
+    # A no-op on SQLite, where the production profile's BEGIN IMMEDIATE
+    # already serializes writing transactions
+    list(User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def rebuild_rollups(user_ids, weeks, today=None):
+    """Recompute the day and week rollups of ``user_ids`` for the weeks
+    starting on the dates in ``weeks``. Returns the number of rollup rows
+    those weeks now have. ``today`` overrides each reminder's own date."""
+    weeks = sorted(set(weeks))
+    if not weeks or not user_ids:
+        return 0
+
+    with transaction.atomic():
+        _lock_users(user_ids)
+        return _rebuild_rollups(user_ids, weeks, today)
+
+
+def _rebuild_rollups(user_ids, weeks, today):
+    now = timezone.now()
+    reminders = list(
+        Reminder.objects.filter(user_id__in=user_ids).values_list('id', 'user_id', 'timezone', 'created_at')
+    )
+    pauses = defaultdict(list)
+    for reminder_id, start, end in ReminderPause.objects.filter(reminder__user_id__in=user_ids).values_list(
+        'reminder_id', 'start', 'end',
+    ):
+        pauses[reminder_id].append((start, end or date.max))
+    logged, taken = defaultdict(set), defaultdict(set)
+    week_set = set(weeks)
+    for reminder_id, day, was_taken in reminder_log_days(weeks[0], weeks[-1] + timedelta(days=6), user_id__in=user_ids):
+        if week_start(day) not in week_set:
+            continue
+        logged[reminder_id].add(day)
+        if was_taken:
+            taken[reminder_id].add(day)
+
+    # {(user_id, reminder_id or None, period, period_start): [scheduled, taken]}
+    counts = defaultdict(lambda: [0, 0])
+    for reminder_id, user_id, tz_name, created_at in reminders:
+        first = created_at.astimezone(ZoneInfo(tz_name)).date()
+        last = (today or local_today(tz_name, now)) - timedelta(days=1)
+        paused = pauses[reminder_id]
+        for week in weeks:
+            if (week > last or week + timedelta(days=6) < first) and not logged[reminder_id]:
+                continue
+            for offset in range(7):
+                day = week + timedelta(days=offset)
+                due = first <= day <= last and not any(start <= day < end for start, end in paused)
+                if not (due or day in logged[reminder_id]):
+                    continue
+                was_taken = day in taken[reminder_id]
+                for key in (reminder_id, None):
+                    for period, start in ((AdherenceRollup.PERIOD_DAY, day), (AdherenceRollup.PERIOD_WEEK, week)):
+                        bucket = counts[user_id, key, period, start]
+                        bucket[0] += 1
+                        bucket[1] += was_taken
+
+    # Upsert by hand: SQLite's ON CONFLICT can't target the partial unique
+    # constraints that keep the overall (NULL reminder) rows unique
+    existing = {
+        (row.user_id, row.reminder_id, row.period, row.period_start): row
+        for row in AdherenceRollup.objects.filter(_weeks_filter('period_start', weeks), user_id__in=user_ids)
+    }
+    created, updated = [], []
+    for (user_id, reminder_id, period, start), (scheduled, taken_count) in counts.items():
+        row = existing.pop((user_id, reminder_id, period, start), None)
+        if row is None:
+            created.append(AdherenceRollup(
+                user_id=user_id, reminder_id=reminder_id, period=period, period_start=start,
+                scheduled=scheduled, taken=taken_count,
+            ))
+        elif (row.scheduled, row.taken) != (scheduled, taken_count):
+            row.scheduled, row.taken = scheduled, taken_count
+            updated.append(row)
+    AdherenceRollup.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+    AdherenceRollup.objects.bulk_update(updated, ['scheduled', 'taken'], batch_size=2000)
+    AdherenceRollup.objects.bulk_create(created, batch_size=2000)
+    return len(counts)
+
+
+def _streak(days, today):
+    """Return (length, last_day) of the run of fully taken days, newest
+    first, that ends the (day, scheduled, taken) sequence ``days``. Today
+    only counts once taken; a missed or skipped day ends the run."""
+    length, last_day, expected = 0, None, None
+    for day, scheduled, taken in days:
+        if day == today and taken < scheduled:
+            continue
+        if taken < scheduled or (expected is not None and day != expected):
+            break
+        length += 1
+        last_day = last_day or day
+        expected = day - timedelta(days=1)
+    return length, last_day
+
+
+def _longest_streak(days):
+    """Longest run of consecutive fully taken days, oldest first."""
+    longest = run = 0
+    previous = None
+    for day, scheduled, taken in days:
+        if taken < scheduled:
+            run = 0
+        elif previous is not None and day == previous + timedelta(days=1) and run:
+            run += 1
+        else:
+            run = 1
+        previous = day
+        longest = max(longest, run)
+    return longest
+
+
+def refresh_streaks(user_id, reminder_ids=None, full=False, today=None):
+    """Recount the current streaks of the user's ``reminder_ids`` (all of
+    their reminders when None) and of the user overall. ``full`` also
+    recounts the longest streaks from all history; otherwise they only
+    grow to match the current streak."""
+    with transaction.atomic():
+        _lock_users([user_id])
+        _refresh_streaks(user_id, reminder_ids, full, today)
+
+
+def _refresh_streaks(user_id, reminder_ids, full, today):
+    now = timezone.now()
+    timezones = dict(Reminder.objects.filter(user_id=user_id).values_list('id', 'timezone'))
+    if reminder_ids is None:
+        reminder_ids = list(timezones)
+    todays = {reminder_id: today or local_today(timezones[reminder_id], now)
+              for reminder_id in reminder_ids if reminder_id in timezones}
+    todays[None] = today or _user_today(timezones.values(), now)
+
+    day_rows = AdherenceRollup.objects.filter(user_id=user_id, period=AdherenceRollup.PERIOD_DAY)
+    existing = {
+        streak.reminder_id: streak for streak in AdherenceStreak.objects.filter(
+            Q(reminder__isnull=True) | Q(reminder_id__in=list(todays)), user_id=user_id,
+        )
+    }
+    created, updated = [], []
+    for reminder_id, day in todays.items():
+        rows = day_rows.filter(reminder_id=reminder_id) if reminder_id else day_rows.filter(reminder__isnull=True)
+        values = rows.values_list('period_start', 'scheduled', 'taken')
+        current, last_day = _streak(values.order_by('-period_start').iterator(chunk_size=100), day)
+        streak = existing.get(reminder_id)
+        if streak is None:
+            streak = AdherenceStreak(user_id=user_id, reminder_id=reminder_id)
+            created.append(streak)
+        else:
+            updated.append(streak)
+        if full:
+            streak.longest = _longest_streak(values.order_by('period_start').iterator(chunk_size=2000))
+        streak.current, streak.last_day = current, last_day
+        streak.longest = max(streak.longest, current)
+
+    # Not bulk_create(update_conflicts=True), as for the rollups: the user
+    # lock keeps a concurrent refresh from inserting the same rows
+    AdherenceStreak.objects.bulk_update(updated, ['current', 'longest', 'last_day'])
+    AdherenceStreak.objects.bulk_create(created)
+
+
+def refresh_adherence(user_id, days, reminder_ids=None, today=None):
+    """Bring the user's rollups and streaks up to date after logs on
+    ``days`` were written for ``reminder_ids``."""
+    rebuild_rollups([user_id], {week_start(day) for day in days}, today)
+    refresh_streaks(user_id, reminder_ids, today=today)
+
+
+def adherence_summary(user, weeks=ADHERENCE_WEEKS, today=None):
+    """Week-by-week and per-reminder adherence of ``user`` over the last
+    ``weeks`` weeks, read from week rollups and streaks only."""
+    now = timezone.now()
+    reminders = list(
+        Reminder.objects.filter(user=user).order_by('-active', 'medicine_name')
+        .values_list('id', 'medicine_name', 'timezone')
+    )
+    user_today = today or _user_today([name for _, _, name in reminders], now)
+    since = week_start(user_today) - timedelta(weeks=weeks - 1)
+    rows = AdherenceRollup.objects.filter(
+        user=user, period=AdherenceRollup.PERIOD_WEEK, period_start__gte=since,
+    ).values_list('reminder_id', 'period_start', 'scheduled', 'taken')
+
+    series, totals = [], defaultdict(lambda: [0, 0])
+    for reminder_id, start, scheduled, taken in rows.order_by('period_start'):
+        totals[reminder_id][0] += scheduled
+        totals[reminder_id][1] += taken
+        if reminder_id is None:
+            series.append({'week_start': start, 'scheduled': scheduled, 'taken': taken, 'rate': _rate(scheduled, taken)})
+
+    streaks = {streak.reminder_id: streak for streak in AdherenceStreak.objects.filter(user=user)}
+
+    def entry(reminder_id, day):
+        scheduled, taken = totals.get(reminder_id, (0, 0))
+        streak = streaks.get(reminder_id)
+        return {
+            'scheduled': scheduled,
+            'taken': taken,
+            'rate': _rate(scheduled, taken),
+            'current_streak': streak.current_as_of(day) if streak else 0,
+            'longest_streak': streak.longest if streak else 0,
+        }
+
+    return {
+        'since': since,
+        'overall': entry(None, user_today),
+        'weeks': series,
+        'reminders': [
+            {'id': pk, 'medicine_name': name, **entry(pk, today or local_today(tz_name, now))}
+            for pk, name, tz_name in reminders
+        ],
+    }
+
+
+def _rate(scheduled, taken):
+    return round(taken / scheduled, 4) if scheduled else None
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, PharmacyLocation, Medicine, Inventory, CustomerLocation
+from .models import User, PharmacyLocation, Medicine, Inventory, CustomerLocation, ImportJob
+from .search import medicine_name_filter
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -28,9 +29,15 @@ class PharmacyLocationAdmin(admin.ModelAdmin):
 class MedicineAdmin(admin.ModelAdmin):
     list_display = ('name', 'generic_name', 'category', 'created_at')
     list_filter = ('category', 'created_at')
-    search_fields = ('name', 'generic_name', 'description')
+    search_fields = ('name', 'generic_name')
     ordering = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served from the trigram index instead of LIKE '%term%' scans
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(medicine_name_filter(search_term)), False
+
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
     list_display = ('medicine', 'pharmacy', 'quantity', 'price', 'is_available', 'expiry_date')
@@ -38,6 +45,14 @@ class InventoryAdmin(admin.ModelAdmin):
     search_fields = ('medicine__name', 'pharmacy__username')
     ordering = ('-created_at',)
 
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'pharmacy', 'status', 'processed_rows', 'failed_rows', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('file_name', 'pharmacy__username')
+    ordering = ('-created_at',)
+    exclude = ('error_rows',)
+
 @admin.register(CustomerLocation)
 class CustomerLocationAdmin(admin.ModelAdmin):
     list_display = ('user', 'address', 'created_at')
@@ -0,0 +1,113 @@
+"""Monthly bitset archive of old ReminderLog rows.
+
+Once a month is further back than ReminderLog.EDITABLE_DAYS, no more
+logs can be written to it, and its logs are folded into one
+ReminderLogArchive row per reminder: two 31-bit masks instead of up to
+31 rows, each with its own timestamp and unique index entry.
+reminder_log_days() reads both stores and merges them, so callers don't
+care which days have been archived.
+"""
+import calendar
+from datetime import date, timedelta
+from itertools import groupby
+
+from django.db import transaction
+
+from .models import ReminderLog, ReminderLogArchive
+
+COMPACT_BATCH_SIZE = 500
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def archive_cutoff(today=None):
+    """First day of the earliest month that must stay as live rows."""
+    today = today or date.today()
+    return month_start(today - timedelta(days=ReminderLog.EDITABLE_DAYS))
+
+
+def fold_month(days):
+    """Return (logged, taken) bitsets for an iterable of (date, taken)."""
+    logged = taken = 0
+    for day, was_taken in days:
+        bit = 1 << (day.day - 1)
+        logged |= bit
+        if was_taken:
+            taken |= bit
+    return logged, taken
+
+
+def unfold_month(month, logged, taken):
+    """Yield (date, taken) for each logged day of an archive row."""
+    for day in range(1, calendar.monthrange(month.year, month.month)[1] + 1):
+        bit = 1 << (day - 1)
+        if logged & bit:
+            yield month.replace(day=day), bool(taken & bit)
+
+
+def reminder_log_days(start, end, **filters):
+    """Yield (reminder_id, date, taken), in no particular order, for logs
+    dated ``start`` to ``end`` inclusive, from live rows and the archive.
+    ``filters`` apply to Reminder, e.g. ``user_id__in=[...]``. A live row
+    wins over an archived bit for the same day."""
+    reminder_filter = {f'reminder__{key}': value for key, value in filters.items()}
+    live = {
+        (reminder_id, day): taken
+        for reminder_id, day, taken in ReminderLog.objects.filter(date__range=(start, end), **reminder_filter)
+        .values_list('reminder_id', 'date', 'taken').iterator(chunk_size=5000)
+    }
+    yield from ((reminder_id, day, taken) for (reminder_id, day), taken in live.items())
+
+    archived = ReminderLogArchive.objects.filter(
+        month__range=(month_start(start), end), **reminder_filter,
+    ).values_list('reminder_id', 'month', 'logged', 'taken')
+    for reminder_id, month, logged, taken in archived.iterator(chunk_size=5000):
+        for day, was_taken in unfold_month(month, logged, taken):
+            if start <= day <= end and (reminder_id, day) not in live:
+                yield reminder_id, day, was_taken
+
+
+def compact_reminder_logs(before=None, batch_size=COMPACT_BATCH_SIZE):
+    """Fold ReminderLog rows dated before ``before`` (default:
+    archive_cutoff()) into monthly archive rows, merging with any archive
+    row already there, and delete them. Returns (logs folded, archive
+    rows written)."""
+    before = month_start(before or archive_cutoff())
+    folded = written = 0
+    while True:
+        reminder_ids = list(
+            ReminderLog.objects.filter(date__lt=before).order_by('reminder_id')
+            .values_list('reminder_id', flat=True).distinct()[:batch_size]
+        )
+        if not reminder_ids:
+            return folded, written
+        with transaction.atomic():
+            logs = (
+                ReminderLog.objects.filter(reminder_id__in=reminder_ids, date__lt=before)
+                .order_by('reminder_id', 'date').values_list('reminder_id', 'date', 'taken')
+            )
+            months = {}
+            for (reminder_id, month), days in groupby(logs, key=lambda row: (row[0], month_start(row[1]))):
+                days = list(days)
+                months[reminder_id, month] = fold_month((day, taken) for _, day, taken in days)
+                folded += len(days)
+
+            existing = ReminderLogArchive.objects.filter(
+                reminder_id__in=reminder_ids, month__lt=before,
+            ).values_list('reminder_id', 'month', 'logged', 'taken')
+            for reminder_id, month, logged, taken in existing:
+                if (reminder_id, month) in months:
+                    new_logged, new_taken = months[reminder_id, month]
+                    # Days logged again since the last compaction replace their archived bit
+                    months[reminder_id, month] = (logged | new_logged, (taken & ~new_logged) | new_taken)
+            ReminderLogArchive.objects.bulk_create(
+                [ReminderLogArchive(reminder_id=reminder_id, month=month, logged=logged, taken=taken)
+                 for (reminder_id, month), (logged, taken) in months.items()],
+                update_conflicts=True,
+                unique_fields=['reminder', 'month'],
+                update_fields=['logged', 'taken'],
+            )
+            ReminderLog.objects.filter(reminder_id__in=reminder_ids, date__lt=before).delete()
+        written += len(months)
@@ -0,0 +1,281 @@
+"""In-process indexes over the Medicine catalog.
+
+``medicine_names`` holds a trigram inverted index used for typo-tolerant
+lookups ("amoxcillin" -> "Amoxicillin") and a sorted prefix index used for
+autocomplete. Both are built lazily on first use, kept current by the
+Medicine signals in ``signals.py`` and catch up with changes made by
+other processes (on every fuzzy lookup, at most every
+AUTOCOMPLETE_REFRESH_SECONDS for autocomplete): new medicines are read
+by id, while renames and deletes bump the shared CATALOG_GENERATION,
+which makes every process rebuild its indexes.
+"""
+import bisect
+import re
+import threading
+import time
+from array import array
+
+import numpy as np
+
+NGRAM_SIZE = 3
+
+AUTOCOMPLETE_REFRESH_SECONDS = 30
+
+# CacheGeneration key bumped when a medicine is renamed or deleted
+CATALOG_GENERATION = 'medicine-names'
+
+_non_alnum = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_name(text):
+    """Lowercase and collapse punctuation/whitespace to single spaces."""
+    return _non_alnum.sub(' ', text.lower()).strip()
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    """Distinct character n-grams of a normalized, space-padded string."""
+    padded = ' ' * (n - 1) + text + ' '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NgramIndex:
+    """Inverted index from character trigrams to catalog entries.
+
+    Each indexed string is an entry; several entries may share a key (a
+    medicine's name and generic name). Posting lists are compact int32
+    arrays, and a lookup scores every candidate at once with
+    ``np.bincount`` using the Dice coefficient of the trigram sets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._entry_keys = array('q')
+        self._entry_sizes = array('i')
+        self._entry_alive = bytearray()
+        self._entries_by_key = {}
+
+    def __len__(self):
+        return len(self._entries_by_key)
+
+    def add(self, key, *texts):
+        """Index ``texts`` under ``key``, replacing anything indexed for it."""
+        with self._lock:
+            self._remove(key)
+            entries = []
+            for text in texts:
+                grams = ngrams(normalize_name(text or ''))
+                if len(grams) <= 1:
+                    continue
+                entry = len(self._entry_keys)
+                self._entry_keys.append(key)
+                self._entry_sizes.append(len(grams))
+                self._entry_alive.append(1)
+                for gram in grams:
+                    self._postings.setdefault(gram, array('i')).append(entry)
+                entries.append(entry)
+            if entries:
+                self._entries_by_key[key] = entries
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        # Entries are tombstoned; their postings are skipped at lookup time
+        for entry in self._entries_by_key.pop(key, ()):
+            self._entry_alive[entry] = 0
+
+    def search(self, query, limit=10, min_similarity=0.4):
+        """Return up to ``limit`` (key, similarity) pairs, best first."""
+        grams = ngrams(normalize_name(query))
+        # Everything runs under the lock: the numpy views below borrow the
+        # posting buffers, which cannot be resized while they are exported.
+        with self._lock:
+            postings = [np.frombuffer(self._postings[g], dtype=np.int32) for g in grams if g in self._postings]
+            if not postings:
+                return []
+            size = len(self._entry_keys)
+            overlap = np.bincount(np.concatenate(postings), minlength=size)
+            del postings
+            scores = 2.0 * overlap / (len(grams) + np.frombuffer(self._entry_sizes, dtype=np.int32))
+            scores[np.frombuffer(self._entry_alive, dtype=np.uint8) == 0] = 0
+
+            candidates = np.flatnonzero(scores >= min_similarity)
+            if len(candidates) == 0:
+                return []
+            # Over-fetch so duplicate keys (name + generic name) still fill the limit
+            fetch = min(len(candidates), limit * 2)
+            top = candidates[np.argpartition(-scores[candidates], fetch - 1)[:fetch]]
+            top = top[np.argsort(-scores[top], kind='stable')]
+
+            results = {}
+            for entry in top.tolist():
+                key = self._entry_keys[entry]
+                if key not in results:
+                    results[key] = float(scores[entry])
+                    if len(results) == limit:
+                        break
+            return list(results.items())
+
+
+class PrefixIndex:
+    """Sorted list of (normalized text, display text, key) answering
+    prefix queries with two binary searches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._entries_by_key = {}
+
+    def add(self, key, *texts):
+        with self._lock:
+            self._remove(key)
+            entries = [(normalize_name(text), text, key) for text in texts if text and normalize_name(text)]
+            for entry in entries:
+                bisect.insort(self._entries, entry)
+            if entries:
+                self._entries_by_key[key] = entries
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        for entry in self._entries_by_key.pop(key, ()):
+            index = bisect.bisect_left(self._entries, entry)
+            if index < len(self._entries) and self._entries[index] == entry:
+                del self._entries[index]
+
+    def load(self, rows):
+        """Bulk-add (key, *texts) rows with one sort instead of an insort each."""
+        with self._lock:
+            for key, *texts in rows:
+                self._remove(key)
+                entries = [(normalize_name(text), text, key) for text in texts if text and normalize_name(text)]
+                self._entries.extend(entries)
+                if entries:
+                    self._entries_by_key[key] = entries
+            self._entries.sort()
+
+    def has_leading_word(self, word):
+        """Whether some indexed text starts with the whole word ``word``."""
+        word = normalize_name(word)
+        if not word:
+            return False
+        with self._lock:
+            index = bisect.bisect_left(self._entries, (word,))
+            while index < len(self._entries):
+                normalized = self._entries[index][0]
+                if not normalized.startswith(word):
+                    return False
+                if len(normalized) == len(word) or normalized[len(word)] == ' ':
+                    return True
+                index += 1
+        return False
+
+    def search(self, prefix, limit=10):
+        """Up to ``limit`` distinct display texts starting with ``prefix``."""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        results = []
+        with self._lock:
+            index = bisect.bisect_left(self._entries, (prefix,))
+            while index < len(self._entries) and len(results) < limit:
+                normalized, text, key = self._entries[index]
+                if not normalized.startswith(prefix):
+                    break
+                if text not in results:
+                    results.append(text)
+                index += 1
+        return results
+
+
+class MedicineNameIndex:
+    """Trigram and prefix indexes over Medicine.name and Medicine.generic_name."""
+
+    def __init__(self):
+        self.ngrams = NgramIndex()
+        self.prefixes = PrefixIndex()
+        self._loaded = False
+        # Highest id read by refresh(). Medicines saved by this process are
+        # indexed at once but don't move it: another process may still
+        # create lower ids, which the next refresh has to pick up.
+        self._scanned_id = 0
+        self._local_ids = set()
+        self._generation = None
+        self._refreshed_at = 0.0
+        self._load_lock = threading.Lock()
+
+    def add_medicine(self, medicine):
+        with self._load_lock:
+            if not self._loaded:
+                return
+            self.ngrams.add(medicine.pk, medicine.name, medicine.generic_name)
+            self.prefixes.add(medicine.pk, medicine.name, medicine.generic_name)
+            if medicine.pk > self._scanned_id:
+                self._local_ids.add(medicine.pk)
+
+    def remove_medicine(self, medicine):
+        if self._loaded:
+            self.ngrams.remove(medicine.pk)
+            self.prefixes.remove(medicine.pk)
+
+    def refresh(self, max_age=0):
+        """Load the catalog on first use, then only medicines created since
+        (by any process), or all of it again once another process renamed
+        or deleted one. Skipped when the last refresh is younger than
+        ``max_age`` seconds."""
+        from .models import CacheGeneration, Medicine
+
+        if self._loaded and time.monotonic() - self._refreshed_at < max_age:
+            return
+        with self._load_lock:
+            # Read before the rows, so a change committed in between is
+            # seen again next time
+            generation = CacheGeneration.get_many([CATALOG_GENERATION]).get(CATALOG_GENERATION)
+            ngram_index, prefix_index = self.ngrams, self.prefixes
+            if self._loaded and generation != self._generation:
+                # Built aside and swapped in, so lookups meanwhile use the old ones
+                ngram_index, prefix_index = NgramIndex(), PrefixIndex()
+                self._scanned_id, self._local_ids = 0, set()
+
+            rows = Medicine.objects.filter(id__gt=self._scanned_id).values_list('id', 'name', 'generic_name')
+            batch = []
+            for pk, name, generic_name in rows.iterator(chunk_size=5000):
+                self._scanned_id = max(self._scanned_id, pk)
+                if pk in self._local_ids:
+                    continue
+                ngram_index.add(pk, name, generic_name)
+                batch.append((pk, name, generic_name))
+            if batch:
+                prefix_index.load(batch)
+            self.ngrams, self.prefixes = ngram_index, prefix_index
+            self._local_ids = {pk for pk in self._local_ids if pk > self._scanned_id}
+            self._generation = generation
+            self._loaded = True
+            self._refreshed_at = time.monotonic()
+
+    def match(self, query, limit=10, min_similarity=0.4):
+        """Medicine ids ranked by name similarity to ``query``."""
+        self.refresh()
+        return self.ngrams.search(query, limit=limit, min_similarity=min_similarity)
+
+    def complete(self, prefix, limit=10):
+        """Medicine names and generic names starting with ``prefix``."""
+        self.refresh(max_age=AUTOCOMPLETE_REFRESH_SECONDS)
+        return self.prefixes.search(prefix, limit=limit)
+
+    def names_in_text(self, text, min_length=4):
+        """Words of free text (e.g. an OCR'd prescription) that begin a
+        medicine name or generic name, in order of first appearance."""
+        self.refresh(max_age=AUTOCOMPLETE_REFRESH_SECONDS)
+        found = []
+        for word in normalize_name(text).split():
+            if len(word) >= min_length and word not in found and self.prefixes.has_leading_word(word):
+                found.append(word)
+        return found
+
+
+medicine_names = MedicineNameIndex()
@@ -0,0 +1,77 @@
+"""Streaming inventory export.
+
+Rows are read with QuerySet.iterator() and written out one at a time:
+CSV straight into a StreamingHttpResponse, XLSX through openpyxl's
+write-only mode into a temporary file that is then streamed back. Neither
+the queryset nor the workbook is ever held in memory as a whole. Columns
+match the bulk upload format, so an export can be edited and re-imported.
+"""
+import csv
+import tempfile
+
+from .importers import OPTIONAL_COLUMNS, REQUIRED_COLUMNS
+from .models import Inventory
+
+EXPORT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def export_queryset(pharmacy):
+    return (
+        Inventory.objects.filter(pharmacy=pharmacy)
+        .select_related('medicine')
+        .only(
+            'quantity', 'price', 'is_available', 'expiry_date',
+            'medicine__name', 'medicine__generic_name', 'medicine__description', 'medicine__category',
+        )
+        .order_by('medicine_name', 'id')
+    )
+
+
+def export_rows(pharmacy):
+    """Yield one list per inventory item, in EXPORT_COLUMNS order."""
+    for item in export_queryset(pharmacy).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        medicine = item.medicine
+        yield [
+            medicine.name,
+            item.quantity,
+            item.price,
+            medicine.generic_name,
+            medicine.description,
+            medicine.category,
+            item.expiry_date,
+            item.is_available,
+        ]
+
+
+def iter_csv(pharmacy):
+    """Yield the export as CSV text, one line at a time."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in export_rows(pharmacy):
+        row[6] = row[6].isoformat() if row[6] else ''
+        row[7] = 'TRUE' if row[7] else 'FALSE'
+        yield writer.writerow(row)
+
+
+def write_xlsx(pharmacy):
+    """Write the export to a temporary .xlsx file and return it, rewound."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Inventory')
+    sheet.append(EXPORT_COLUMNS)
+    for row in export_rows(pharmacy):
+        row[2] = float(row[2])
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
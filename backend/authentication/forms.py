@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from .models import User, PharmacyLocation, Medicine, Inventory, CustomerLocation, Reminder, Prescription
+from .models import User, PharmacyLocation, Medicine, Inventory, CustomerLocation, Reminder, Prescription, parse_times, timezone_names
 
 class UserRegistrationForm(UserCreationForm):
     phone_number = forms.CharField(
@@ -103,12 +103,81 @@ class MedicineSearchForm(forms.Form):
         help_text="Maximum distance in kilometers"
     )
 
+class BasketSearchForm(forms.Form):
+    MAX_MEDICINES = 10
+
+    medicine_names = forms.CharField(
+        required=False,
+        help_text="Comma-separated medicine names"
+    )
+    prescription = forms.IntegerField(
+        required=False,
+        help_text="Use the medicines found in one of your prescriptions"
+    )
+    max_distance = forms.IntegerField(
+        min_value=1,
+        max_value=50,
+        initial=10,
+        required=False,
+        help_text="Maximum distance in kilometers"
+    )
+
+    def clean_medicine_names(self):
+        names = [name.strip() for name in self.cleaned_data.get('medicine_names', '').split(',')]
+        names = list(dict.fromkeys(name for name in names if name))
+        if len(names) > self.MAX_MEDICINES:
+            raise forms.ValidationError(f"Search for at most {self.MAX_MEDICINES} medicines at once")
+        return names
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('medicine_names') and not cleaned_data.get('prescription'):
+            raise forms.ValidationError("Enter medicine names or choose a prescription")
+        if not cleaned_data.get('max_distance'):
+            cleaned_data['max_distance'] = 10
+        return cleaned_data
+
+class InventoryFilterForm(forms.Form):
+    STATUS_CHOICES = [
+        ('', 'All items'),
+        ('low', 'Low stock'),
+        ('expiring', 'Expiring soon'),
+        ('expired', 'Expired'),
+    ]
+    SORT_CHOICES = [
+        ('name', 'Name (A-Z)'),
+        ('quantity', 'Quantity (lowest first)'),
+        ('expiry', 'Expiry (soonest first)'),
+        ('price', 'Price (lowest first)'),
+        ('updated', 'Recently updated'),
+    ]
+
+    q = forms.CharField(
+        required=False,
+        max_length=200,
+        label="Name starts with",
+        widget=forms.TextInput(attrs={'placeholder': 'e.g., Para'})
+    )
+    status = forms.ChoiceField(choices=STATUS_CHOICES, required=False)
+    category = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={'placeholder': 'Any category'})
+    )
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
+
+    def clean_sort(self):
+        return self.cleaned_data.get('sort') or 'name'
+
 class BulkMedicineUploadForm(forms.Form):
+    # Files are streamed in batches, so the cap only guards disk and request time
+    MAX_UPLOAD_MB = 100
+
     excel_file = forms.FileField(
-        label="Excel File",
-        help_text="Upload an Excel file (.xlsx or .xls) with medicine details",
+        label="Inventory File",
+        help_text="Upload an Excel (.xlsx or .xls) or CSV (.csv) file with medicine details",
         widget=forms.FileInput(attrs={
-            'accept': '.xlsx,.xls',
+            'accept': '.xlsx,.xls,.csv',
             'class': 'form-control'
         })
     )
@@ -116,23 +185,39 @@ class BulkMedicineUploadForm(forms.Form):
     def clean_excel_file(self):
         file = self.cleaned_data.get('excel_file')
         if file:
-            if not file.name.endswith(('.xlsx', '.xls')):
-                raise forms.ValidationError("Please upload a valid Excel file (.xlsx or .xls)")
-            if file.size > 5 * 1024 * 1024:  # 5MB limit
-                raise forms.ValidationError("File size must be less than 5MB")
+            if not file.name.lower().endswith(('.xlsx', '.xls', '.csv')):
+                raise forms.ValidationError("Please upload a valid Excel or CSV file (.xlsx, .xls or .csv)")
+            if file.size > self.MAX_UPLOAD_MB * 1024 * 1024:
+                raise forms.ValidationError(f"File size must be less than {self.MAX_UPLOAD_MB}MB")
         return file
 
 
 class ReminderForm(forms.ModelForm):
+    timezone = forms.ChoiceField(initial='UTC', label="Time Zone")
+
     class Meta:
         model = Reminder
-        fields = ['medicine_name', 'times', 'notes', 'active']
+        fields = ['medicine_name', 'times', 'timezone', 'notes', 'active']
         widgets = {
             'medicine_name': forms.TextInput(attrs={'placeholder': 'e.g., Paracetamol 500mg'}),
             'times': forms.TextInput(attrs={'placeholder': 'e.g., 08:00, 14:00, 20:00'}),
             'notes': forms.TextInput(attrs={'placeholder': 'Optional notes like dosage'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['timezone'].choices = [(name, name) for name in sorted(timezone_names())]
+
+    def clean_times(self):
+        try:
+            minutes = parse_times(self.cleaned_data.get('times', ''), strict=True)
+        except ValueError as e:
+            raise forms.ValidationError(f"{e}; use 24h HH:MM, e.g. 08:00")
+        if not minutes:
+            raise forms.ValidationError("Enter at least one time")
+        # Stored normalized, e.g. "08:00, 20:00"
+        return ', '.join(f'{minute // 60:02d}:{minute % 60:02d}' for minute in minutes)
+
 
 class PrescriptionUploadForm(forms.ModelForm):
     class Meta:
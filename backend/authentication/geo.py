@@ -0,0 +1,137 @@
+"""Geographic helpers for pharmacy search.
+
+Pharmacies are bucketed into a fixed-degree grid so nearby searches only
+load rows from the cells that overlap the search circle.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# 0.1 degree cells are roughly 11 km tall, so a 10 km search touches a
+# handful of cells while a dense metro still splits across many of them.
+GRID_CELL_DEGREES = 0.1
+
+# Past this many cells the IN (...) list costs more than it saves, and the
+# plain bounding box is used on its own.
+MAX_GRID_CELLS = 400
+
+
+def grid_cell_for(lat, lng):
+    """Return the grid cell key ("row:col") containing the given point."""
+    row = math.floor((float(lat) + 90) / GRID_CELL_DEGREES)
+    col = math.floor((float(lng) + 180) / GRID_CELL_DEGREES)
+    # Longitude 180 is -180: wrap like grid_cells_for_box does
+    return f"{row}:{col % round(360 / GRID_CELL_DEGREES)}"
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing the search circle.
+
+    Longitudes are left unwrapped, so a box crossing the antimeridian has
+    min_lng < -180 or max_lng > 180.
+    """
+    lat, lng = float(lat), float(lng)
+    return expand_box((lat, lat, lng, lng), radius_km)
+
+
+def expand_box(box, radius_km):
+    """Grow a (min_lat, max_lat, min_lng, max_lng) box by ``radius_km`` on
+    every side, so it encloses the search circle around any point inside."""
+    min_lat, max_lat, min_lng, max_lng = box
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(min_lat - dlat, -90.0), min(max_lat + dlat, 90.0)
+    # The circle is widest in longitude at the latitude closest to a pole.
+    widest = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest))
+    if cos_lat < 1e-6:
+        dlng = 180.0
+    else:
+        dlng = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return min_lat, max_lat, min_lng - dlng, max_lng + dlng
+
+
+def quantize(lat, lng, cell_degrees):
+    """Snap a point to a cell of ``cell_degrees``; return (key, cell box)."""
+    row = math.floor((float(lat) + 90) / cell_degrees)
+    col = math.floor((float(lng) + 180) / cell_degrees)
+    min_lat = row * cell_degrees - 90
+    min_lng = col * cell_degrees - 180
+    return f"{row}:{col}", (min_lat, min_lat + cell_degrees, min_lng, min_lng + cell_degrees)
+
+
+def grid_cells_for_box(min_lat, max_lat, min_lng, max_lng):
+    """Return the keys of every grid cell overlapping the box, or None if
+    there are more than MAX_GRID_CELLS of them."""
+    cols_per_row = round(360 / GRID_CELL_DEGREES)
+    row_lo = math.floor((min_lat + 90) / GRID_CELL_DEGREES)
+    row_hi = math.floor((max_lat + 90) / GRID_CELL_DEGREES)
+    col_lo = math.floor((min_lng + 180) / GRID_CELL_DEGREES)
+    col_hi = math.floor((max_lng + 180) / GRID_CELL_DEGREES)
+    ncols = min(col_hi - col_lo + 1, cols_per_row)
+    if (row_hi - row_lo + 1) * ncols > MAX_GRID_CELLS:
+        return None
+    return [
+        f"{row}:{(col_lo + offset) % cols_per_row}"
+        for row in range(row_lo, row_hi + 1)
+        for offset in range(ncols)
+    ]
+
+
+def nearby_location_filter(lat, lng, radius_km, prefix=''):
+    """Build filter kwargs that restrict a queryset to PharmacyLocations
+    whose grid cell and coordinates fall inside the search circle's
+    bounding box.
+
+    ``prefix`` is the lookup path to the PharmacyLocation, e.g.
+    ``'pharmacy__pharmacy_location__'`` when filtering Inventory.
+    """
+    return box_location_filter(bounding_box(lat, lng, radius_km), prefix)
+
+
+def box_location_filter(box, prefix=''):
+    """Like nearby_location_filter, for an already computed bounding box."""
+    min_lat, max_lat, min_lng, max_lng = box
+    filters = {f'{prefix}latitude__range': (min_lat, max_lat)}
+    if min_lng >= -180 and max_lng <= 180:
+        filters[f'{prefix}longitude__range'] = (min_lng, max_lng)
+    cells = grid_cells_for_box(min_lat, max_lat, min_lng, max_lng)
+    if cells is not None:
+        filters[f'{prefix}grid_cell__in'] = cells
+    return filters
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometers."""
+    lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_km_array(lat, lng, lats, lngs):
+    """Vectorized haversine: distances in km from (lat, lng) to each point
+    of the float arrays ``lats``/``lngs``."""
+    lat1, lng1 = math.radians(float(lat)), math.radians(float(lng))
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lng2 = np.radians(np.asarray(lngs, dtype=np.float64))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def nearest_within(lat, lng, lats, lngs, max_distance, limit=None):
+    """Return (indices, distances) of the points within ``max_distance`` km,
+    nearest first. With ``limit`` only the closest ``limit`` points are
+    returned, selected with argpartition instead of a full sort."""
+    distances = haversine_km_array(lat, lng, lats, lngs)
+    within = np.flatnonzero(distances <= max_distance)
+    if limit is not None and limit < len(within):
+        within = within[np.argpartition(distances[within], limit - 1)[:limit]]
+    order = within[np.argsort(distances[within], kind='stable')]
+    return order, distances[order]
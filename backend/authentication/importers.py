@@ -0,0 +1,388 @@
+"""Set-based inventory import for bulk medicine uploads.
+
+Uploads are read incrementally (openpyxl read-only mode for .xlsx, the csv
+module for .csv) and imported in fixed-size batches, so memory stays
+bounded however large the file is. Each batch is validated and normalized
+column-at-a-time with pandas, existing medicines are resolved with one IN
+query, and new medicines and inventory rows are written with bulk_create
+inside the batch's own transaction. Error messages keep the per-row
+"Row N: ..." format of the original row-by-row importer.
+"""
+import csv
+import io
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import medicine_names
+from .models import ImportJob, Inventory, Medicine
+from .search import invalidate_pharmacies
+
+REQUIRED_COLUMNS = ['medicine_name', 'quantity', 'price']
+OPTIONAL_COLUMNS = ['generic_name', 'description', 'category', 'expiry_date', 'is_available']
+
+# Rows per transaction when streaming a file
+IMPORT_BATCH_SIZE = 2000
+
+# Largest values Inventory.quantity (PositiveIntegerField) and Inventory.price
+# (max_digits=10, decimal_places=2) accept on every database backend
+MAX_QUANTITY = 2147483647
+MAX_PRICE = 99999999.99
+
+# Error rows kept with their original values (for the downloadable report)
+MAX_ERROR_ROWS = 10000
+
+# Accepted is_available spellings, compared stripped and lowercased; a
+# blank cell means available
+AVAILABILITY_VALUES = {
+    'true': True, 'yes': True, 'y': True, '1': True,
+    'false': False, 'no': False, 'n': False, '0': False,
+}
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(f'Missing required columns: {", ".join(columns)}')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created_medicines = 0
+        self.created_inventory = 0
+        self.processed_rows = 0
+        self.failed_rows = 0
+        # [{'row': N, 'error': message, 'values': {column: text}}], capped at MAX_ERROR_ROWS
+        self.error_rows = []
+
+    def merge(self, other):
+        self.created_medicines += other.created_medicines
+        self.created_inventory += other.created_inventory
+        self.processed_rows += other.processed_rows
+        self.failed_rows += other.failed_rows
+        self.error_rows.extend(other.error_rows[:MAX_ERROR_ROWS - len(self.error_rows)])
+
+
+def missing_columns(columns):
+    return [col for col in REQUIRED_COLUMNS if col not in columns]
+
+
+def _text(df, column, default):
+    """Stripped strings, with blanks/NaN (and a missing column) as ``default``."""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    values = df[column]
+    return values.where(values.isna(), values.astype(str).str.strip()).fillna(default)
+
+
+def _number(df, column, default):
+    """(float numbers, invalid mask): NaN becomes ``default``; unparseable
+    and infinite values are flagged and also become ``default``."""
+    values = df[column]
+    numbers = pd.to_numeric(values, errors='coerce').astype('float64')
+    invalid = (numbers.isna() & values.notna()) | np.isinf(numbers)
+    return numbers.mask(invalid).fillna(default), invalid
+
+
+def _availability(value):
+    """True/False for an is_available cell, None if it can't be read as one."""
+    if pd.isna(value):
+        return True
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.number)) and value in (0, 1):
+        return bool(value)
+    return AVAILABILITY_VALUES.get(str(value).strip().lower())
+
+
+def _xlsx_rows(file):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.reader(text):
+            yield [None if cell == '' else cell for cell in row]
+    finally:
+        text.detach()
+
+
+def _xls_rows(file):
+    # Legacy .xls has no streaming reader; these files are small in practice
+    df = pd.read_excel(file, header=None, dtype=object)
+    yield from df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def read_batches(file, batch_size=IMPORT_BATCH_SIZE):
+    """Yield DataFrames of at most ``batch_size`` rows from an uploaded
+    .xlsx, .csv or .xls file, indexed by spreadsheet row number.
+
+    Raises MissingColumnsError before yielding anything if the header row
+    lacks a required column.
+    """
+    name = file.name.lower()
+    if name.endswith('.csv'):
+        rows = _csv_rows(file)
+    elif name.endswith('.xls'):
+        rows = _xls_rows(file)
+    else:
+        rows = _xlsx_rows(file)
+
+    try:
+        header = next(rows, None) or []
+        columns = [str(col).strip() if col is not None else f'Unnamed: {i}' for i, col in enumerate(header)]
+        missing = missing_columns(columns)
+        if missing:
+            raise MissingColumnsError(missing)
+
+        width = len(columns)
+        numbered = enumerate(rows, start=2)
+        while True:
+            batch = [
+                (number, (list(row) + [None] * width)[:width])
+                for number, row in islice(numbered, batch_size)
+            ]
+            if not batch:
+                break
+            # Blank lines (including openpyxl's trailing empty rows) are skipped
+            batch = [(number, row) for number, row in batch if any(cell is not None for cell in row)]
+            if batch:
+                yield pd.DataFrame(
+                    [row for _, row in batch], columns=columns, index=[number for number, _ in batch], dtype=object,
+                )
+    finally:
+        # Release the reader (and its text wrapper) while the file is still open
+        rows.close()
+
+
+def import_inventory_file(pharmacy, file, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Stream ``file`` into ``pharmacy``'s inventory, committing each batch
+    separately. Returns the combined ImportResult.
+
+    ``progress``, if given, is called with the running ImportResult after
+    every committed batch.
+    """
+    result = ImportResult()
+    batches = read_batches(file, batch_size)
+    try:
+        for df in batches:
+            result.merge(import_inventory_frame(pharmacy, df, first_row=None))
+            if progress is not None:
+                progress(result)
+    finally:
+        batches.close()
+    return result
+
+
+def import_inventory_frame(pharmacy, df, first_row=2):
+    """Import one DataFrame of inventory rows for ``pharmacy``.
+
+    ``first_row`` is the spreadsheet row number of ``df``'s first row, used
+    in error messages (row 1 is the header). Pass None when ``df`` is
+    already indexed by row number.
+    """
+    result = ImportResult()
+    if first_row is not None:
+        df = df.set_axis(range(first_row, first_row + len(df)))
+    result.processed_rows = len(df)
+    if df.empty:
+        return result
+
+    errors = pd.Series(None, index=df.index, dtype=object)
+
+    def flag(mask, message):
+        # Each row reports only its first problem, in the original check order
+        mask = mask & errors.isna()
+        errors[mask] = message(mask) if callable(message) else message
+
+    names = df['medicine_name'].astype(str).str.strip()
+    flag(df['medicine_name'].isna() | (names == '') | (names.str.lower() == 'nan'), 'Medicine name is required')
+
+    quantities, bad_quantity = _number(df, 'quantity', 0)
+    flag(bad_quantity, lambda mask: "Invalid quantity '" + df.loc[mask, 'quantity'].astype(str) + "'")
+    prices, bad_price = _number(df, 'price', 0.0)
+    flag(bad_price, lambda mask: "Invalid price '" + df.loc[mask, 'price'].astype(str) + "'")
+
+    if 'expiry_date' in df.columns:
+        expiry_dates = pd.to_datetime(df['expiry_date'], errors='coerce', format='mixed')
+        bad_expiry = expiry_dates.isna() & df['expiry_date'].notna()
+        flag(bad_expiry, lambda mask: "Invalid expiry date '" + df.loc[mask, 'expiry_date'].astype(str) + "'")
+    else:
+        expiry_dates = pd.Series(pd.NaT, index=df.index)
+
+    flag(quantities < 0, 'Quantity cannot be negative')
+    flag(quantities > MAX_QUANTITY, f'Quantity cannot be more than {MAX_QUANTITY}')
+    flag(quantities % 1 != 0,
+         lambda mask: "Quantity must be a whole number, not '" + df.loc[mask, 'quantity'].astype(str) + "'")
+    flag(prices < 0, 'Price cannot be negative')
+    flag(prices > MAX_PRICE, f'Price cannot be more than {MAX_PRICE:.2f}')
+    # Only valid rows are written, so the cast can no longer overflow or truncate
+    quantities = quantities.where(errors.isna(), 0).astype('int64')
+
+    if 'is_available' in df.columns:
+        is_available = df['is_available'].map(_availability)
+        flag(is_available.isna(),
+             lambda mask: "Invalid is_available '" + df.loc[mask, 'is_available'].astype(str) + "'; use yes or no")
+        # None only marks failed rows, which are not written
+        is_available = is_available.map(lambda value: value is not False)
+    else:
+        is_available = pd.Series(True, index=df.index)
+
+    failed = errors.dropna()
+    result.failed_rows = len(failed)
+    for index, message in islice(failed.items(), MAX_ERROR_ROWS):
+        result.error_rows.append({
+            'row': int(index),
+            'error': message,
+            'values': {str(col): '' if pd.isna(value) else str(value) for col, value in df.loc[index].items()},
+        })
+
+    valid = errors.isna()
+    if not valid.any():
+        return result
+
+    rows = pd.DataFrame({
+        'name': names[valid],
+        'generic_name': _text(df, 'generic_name', '')[valid],
+        'description': _text(df, 'description', '')[valid],
+        'category': _text(df, 'category', 'General')[valid],
+        'quantity': quantities[valid],
+        'price': prices[valid].round(2),
+        'is_available': is_available[valid],
+        'expiry_date': expiry_dates[valid],
+    })
+
+    with transaction.atomic():
+        # Existing medicines are matched by name, like get_or_create(name=...)
+        medicine_ids = {}
+        for pk, name in (Medicine.objects.filter(name__in=rows['name'].unique().tolist())
+                         .order_by('-id').values_list('id', 'name')):
+            medicine_ids[name] = pk
+
+        # A new medicine takes its details from the first row naming it
+        new_rows = rows[~rows['name'].isin(medicine_ids)].drop_duplicates('name', keep='first')
+        new_medicines = Medicine.objects.bulk_create([
+            Medicine(name=row.name, generic_name=row.generic_name,
+                     description=row.description, category=row.category)
+            for row in new_rows.itertuples(index=False)
+        ])
+        for medicine in new_medicines:
+            medicine_ids[medicine.name] = medicine.pk
+        # Index the names only once other processes can see the rows too
+        transaction.on_commit(lambda: [medicine_names.add_medicine(medicine) for medicine in new_medicines])
+        result.created_medicines = len(new_medicines)
+
+        # Later rows for the same medicine overwrite earlier ones
+        rows['medicine_id'] = rows['name'].map(medicine_ids)
+        rows = rows.drop_duplicates('medicine_id', keep='last')
+        existing = set(Inventory.objects.filter(
+            pharmacy=pharmacy, medicine_id__in=rows['medicine_id'].tolist()
+        ).values_list('medicine_id', flat=True))
+
+        now = timezone.now()
+        Inventory.objects.bulk_create([
+            Inventory(
+                pharmacy=pharmacy,
+                medicine_id=row.medicine_id,
+                medicine_name=row.name,
+                quantity=row.quantity,
+                price=round(row.price, 2),
+                is_available=row.is_available,
+                expiry_date=None if pd.isna(row.expiry_date) else row.expiry_date.date(),
+                created_at=now,
+                updated_at=now,
+            )
+            for row in rows.itertuples(index=False)
+        ], update_conflicts=True, unique_fields=['pharmacy', 'medicine'],
+            update_fields=['medicine_name', 'quantity', 'price', 'is_available', 'expiry_date', 'updated_at'])
+        result.created_inventory = len(set(rows['medicine_id']) - existing)
+
+        # bulk_create skips the signals that invalidate cached searches
+        invalidate_pharmacies([pharmacy.pk])
+
+    return result
+
+
+# --- Background import jobs ---
+
+def claim_next_job():
+    """Claim the oldest pending ImportJob for this worker, or return None.
+
+    The conditional UPDATE only succeeds for one worker, so several workers
+    can poll the same table without a broker or row locks.
+    """
+    pending = ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).order_by('created_at', 'id')
+    for pk in pending.values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(pk=pk, status=ImportJob.STATUS_PENDING).update(
+            status=ImportJob.STATUS_RUNNING, started_at=now, updated_at=now,
+        )
+        if claimed:
+            return ImportJob.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale_jobs(stale_after):
+    """Return running jobs with no progress for ``stale_after`` to the queue.
+
+    A worker saves progress after every batch, so a job this quiet belonged
+    to a worker that died. Re-running it is safe because imports upsert.
+    """
+    return ImportJob.objects.filter(
+        status=ImportJob.STATUS_RUNNING, updated_at__lt=timezone.now() - stale_after,
+    ).update(
+        status=ImportJob.STATUS_PENDING, processed_rows=0, failed_rows=0, error_rows=[],
+        created_medicines=0, created_inventory=0, updated_at=timezone.now(),
+    )
+
+
+def _job_counts(result):
+    return {
+        'processed_rows': result.processed_rows,
+        'failed_rows': result.failed_rows,
+        'created_medicines': result.created_medicines,
+        'created_inventory': result.created_inventory,
+    }
+
+
+def run_import_job(job):
+    """Import a claimed job's file, recording progress after every batch.
+
+    Batches committed before a failure stay imported, so a failed job
+    keeps their counts and error rows too.
+    """
+    committed = ImportResult()
+
+    def progress(result):
+        nonlocal committed
+        committed = result
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now(), **_job_counts(result))
+
+    try:
+        with job.file.open('rb') as file:
+            result = import_inventory_file(job.pharmacy, file, progress=progress)
+    except Exception as e:
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.STATUS_FAILED, message=str(e), error_rows=committed.error_rows,
+            finished_at=timezone.now(), updated_at=timezone.now(), **_job_counts(committed),
+        )
+        raise
+
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJob.STATUS_COMPLETED, error_rows=result.error_rows,
+        finished_at=timezone.now(), updated_at=timezone.now(), **_job_counts(result),
+    )
+    # The upload is no longer needed once every row has been imported
+    job.file.delete(save=False)
+    ImportJob.objects.filter(pk=job.pk).update(file='')
+    return result
@@ -0,0 +1,57 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from authentication.geo import haversine_km, nearest_within
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the scalar and vectorized distance ranking used by medicine search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                            help='Candidate row counts to benchmark')
+        parser.add_argument('--radius', type=float, default=10, help='Search radius in km')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per size; the best time is reported')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        origin_lat, origin_lng = 15.4909, 73.8278
+        radius = options['radius']
+
+        self.stdout.write(f'{"rows":>8} {"scalar ms":>10} {"vector ms":>10} {"speedup":>8}')
+        for size in options['sizes']:
+            # Candidates as search_medicine_nearby fetches them: float-cast columns
+            coords = [
+                (origin_lat + rng.uniform(-0.2, 0.2), origin_lng + rng.uniform(-0.2, 0.2))
+                for _ in range(size)
+            ]
+
+            scalar = self._best(options['repeat'], lambda: self._scalar(origin_lat, origin_lng, coords, radius))
+            vector = self._best(options['repeat'], lambda: self._vector(origin_lat, origin_lng, coords, radius))
+            self.stdout.write(f'{size:>8} {scalar * 1000:>10.2f} {vector * 1000:>10.2f} {scalar / vector:>7.1f}x')
+
+    def _best(self, repeat, fn):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def _scalar(self, lat, lng, coords, radius):
+        results = []
+        for index, (plat, plng) in enumerate(coords):
+            distance = haversine_km(lat, lng, plat, plng)
+            if distance <= radius:
+                results.append((distance, index))
+        results.sort()
+        return results
+
+    def _vector(self, lat, lng, coords, radius):
+        lats = np.fromiter((c[0] for c in coords), dtype=np.float64, count=len(coords))
+        lngs = np.fromiter((c[1] for c in coords), dtype=np.float64, count=len(coords))
+        return nearest_within(lat, lng, lats, lngs, radius)
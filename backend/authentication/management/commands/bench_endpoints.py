@@ -0,0 +1,251 @@
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import parse_qs, urlsplit
+
+import django
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from authentication.importers import run_import_job
+from authentication.models import ImportJob, Medicine, Reminder, User
+
+# generate_dataset options for each data size
+DATA_SIZES = {
+    'small': {'pharmacies': 200, 'medicines': 1000, 'customers': 200, 'fill_rate': 0.2},
+    'medium': {'pharmacies': 1000, 'medicines': 5000, 'customers': 1000, 'fill_rate': 0.2},
+    'large': {'pharmacies': 5000, 'medicines': 20000, 'customers': 5000, 'fill_rate': 0.1},
+}
+
+ENDPOINTS = [
+    'medicine_search', 'homepage_customer', 'homepage_pharmacy', 'inventory_list',
+    'bulk_medicine_upload', 'reminder_mark_taken', 'api_login',
+]
+
+PASSWORD = 'synthetic-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark key views with the Django test client against generated data; '
+        'reports throughput and p50/p95/p99 latency per concurrency level'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', choices=list(DATA_SIZES), default=['small'])
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per endpoint and concurrency level')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument('--upload-rows', type=int, default=100,
+                            help='Rows in the spreadsheet posted to the bulk upload view')
+        parser.add_argument('--output', default='benchmark-endpoints.json')
+        parser.add_argument('--compare', help='Earlier results file to compare p95 latency against')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_endpoints creates a throwaway SQLite database; run it with SQLite settings')
+
+        results = []
+        self.import_lock = threading.Lock()
+        setup_test_environment()
+        try:
+            for size in options['sizes']:
+                results.extend(self._bench_size(size, options))
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'commit': self._git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'requests': options['requests'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            self._compare(options['compare'], results)
+
+    def _bench_size(self, size, options):
+        # A file-backed test database so worker threads share one database,
+        # and uploads stored next to it rather than under the real MEDIA_ROOT
+        workdir = tempfile.mkdtemp(prefix='bench-endpoints-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        media = override_settings(MEDIA_ROOT=os.path.join(workdir, 'media'))
+        media.enable()
+        try:
+            self.stdout.write(f'[{size}] generating dataset...')
+            call_command('generate_dataset', seed=options['seed'], stdout=io.StringIO(), **DATA_SIZES[size])
+            fixture = self._fixture(options)
+
+            results = []
+            self.stdout.write(f'{"endpoint":<22} {"conc":>4} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>6}')
+            for endpoint in options['endpoints']:
+                for concurrency in options['concurrency']:
+                    result = self._run(endpoint, concurrency, options['requests'], fixture, options['seed'])
+                    result['size'] = size
+                    results.append(result)
+                    self.stdout.write(
+                        f"{endpoint:<22} {concurrency:>4} {result['throughput_rps']:>8.1f} "
+                        f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>6}"
+                    )
+            return results
+        finally:
+            media.disable()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _fixture(self, options):
+        rng = random.Random(options['seed'])
+        pharmacies = list(User.objects.filter(is_pharmacy=True, pharmacy_location__isnull=False)
+                          .order_by('id').values_list('username', flat=True)[:50])
+        reminders = list(Reminder.objects.order_by('id').values_list('id', 'user__username')[:200])
+        names = list(Medicine.objects.order_by('id').values_list('name', flat=True))
+        stems = [name.split()[0][:6] for name in rng.sample(names, min(50, len(names)))]
+        return {
+            'pharmacies': pharmacies,
+            'customers': sorted({username for _, username in reminders}),
+            'reminders': reminders,
+            'queries': stems,
+            'upload': self._spreadsheet(rng, options['upload_rows']),
+        }
+
+    def _spreadsheet(self, rng, rows):
+        import pandas as pd
+
+        frame = pd.DataFrame({
+            'medicine_name': [f'Bench Medicine {i}' for i in range(rows)],
+            'quantity': [rng.randint(0, 200) for _ in range(rows)],
+            'price': [round(rng.uniform(1, 500), 2) for _ in range(rows)],
+            'category': ['General'] * rows,
+        })
+        buffer = io.BytesIO()
+        frame.to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+    def _request(self, endpoint, client, rng, fixture, user):
+        if endpoint == 'medicine_search':
+            return client.get('/auth/customer/search/', {
+                'medicine_name': rng.choice(fixture['queries']), 'max_distance': rng.choice([5, 10, 25]),
+            })
+        if endpoint in ('homepage_customer', 'homepage_pharmacy'):
+            return client.get('/auth/homepage/')
+        if endpoint == 'inventory_list':
+            return client.get('/auth/pharmacy/inventory/')
+        if endpoint == 'bulk_medicine_upload':
+            upload = io.BytesIO(fixture['upload'])
+            upload.name = 'bench.xlsx'
+            response = client.post('/auth/pharmacy/inventory/bulk-upload/', {'excel_file': upload})
+            # The view only queues an ImportJob; run it here, one at a time
+            # like a single run_import_worker, so the latency covers the
+            # import itself and any wait behind other uploads
+            job_id = parse_qs(urlsplit(response.get('Location', '')).query).get('job')
+            if job_id:
+                with self.import_lock:
+                    job = ImportJob.objects.get(pk=job_id[0])
+                    ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.STATUS_RUNNING)
+                    run_import_job(job)
+            return response
+        if endpoint == 'reminder_mark_taken':
+            reminder_id = rng.choice([pk for pk, username in fixture['reminders'] if username == user])
+            return client.post(f'/auth/customer/reminders/{reminder_id}/mark-taken/')
+        if endpoint == 'api_login':
+            return client.post('/auth/api/login/', {'username': user, 'password': PASSWORD})
+        raise ValueError(endpoint)
+
+    def _run(self, endpoint, concurrency, total, fixture, seed):
+        role = 'pharmacies' if endpoint in ('homepage_pharmacy', 'inventory_list', 'bulk_medicine_upload') else 'customers'
+        counter = iter(range(total))
+        lock = threading.Lock()
+        latencies, errors = [], []
+
+        def worker(index):
+            rng = random.Random(seed * 1000 + index)
+            user = fixture[role][index % len(fixture[role])]
+            client = Client()
+            if endpoint != 'api_login':
+                client.force_login(User.objects.get(username=user))
+            # Warm up connection, session and caches outside the measurement
+            self._request(endpoint, client, rng, fixture, user)
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        break
+                start = time.perf_counter()
+                try:
+                    response = self._request(endpoint, client, rng, fixture, user)
+                    failed = response.status_code >= 400
+                except Exception:
+                    failed = True
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if failed:
+                        errors.append(endpoint)
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        wall = time.perf_counter() - started
+
+        samples = np.array(latencies) * 1000
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0, 0, 0)
+        return {
+            'endpoint': endpoint,
+            'concurrency': concurrency,
+            'requests': len(samples),
+            'errors': len(errors),
+            'throughput_rps': round(len(samples) / wall, 2),
+            'mean_ms': round(float(samples.mean()), 3) if len(samples) else 0,
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+        }
+
+    def _compare(self, path, results):
+        with open(path) as f:
+            previous = {
+                (r['size'], r['endpoint'], r['concurrency']): r for r in json.load(f)['results']
+            }
+        self.stdout.write(f'\np95 latency vs {path}:')
+        for result in results:
+            before = previous.get((result['size'], result['endpoint'], result['concurrency']))
+            if not before or not before['p95_ms']:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            self.stdout.write(
+                f"  {result['size']:<7} {result['endpoint']:<22} c={result['concurrency']:<3} "
+                f"{before['p95_ms']:>8.2f} -> {result['p95_ms']:>8.2f} ms ({change:+.1f}%)"
+            )
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,110 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from authentication.archive import compact_reminder_logs, reminder_log_days
+from authentication.models import Reminder, ReminderLog, User
+
+LOG_TABLES = ('authentication_reminderlog', 'authentication_reminderlogarchive')
+
+
+class Command(BaseCommand):
+    help = 'Measure ReminderLog storage size and history read latency before and after archive compaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reminders', type=int, default=2000)
+        parser.add_argument('--years', type=float, default=3.0, help='Days of log history per reminder, in years')
+        parser.add_argument('--reads', type=int, default=200, help='Users whose past year is read per measurement')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_reminder_archive measures SQLite page usage; run it with SQLite settings')
+
+        # A throwaway file-backed database, so sizes are real page counts
+        workdir = tempfile.mkdtemp(prefix='bench-archive-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            rng = random.Random(options['seed'])
+            user_ids = self._seed(options, rng)
+            today = date.today()
+            read_users = rng.sample(user_ids, min(options['reads'], len(user_ids)))
+
+            before_size, before_rows = self._size(), ReminderLog.objects.count()
+            before_read = self._read_latency(read_users, today)
+
+            started = time.perf_counter()
+            folded, written = compact_reminder_logs()
+            compact_time = time.perf_counter() - started
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+            after_size, after_rows = self._size(), ReminderLog.objects.count()
+            after_read = self._read_latency(read_users, today)
+
+            self.stdout.write(f'Compacted {folded} logs into {written} archive rows in {compact_time:.1f}s')
+            self.stdout.write(f'{"":<8} {"log rows":>10} {"archive":>8} {"MB":>8} {"year read ms":>13}')
+            for label, rows, size, read in (
+                ('before', before_rows, before_size, before_read),
+                ('after', after_rows, after_size, after_read),
+            ):
+                self.stdout.write(
+                    f'{label:<8} {rows:>10} {size[1]:>8} {size[0] / 1e6:>8.1f} {read * 1000:>13.2f}'
+                )
+            self.stdout.write(f'Storage: {before_size[0] / after_size[0]:.1f}x smaller')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _seed(self, options, rng):
+        users = User.objects.bulk_create([
+            User(username=f'bench-customer-{i}') for i in range(max(1, options['reminders'] // 2))
+        ])
+        reminders = Reminder.objects.bulk_create([
+            Reminder(user=rng.choice(users), medicine_name=f'Bench Medicine {i}', times='08:00')
+            for i in range(options['reminders'])
+        ])
+
+        today = date.today()
+        days = int(options['years'] * 365)
+        dates = [connection.ops.adapt_datefield_value(today - timedelta(days=day + 1)) for day in range(days)]
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with transaction.atomic(), connection.cursor() as cursor:
+            for reminder in reminders:
+                adherence = rng.uniform(0.5, 1.0)
+                cursor.executemany(
+                    'INSERT INTO authentication_reminderlog (reminder_id, date, taken, marked_at) VALUES (%s, %s, %s, %s)',
+                    [(reminder.pk, day, rng.random() < adherence, now) for day in dates],
+                )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return [user.pk for user in users]
+
+    def _size(self):
+        """(bytes used by the log and archive tables and their indexes, archive rows)."""
+        placeholders = ', '.join(['%s'] * len(LOG_TABLES))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT SUM(pgsize) FROM dbstat WHERE name IN ({placeholders}) '
+                f'OR name IN (SELECT name FROM sqlite_master WHERE type = %s AND tbl_name IN ({placeholders}))',
+                [*LOG_TABLES, 'index', *LOG_TABLES],
+            )
+            size = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM authentication_reminderlogarchive')
+            return size, cursor.fetchone()[0]
+
+    def _read_latency(self, user_ids, today):
+        """Median time to read one user's past year of logs."""
+        timings = []
+        for user_id in user_ids:
+            started = time.perf_counter()
+            list(reminder_log_days(today - timedelta(days=365), today, user_id=user_id))
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2]
@@ -0,0 +1,172 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.test.utils import override_settings
+
+from authentication.models import Inventory, Medicine, Reminder, ReminderLog, User
+
+# Connection settings and pragmas of each DJANGO_DB_PROFILE (see settings.py).
+# journal_mode is persistent, so the development profile resets it explicitly.
+PROFILES = {
+    'development': {'options': {}, 'pragmas': {'journal_mode': 'DELETE'}},
+    'production': {'options': settings.PRODUCTION_SQLITE_OPTIONS, 'pragmas': settings.PRODUCTION_SQLITE_PRAGMAS},
+}
+
+OPERATIONS = ['mark_taken', 'inventory_edit', 'session_write', 'inventory_read']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent write throughput and "database is locked" errors '
+        'of the development and production SQLite profiles'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile and thread count')
+        parser.add_argument('--read-ratio', type=float, default=0.5,
+                            help='Fraction of operations that are inventory page reads')
+        parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_sqlite_writes benchmarks SQLite; run it with SQLite settings')
+
+        # A throwaway file-backed database; in-memory databases have no locking to measure
+        workdir = tempfile.mkdtemp(prefix='bench-sqlite-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        original_options = dict(connection.settings_dict['OPTIONS'])
+        try:
+            fixture = self._fixture(options['seed'])
+            self.stdout.write(
+                f'{"profile":<12} {"threads":>7} {"ops/s":>9} {"writes/s":>9} '
+                f'{"p95 write ms":>12} {"locked":>7} {"errors":>7}'
+            )
+            results = {}
+            for threads in options['threads']:
+                for profile in options['profiles']:
+                    result = self._run(profile, threads, fixture, options)
+                    results[profile, threads] = result
+                    self.stdout.write(
+                        f"{profile:<12} {threads:>7} {result['ops_per_s']:>9.1f} {result['writes_per_s']:>9.1f} "
+                        f"{result['p95_write_ms']:>12.2f} {result['locked']:>7} {result['errors']:>7}"
+                    )
+
+            if {'development', 'production'} <= set(options['profiles']):
+                self.stdout.write('\nWrite throughput, production vs development:')
+                for threads in options['threads']:
+                    before = results['development', threads]['writes_per_s']
+                    after = results['production', threads]['writes_per_s']
+                    if before:
+                        self.stdout.write(f'  {threads:>3} threads: {after / before:.2f}x')
+        finally:
+            connection.settings_dict['OPTIONS'] = original_options
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _fixture(self, seed):
+        rng = random.Random(seed)
+        pharmacy = User.objects.create(username='bench-pharmacy', is_pharmacy=True)
+        medicines = Medicine.objects.bulk_create([Medicine(name=f'Bench Medicine {i}') for i in range(500)])
+        inventory = Inventory.objects.bulk_create([
+            Inventory(pharmacy=pharmacy, medicine=medicine, medicine_name=medicine.name, quantity=rng.randint(0, 500), price=Decimal('9.99'),
+                      expiry_date=date.today() + timedelta(days=rng.randint(-30, 700)))
+            for medicine in medicines
+        ])
+        customers = User.objects.bulk_create([User(username=f'bench-customer-{i}') for i in range(200)])
+        reminders = Reminder.objects.bulk_create([
+            Reminder(user=customer, medicine_name='Bench Medicine', times='08:00, 20:00') for customer in customers
+        ])
+        return {
+            'pharmacy': pharmacy,
+            'inventory_ids': [item.pk for item in inventory],
+            'reminder_ids': [reminder.pk for reminder in reminders],
+        }
+
+    def _operation(self, name, rng, fixture):
+        if name == 'mark_taken':
+            # Like reminder_mark_taken_today, on one of the last few days
+            day = date.today() - timedelta(days=rng.randint(0, 6))
+            with transaction.atomic():
+                log, _ = ReminderLog.objects.get_or_create(reminder_id=rng.choice(fixture['reminder_ids']), date=day)
+                log.taken = True
+                log.save()
+        elif name == 'inventory_edit':
+            with transaction.atomic():
+                item = Inventory.objects.get(pk=rng.choice(fixture['inventory_ids']))
+                Inventory.objects.filter(pk=item.pk).update(quantity=F('quantity') + 1)
+        elif name == 'session_write':
+            session = SessionStore()
+            session['cart'] = rng.random()
+            session.save()
+        else:
+            list(Inventory.objects.filter(pharmacy=fixture['pharmacy']).select_related('medicine')
+                 .order_by('quantity', 'id')[:50])
+
+    def _run(self, profile, threads, fixture, options):
+        connections.close_all()
+        connection.settings_dict['OPTIONS'] = dict(PROFILES[profile]['options'])
+        deadline = None
+        lock = threading.Lock()
+        write_latencies, counts = [], {'ops': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            local_latencies, local = [], {'ops': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+            while time.perf_counter() < deadline:
+                if rng.random() < options['read_ratio']:
+                    name = 'inventory_read'
+                else:
+                    name = rng.choice(OPERATIONS[:3])
+                start = time.perf_counter()
+                try:
+                    self._operation(name, rng, fixture)
+                except OperationalError as e:
+                    local['locked' if 'locked' in str(e) else 'errors'] += 1
+                    continue
+                except Exception:
+                    local['errors'] += 1
+                    continue
+                local['ops'] += 1
+                if name != 'inventory_read':
+                    local['writes'] += 1
+                    local_latencies.append(time.perf_counter() - start)
+            connections.close_all()
+            with lock:
+                write_latencies.extend(local_latencies)
+                for key, value in local.items():
+                    counts[key] += value
+
+        with override_settings(SQLITE_PRAGMAS=PROFILES[profile]['pragmas']):
+            # Open (and configure) one connection so journal_mode is switched
+            # before the workers start
+            connection.ensure_connection()
+            connections.close_all()
+            deadline = time.perf_counter() + options['duration']
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(worker, range(threads)))
+            wall = time.perf_counter() - started
+
+        samples = np.array(write_latencies) * 1000
+        return {
+            'ops_per_s': counts['ops'] / wall,
+            'writes_per_s': counts['writes'] / wall,
+            'p95_write_ms': float(np.percentile(samples, 95)) if len(samples) else 0.0,
+            'locked': counts['locked'],
+            'errors': counts['errors'],
+        }
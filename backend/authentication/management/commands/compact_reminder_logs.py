@@ -0,0 +1,28 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.archive import COMPACT_BATCH_SIZE, archive_cutoff, compact_reminder_logs
+
+
+class Command(BaseCommand):
+    help = 'Fold reminder logs of closed months into monthly bitset archive rows (run monthly or nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat,
+                            help='Archive months before this date (default: every month that can no longer be edited)')
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE, help='Reminders per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff()
+        before = options['before'] or cutoff
+        if before > cutoff:
+            raise CommandError(f'Months from {cutoff:%Y-%m} on can still be edited and are not archived')
+
+        started = time.perf_counter()
+        folded, written = compact_reminder_logs(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Folded {folded} logs before {before.replace(day=1)} into {written} archive rows '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,284 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from authentication.adherence import rebuild_rollups, refresh_streaks, week_start
+from authentication.geo import grid_cell_for
+from authentication.models import (
+    CustomerLocation, Inventory, Medicine, PharmacyLocation, Reminder, ReminderLog, ReminderPause, ReminderTime, User,
+    local_today,
+)
+from authentication.search import invalidate_cells
+
+SYLLABLES = [
+    'para', 'ceta', 'mol', 'amox', 'icil', 'lin', 'ibu', 'pro', 'fen', 'met', 'for', 'min',
+    'azi', 'thro', 'my', 'cin', 'ator', 'va', 'sta', 'tin', 'ome', 'pra', 'zole', 'lo',
+    'sar', 'tan', 'cef', 'ix', 'ime', 'dox', 'cy', 'clo', 'pi', 'dine', 'ran', 'ti', 'ol',
+]
+FORMS = ['Tablet', 'Capsule', 'Syrup', 'Injection', 'Cream', 'Drops']
+STRENGTHS = ['5mg', '10mg', '20mg', '50mg', '100mg', '250mg', '500mg', '650mg']
+CATEGORIES = ['Analgesic', 'Antibiotic', 'Antidiabetic', 'Antihypertensive', 'Antacid',
+              'Antihistamine', 'Vitamin', 'General']
+REMINDER_TIMES = ['08:00', '08:00, 20:00', '09:00, 14:00, 21:00', '07:30', '22:00', '08:00, 13:00, 19:00']
+REMINDER_TIMEZONE = 'Asia/Kolkata'
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=1000)
+        parser.add_argument('--medicines', type=int, default=5000)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--fill-rate', type=float, default=0.2,
+                            help='Average fraction of the catalog each pharmacy stocks')
+        parser.add_argument('--clusters', type=int, default=8,
+                            help='Number of city clusters pharmacies and customers are placed around')
+        parser.add_argument('--center', type=float, nargs=2, default=[15.4909, 73.8278],
+                            metavar=('LAT', 'LNG'), help='Centre of the generated region')
+        parser.add_argument('--region-km', type=float, default=150,
+                            help='Cluster centres are spread within this distance of --center')
+        parser.add_argument('--reminders-per-customer', type=float, default=1.5)
+        parser.add_argument('--history-days', type=int, default=30,
+                            help='Days of ReminderLog history per reminder')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='synth', help='Prefix for generated usernames')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users prefixed '{options['prefix']}-' already exist; pick another --prefix")
+
+        self.rng = np.random.default_rng(options['seed'])
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        started = time.perf_counter()
+
+        self.clusters = self._cluster_centres(options)
+        pharmacy_ids, cells = self._pharmacies(options)
+        medicine_ids = self._medicines(options)
+        inventory_count = self._inventory(options, pharmacy_ids, medicine_ids)
+        customer_ids = self._customers(options)
+        reminder_count, log_count = self._reminders(options, customer_ids)
+        rollup_count = self._adherence(options, customer_ids)
+
+        # bulk_create skips the signals that normally invalidate cached searches
+        invalidate_cells(cells)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(pharmacy_ids)} pharmacies, {len(medicine_ids)} medicines, '
+            f'{inventory_count} inventory rows, {len(customer_ids)} customers, '
+            f'{reminder_count} reminders, {log_count} reminder logs and {rollup_count} adherence rollups '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def _bulk_create(self, model, objs):
+        return model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def _insert_rows(self, model, fields, rows):
+        """Batched executemany for the million-row child tables.
+
+        bulk_create spends most of its time building model instances and
+        preparing each value through its field; here values are adapted
+        once up front, which makes large tables roughly 10x faster.
+        """
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(sql, rows[start:start + self.batch_size])
+        return len(rows)
+
+    def _cluster_centres(self, options):
+        lat, lng = options['center']
+        spread = options['region_km'] / 111.0
+        offsets = self.rng.uniform(-spread, spread, size=(options['clusters'], 2))
+        # Bigger cities attract more pharmacies and customers
+        weights = self.rng.pareto(1.5, size=options['clusters']) + 1
+        return lat + offsets[:, 0], lng + offsets[:, 1], weights / weights.sum()
+
+    def _points(self, count):
+        """Points scattered around the cluster centres (sigma ~5 km)."""
+        lats, lngs, weights = self.clusters
+        cluster = self.rng.choice(len(weights), size=count, p=weights)
+        jitter = self.rng.normal(0, 0.045, size=(count, 2))
+        return lats[cluster] + jitter[:, 0], lngs[cluster] + jitter[:, 1]
+
+    def _users(self, prefix, count, is_pharmacy):
+        # Hashing once keeps user creation fast; every account shares a password
+        password = make_password('synthetic-password')
+        users = [
+            User(username=f'{prefix}-{i:07d}', password=password, is_pharmacy=is_pharmacy)
+            for i in range(count)
+        ]
+        return [user.pk for user in self._bulk_create(User, users)]
+
+    @transaction.atomic
+    def _pharmacies(self, options):
+        user_ids = self._users(f"{options['prefix']}-ph", options['pharmacies'], True)
+        lats, lngs = self._points(len(user_ids))
+        locations = []
+        for i, user_id in enumerate(user_ids):
+            lat, lng = Decimal(f'{lats[i]:.6f}'), Decimal(f'{lngs[i]:.6f}')
+            locations.append(PharmacyLocation(
+                user_id=user_id, name=f'Pharmacy {i}', address=f'{i} Synthetic Street',
+                latitude=lat, longitude=lng, phone=f'+91{9000000000 + i}',
+                is_active=self.random.random() > 0.02,
+                # save() is bypassed by bulk_create
+                grid_cell=grid_cell_for(lat, lng),
+            ))
+        self._bulk_create(PharmacyLocation, locations)
+        self.stdout.write(f'  {len(locations)} pharmacies')
+        return user_ids, {location.grid_cell for location in locations}
+
+    @transaction.atomic
+    def _medicines(self, options):
+        names = set()
+        medicines = []
+        while len(medicines) < options['medicines']:
+            stem = ''.join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 4))).capitalize()
+            name = f'{stem} {self.random.choice(STRENGTHS)} {self.random.choice(FORMS)}'
+            if name in names:
+                continue
+            names.add(name)
+            medicines.append(Medicine(
+                name=name,
+                generic_name=stem.lower() if self.random.random() < 0.7 else '',
+                description=f'Synthetic medicine {len(medicines)}',
+                category=self.random.choice(CATEGORIES),
+            ))
+        ids = [medicine.pk for medicine in self._bulk_create(Medicine, medicines)]
+        self.stdout.write(f'  {len(ids)} medicines')
+        return ids
+
+    @transaction.atomic
+    def _inventory(self, options, pharmacy_ids, medicine_ids):
+        medicine_ids = np.asarray(medicine_ids)
+        # Zipf-like popularity: common medicines are stocked almost everywhere
+        popularity = 1.0 / np.arange(1, len(medicine_ids) + 1) ** 0.8
+        popularity /= popularity.sum()
+        fill_rate = options['fill_rate']
+
+        names = dict(Medicine.objects.filter(pk__in=medicine_ids.tolist()).values_list('id', 'name'))
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        expiry_dates = {}
+        rows = []
+        for pharmacy_id in pharmacy_ids:
+            stocked = min(self.rng.binomial(len(medicine_ids), fill_rate), len(medicine_ids))
+            chosen = self.rng.choice(medicine_ids, size=stocked, replace=False, p=popularity).tolist()
+            # 10% out of stock, 10% low stock, the rest comfortably stocked
+            stock_level = self.rng.random(stocked)
+            quantities = np.where(stock_level < 0.1, 0,
+                                  np.where(stock_level < 0.2, self.rng.integers(1, 6, stocked),
+                                           self.rng.integers(6, 500, stocked))).tolist()
+            prices = np.round(self.rng.lognormal(3.5, 0.9, stocked), 2).tolist()
+            expiry_offsets = self.rng.integers(-60, 720, stocked).tolist()
+            no_expiry = (self.rng.random(stocked) < 0.05).tolist()
+            for j in range(stocked):
+                offset = None if no_expiry[j] else expiry_offsets[j]
+                if offset not in expiry_dates:
+                    expiry_dates[offset] = None if offset is None else connection.ops.adapt_datefield_value(
+                        self.today + timedelta(days=offset))
+                rows.append((
+                    pharmacy_id, chosen[j], names[chosen[j]], quantities[j], f'{prices[j]:.2f}', quantities[j] > 0,
+                    expiry_dates[offset], now, now,
+                ))
+        total = self._insert_rows(Inventory, [
+            'pharmacy', 'medicine', 'medicine_name', 'quantity', 'price', 'is_available', 'expiry_date',
+            'created_at', 'updated_at',
+        ], rows)
+        self.stdout.write(f'  {total} inventory rows')
+        return total
+
+    @transaction.atomic
+    def _customers(self, options):
+        user_ids = self._users(f"{options['prefix']}-cu", options['customers'], False)
+        lats, lngs = self._points(len(user_ids))
+        self._bulk_create(CustomerLocation, [
+            CustomerLocation(
+                user_id=user_id, address=f'{i} Customer Lane',
+                latitude=Decimal(f'{lats[i]:.6f}'), longitude=Decimal(f'{lngs[i]:.6f}'),
+            )
+            for i, user_id in enumerate(user_ids)
+        ])
+        self.stdout.write(f'  {len(user_ids)} customers')
+        return user_ids
+
+    @transaction.atomic
+    def _reminders(self, options, customer_ids):
+        counts = self.rng.poisson(options['reminders_per_customer'], len(customer_ids))
+        reminders = [
+            Reminder(
+                user_id=customer_id,
+                medicine_name=f'{self.random.choice(SYLLABLES).capitalize()}{self.random.choice(SYLLABLES)}',
+                times=self.random.choice(REMINDER_TIMES),
+                timezone=REMINDER_TIMEZONE,
+                active=self.random.random() > 0.1,
+            )
+            for customer_id, count in zip(customer_ids, counts)
+            for _ in range(count)
+        ]
+        reminders = self._bulk_create(Reminder, reminders)
+        # bulk_create skips Reminder.save(), which normally writes these
+        self._bulk_create(ReminderTime, [row for reminder in reminders for row in ReminderTime.rows_for(reminder)])
+        reminder_ids = [reminder.pk for reminder in reminders]
+
+        days = options['history_days']
+        today = local_today(REMINDER_TIMEZONE)
+        # Backdated so the history below falls inside each reminder's life
+        created = timezone.now() - timedelta(days=days)
+        Reminder.objects.filter(user__username__startswith=f"{options['prefix']}-cu-").update(created_at=created)
+
+        # Inactive reminders were switched off some day in the history and
+        # have no logs from then on, as Reminder.save() would have recorded
+        pauses = {
+            reminder.pk: self.random.randint(1, days) if days else 0
+            for reminder in reminders if not reminder.active
+        }
+        self._bulk_create(ReminderPause, [
+            ReminderPause(reminder_id=pk, start=today - timedelta(days=paused_days_ago))
+            for pk, paused_days_ago in pauses.items()
+        ])
+
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        log_dates = [connection.ops.adapt_datefield_value(today - timedelta(days=day + 1)) for day in range(days)]
+        rows = []
+        for reminder_id in reminder_ids:
+            # Each reminder gets its own adherence rate
+            adherence = self.rng.beta(5, 2)
+            taken = (self.rng.random(days) < adherence).tolist()
+            # log_dates run newest first, so a pause cuts off the newest days
+            first_day = pauses.get(reminder_id, 0)
+            rows.extend((reminder_id, log_dates[day], taken[day], now) for day in range(first_day, days))
+        total = self._insert_rows(ReminderLog, ['reminder', 'date', 'taken', 'marked_at'], rows)
+        self.stdout.write(f'  {len(reminder_ids)} reminders ({len(pauses)} paused), {total} reminder logs')
+        return len(reminder_ids), total
+
+    def _adherence(self, options, customer_ids):
+        # Logs written with executemany skip the rollups that
+        # record_acknowledgements normally refreshes
+        today = local_today(REMINDER_TIMEZONE)
+        weeks, week = [], week_start(today - timedelta(days=options['history_days']))
+        while week <= today:
+            weeks.append(week)
+            week += timedelta(weeks=1)
+        total = 0
+        batch_size = max(1, self.batch_size // 10)
+        for start in range(0, len(customer_ids), batch_size):
+            batch = customer_ids[start:start + batch_size]
+            with transaction.atomic():
+                total += rebuild_rollups(batch, weeks)
+                for user_id in batch:
+                    refresh_streaks(user_id, full=True)
+        self.stdout.write(f'  {total} adherence rollups')
+        return total
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from authentication.adherence import rebuild_rollups, refresh_streaks, week_start
+from authentication.models import Reminder, ReminderLog
+
+
+class Command(BaseCommand):
+    help = 'Rebuild reminder adherence rollups and streaks (run nightly, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=8,
+                            help='Rebuild the weeks containing the last this many days')
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild all history and recount longest streaks')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users per batch')
+
+    def handle(self, *args, **options):
+        # Time zones ahead of UTC are already on tomorrow; each reminder's
+        # days are still cut off at its own yesterday
+        today = timezone.localdate() + timedelta(days=1)
+        if options['full']:
+            first_log = ReminderLog.objects.aggregate(first=Min('date'))['first']
+            first_created = Reminder.objects.aggregate(first=Min('created_at'))['first']
+            if first_created is None:
+                self.stdout.write('No reminders to roll up')
+                return
+            first = min(filter(None, [first_log, first_created.date()]))
+        else:
+            first = today - timedelta(days=options['days'])
+        weeks = []
+        week = week_start(first)
+        while week <= today:
+            weeks.append(week)
+            week += timedelta(weeks=1)
+
+        started = time.perf_counter()
+        user_ids = sorted(set(Reminder.objects.values_list('user_id', flat=True)))
+        rows = 0
+        for start in range(0, len(user_ids), options['batch_size']):
+            batch = user_ids[start:start + options['batch_size']]
+            # One commit per batch rather than one per user
+            with transaction.atomic():
+                rows += rebuild_rollups(batch, weeks)
+                for user_id in batch:
+                    refresh_streaks(user_id, full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {len(weeks)} weeks for {len(user_ids)} users: '
+            f'{rows} rollup rows in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from authentication.importers import claim_next_job, requeue_stale_jobs, run_import_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued bulk inventory uploads (run one or more of these alongside the web server)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling for new jobs')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue running jobs with no progress for this many seconds')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+        while True:
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale import jobs'))
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Import job {job.pk}: {job.file_name} for {job.pharmacy.username}')
+            started = time.perf_counter()
+            try:
+                result = run_import_job(job)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Import job {job.pk} failed: {e}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'Import job {job.pk} done in {time.perf_counter() - started:.1f}s: '
+                f'{result.processed_rows} rows, {result.failed_rows} errors'
+            ))
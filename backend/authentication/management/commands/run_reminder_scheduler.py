@@ -0,0 +1,85 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from authentication.models import Reminder
+from authentication.reminders import ReminderSchedule, due_reminder_times
+from authentication.views import notify_medicine_reminder
+
+DISPATCH_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Send medicine reminder push notifications at their scheduled times (run one alongside the web server)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help='Seconds between checks for created, edited or deactivated reminders')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Log due reminders instead of sending notifications')
+        parser.add_argument('--catch-up', type=float, default=0.0,
+                            help='On startup, send reminders that fell due this many seconds ago, '
+                                 'e.g. while the scheduler was restarting (less than a day)')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['catch_up'] < 24 * 60 * 60:
+            raise CommandError('--catch-up must be at least 0 and less than a day')
+
+        schedule = ReminderSchedule()
+        started = time.perf_counter()
+        now = timezone.now()
+        count = schedule.load(now)
+        self.stdout.write(f'Scheduled {count} reminders in {time.perf_counter() - started:.1f}s')
+        if options['catch_up']:
+            self.catch_up(schedule, now, timedelta(seconds=options['catch_up']), options['dry_run'])
+
+        next_poll = time.monotonic() + options['poll_interval']
+        while True:
+            self.dispatch(schedule, schedule.pop_due(), options['dry_run'])
+
+            if time.monotonic() >= next_poll:
+                changed = schedule.refresh()
+                if changed:
+                    self.stdout.write(f'Applied {changed} reminder changes ({len(schedule)} scheduled)')
+                next_poll = time.monotonic() + options['poll_interval']
+                continue
+
+            # Sleep until the next reminder is due or the next poll, whichever is sooner
+            timeout = next_poll - time.monotonic()
+            fire_at = schedule.next_fire_time()
+            if fire_at is not None:
+                timeout = min(timeout, (fire_at - timezone.now()).total_seconds())
+            if timeout > 0:
+                time.sleep(timeout)
+
+    def catch_up(self, schedule, now, window, dry_run):
+        # The schedule only holds fire times after ``now``; earlier ones are
+        # one range query on the (timezone, minute_of_day) index
+        due = list(
+            due_reminder_times(now - window, now).order_by('reminder_id')
+            .values_list('reminder_id', flat=True).distinct()
+        )
+        self.stdout.write(f'Catching up on {len(due)} reminders due in the last {window}')
+        self.dispatch(schedule, due, dry_run)
+
+    def dispatch(self, schedule, due, dry_run):
+        # Popular times like 08:00 can be due for many reminders at once
+        for start in range(0, len(due), DISPATCH_BATCH_SIZE):
+            self.dispatch_batch(schedule, due[start:start + DISPATCH_BATCH_SIZE], dry_run)
+
+    def dispatch_batch(self, schedule, due, dry_run):
+        # Re-read the batch: rows deleted or deactivated since the last poll are skipped
+        reminders = Reminder.objects.filter(pk__in=due, active=True).select_related('user').in_bulk()
+        schedule.discard(pk for pk in due if pk not in reminders)
+        sent = 0
+        for reminder in reminders.values():
+            if dry_run:
+                self.stdout.write(f'Reminder {reminder.pk}: {reminder.medicine_name} for {reminder.user.username}')
+                continue
+            # The notifier logs its own errors and reports failure as False
+            if notify_medicine_reminder(reminder.user, reminder):
+                sent += 1
+        if not dry_run:
+            self.stdout.write(f'Sent {sent} of {len(reminders)} due reminders')
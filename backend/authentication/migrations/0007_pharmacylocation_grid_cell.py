@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:59
+
+from django.db import migrations, models
+
+from authentication.geo import grid_cell_for
+
+
+def populate_grid_cells(apps, schema_editor):
+    PharmacyLocation = apps.get_model('authentication', 'PharmacyLocation')
+    locations = list(PharmacyLocation.objects.only('id', 'latitude', 'longitude'))
+    for location in locations:
+        location.grid_cell = grid_cell_for(location.latitude, location.longitude)
+    PharmacyLocation.objects.bulk_update(locations, ['grid_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_prescription_extracted_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pharmacylocation',
+            name='grid_cell',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Spatial grid cell derived from latitude/longitude', max_length=20),
+        ),
+        migrations.RunPython(populate_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE authentication_medicine_fts USING fts5(
+        name, generic_name,
+        content='authentication_medicine', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER authentication_medicine_fts_ai AFTER INSERT ON authentication_medicine BEGIN
+        INSERT INTO authentication_medicine_fts(rowid, name, generic_name)
+        VALUES (new.id, new.name, new.generic_name);
+    END
+    """,
+    """
+    CREATE TRIGGER authentication_medicine_fts_ad AFTER DELETE ON authentication_medicine BEGIN
+        INSERT INTO authentication_medicine_fts(authentication_medicine_fts, rowid, name, generic_name)
+        VALUES ('delete', old.id, old.name, old.generic_name);
+    END
+    """,
+    """
+    CREATE TRIGGER authentication_medicine_fts_au AFTER UPDATE OF name, generic_name ON authentication_medicine BEGIN
+        INSERT INTO authentication_medicine_fts(authentication_medicine_fts, rowid, name, generic_name)
+        VALUES ('delete', old.id, old.name, old.generic_name);
+        INSERT INTO authentication_medicine_fts(rowid, name, generic_name)
+        VALUES (new.id, new.name, new.generic_name);
+    END
+    """,
+    "INSERT INTO authentication_medicine_fts(authentication_medicine_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS authentication_medicine_fts_au',
+    'DROP TRIGGER IF EXISTS authentication_medicine_fts_ad',
+    'DROP TRIGGER IF EXISTS authentication_medicine_fts_ai',
+    'DROP TABLE IF EXISTS authentication_medicine_fts',
+]
+
+
+def create_fts(apps, schema_editor):
+    # Only SQLite gets the trigram index; other backends use icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_pharmacylocation_grid_cell'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
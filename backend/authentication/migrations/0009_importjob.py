@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0008_medicine_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/%Y/%m/%d/')),
+                ('file_name', models.CharField(help_text='Name of the uploaded file', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('failed_rows', models.PositiveIntegerField(default=0)),
+                ('created_medicines', models.PositiveIntegerField(default=0)),
+                ('created_inventory', models.PositiveIntegerField(default=0)),
+                ('error_rows', models.JSONField(blank=True, default=list, help_text='Rejected rows with their values and errors')),
+                ('message', models.TextField(blank=True, help_text='Reason the whole job failed, if it did')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pharmacy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='authenticat_status_5dcdd7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0009_importjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['pharmacy', 'updated_at', 'id'], name='authenticat_pharmac_343ed1_idx'),
+        ),
+    ]
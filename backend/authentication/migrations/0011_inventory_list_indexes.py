@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0010_inventory_sync_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['pharmacy', 'quantity', 'id'], name='authenticat_pharmac_1d361b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['pharmacy', 'expiry_date', 'id'], name='authenticat_pharmac_c49e9b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['pharmacy', 'price', 'id'], name='authenticat_pharmac_f0ec5f_idx'),
+        ),
+    ]
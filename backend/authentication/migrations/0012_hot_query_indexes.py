@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0011_inventory_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['medicine', 'pharmacy', 'quantity', 'price'], name='inventory_in_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['pharmacy', 'is_available', 'quantity', 'expiry_date'], name='inventory_dashboard_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pharmacylocation',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['grid_cell', 'latitude', 'longitude', 'user'], name='pharmacy_active_grid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(condition=models.Q(('active', True)), fields=['user', 'medicine_name'], name='reminder_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reminderlog',
+            index=models.Index(fields=['date', 'taken', 'reminder'], name='reminderlog_date_taken_idx'),
+        ),
+    ]
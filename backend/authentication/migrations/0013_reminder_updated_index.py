@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['updated_at', 'id'], name='reminder_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:48
+
+import authentication.models
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# A copy of authentication.models.parse_times as of this migration
+def parse_times(times):
+    minutes = set()
+    for value in (times or '').split(','):
+        try:
+            hour, minute = value.strip().split(':')
+            hour, minute = int(hour), int(minute)
+        except ValueError:
+            continue
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            minutes.add(hour * 60 + minute)
+    return tuple(sorted(minutes))
+
+
+def populate_reminder_times(apps, schema_editor):
+    Reminder = apps.get_model('authentication', 'Reminder')
+    ReminderTime = apps.get_model('authentication', 'ReminderTime')
+    rows = [
+        ReminderTime(reminder_id=pk, minute_of_day=minute, timezone=timezone)
+        for pk, times, timezone in Reminder.objects.filter(active=True).values_list('id', 'times', 'timezone').iterator()
+        for minute in parse_times(times)
+    ]
+    ReminderTime.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0013_reminder_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='timezone',
+            field=models.CharField(default='UTC', help_text='Time zone the times are in, e.g. Asia/Kolkata', max_length=64, validators=[authentication.models.validate_timezone]),
+        ),
+        migrations.CreateModel(
+            name='ReminderTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute_of_day', models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(1439)])),
+                ('timezone', models.CharField(max_length=64)),
+                ('reminder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_times', to='authentication.reminder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timezone', 'minute_of_day', 'reminder'], name='remindertime_due_idx')],
+                'unique_together': {('reminder', 'minute_of_day')},
+            },
+        ),
+        migrations.RunPython(populate_reminder_times, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0014_reminder_times'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('scheduled', models.PositiveIntegerField(default=0)),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('reminder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='adherence_rollups', to='authentication.reminder')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='adherence_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'reminder', 'period', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AdherenceStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current', models.PositiveIntegerField(default=0)),
+                ('longest', models.PositiveIntegerField(default=0)),
+                ('last_day', models.DateField(blank=True, help_text='Last day of the current streak', null=True)),
+                ('reminder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='adherence_streaks', to='authentication.reminder')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='adherence_streaks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'reminder')},
+            },
+        ),
+    ]
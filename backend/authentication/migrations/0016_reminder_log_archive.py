@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0015_adherence_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('logged', models.PositiveIntegerField(default=0)),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('reminder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_archives', to='authentication.reminder')),
+            ],
+            options={
+                'unique_together': {('reminder', 'month')},
+            },
+        ),
+    ]
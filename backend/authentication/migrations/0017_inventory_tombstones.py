@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0016_reminder_log_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('medicine_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+                ('pharmacy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_tombstones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['pharmacy', 'deleted_at', 'id'], name='inventorytombstone_sync_idx')],
+                'unique_together': {('pharmacy', 'medicine_id')},
+            },
+        ),
+    ]
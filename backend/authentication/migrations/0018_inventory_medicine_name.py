@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:11
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_medicine_names(apps, schema_editor):
+    Inventory = apps.get_model('authentication', 'Inventory')
+    Medicine = apps.get_model('authentication', 'Medicine')
+    Inventory.objects.update(medicine_name=Subquery(Medicine.objects.filter(pk=OuterRef('medicine_id')).values('name')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0017_inventory_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='medicine_name',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(copy_medicine_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['pharmacy', 'medicine_name', 'id'], name='inventory_name_idx'),
+        ),
+    ]
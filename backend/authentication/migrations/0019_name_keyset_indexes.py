@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0018_inventory_medicine_name'),
+    ]
+
+    operations = [
+        migrations.RenameIndex(
+            model_name='importjob',
+            new_name='importjob_queue_idx',
+            old_name='authenticat_status_5dcdd7_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='inventory',
+            new_name='inventory_updated_idx',
+            old_name='authenticat_pharmac_343ed1_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='inventory',
+            new_name='inventory_quantity_idx',
+            old_name='authenticat_pharmac_1d361b_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='inventory',
+            new_name='inventory_expiry_idx',
+            old_name='authenticat_pharmac_c49e9b_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='inventory',
+            new_name='inventory_price_idx',
+            old_name='authenticat_pharmac_f0ec5f_idx',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:17
+
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def pause_inactive_reminders(apps, schema_editor):
+    # Keep the previous rule for reminders already switched off: due up to
+    # their last edit
+    Reminder = apps.get_model('authentication', 'Reminder')
+    ReminderPause = apps.get_model('authentication', 'ReminderPause')
+    rows = [
+        ReminderPause(reminder_id=pk, start=updated_at.astimezone(ZoneInfo(timezone)).date() + timedelta(days=1))
+        for pk, timezone, updated_at in Reminder.objects.filter(active=False).values_list('id', 'timezone', 'updated_at').iterator()
+    ]
+    ReminderPause.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0019_name_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderPause',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField()),
+                ('end', models.DateField(blank=True, null=True)),
+                ('reminder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pauses', to='authentication.reminder')),
+            ],
+        ),
+        migrations.RunPython(pause_inactive_reminders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+import math
+
+from django.db import migrations
+
+# authentication.geo.GRID_CELL_DEGREES as of this migration
+GRID_CELL_DEGREES = 0.1
+
+
+def wrap_grid_cells(apps, schema_editor):
+    # Only longitude 180 fell past the last column; it belongs in column 0
+    PharmacyLocation = apps.get_model('authentication', 'PharmacyLocation')
+    locations = list(PharmacyLocation.objects.filter(longitude__gte=180).only('id', 'latitude', 'longitude'))
+    for location in locations:
+        row = math.floor((float(location.latitude) + 90) / GRID_CELL_DEGREES)
+        col = math.floor((float(location.longitude) + 180) / GRID_CELL_DEGREES)
+        location.grid_cell = f"{row}:{col % round(360 / GRID_CELL_DEGREES)}"
+    PharmacyLocation.objects.bulk_update(locations, ['grid_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0020_reminder_pauses'),
+    ]
+
+    operations = [
+        migrations.RunPython(wrap_grid_cells, migrations.RunPython.noop),
+    ]
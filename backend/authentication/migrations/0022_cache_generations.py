@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0021_wrap_grid_cells'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('value', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:31
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0022_cache_generations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(models.F('pharmacy'), django.db.models.functions.text.Lower('medicine_name'), name='inventory_name_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0023_inventory_name_lower_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventory',
+            name='inventory_in_stock_idx',
+        ),
+    ]
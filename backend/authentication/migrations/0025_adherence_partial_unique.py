@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:36
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_overall_rows(apps, schema_editor):
+    # The old unique_together let NULL-reminder rows repeat; keep the newest.
+    # Duplicated rollup counts are rebuilt by the next rollup_adherence run.
+    for model_name, fields in (
+        ('AdherenceRollup', ['user', 'period', 'period_start']),
+        ('AdherenceStreak', ['user']),
+    ):
+        model = apps.get_model('authentication', model_name)
+        overall = model.objects.filter(reminder__isnull=True)
+        keep = overall.values(*fields).order_by().annotate(keep=Max('id')).values('keep')
+        overall.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0024_drop_inventory_in_stock_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_overall_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='adherencerollup',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='adherencestreak',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='adherencerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('reminder__isnull', False)), fields=('user', 'reminder', 'period', 'period_start'), name='adherencerollup_reminder_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='adherencerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('reminder__isnull', True)), fields=('user', 'period', 'period_start'), name='adherencerollup_overall_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='adherencestreak',
+            constraint=models.UniqueConstraint(condition=models.Q(('reminder__isnull', False)), fields=('user', 'reminder'), name='adherencestreak_reminder_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='adherencestreak',
+            constraint=models.UniqueConstraint(condition=models.Q(('reminder__isnull', True)), fields=('user',), name='adherencestreak_overall_uniq'),
+        ),
+    ]
@@ -1,6 +1,16 @@
-from django.db import models
+import sys
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo, available_timezones
+
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone as django_timezone
+from .geo import grid_cell_for
 
 class User(AbstractUser):
     is_pharmacy = models.BooleanField(default=False, verbose_name="Pharmacy Account")
@@ -17,12 +27,32 @@ class PharmacyLocation(models.Model):
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     phone = models.CharField(max_length=20, blank=True)
     is_active = models.BooleanField(default=True)
+    grid_cell = models.CharField(
+        max_length=20, editable=False, db_index=True, default='',
+        help_text="Spatial grid cell derived from latitude/longitude"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.name} - {self.address}"
 
+    class Meta:
+        indexes = [
+            # Nearby search: active pharmacies by grid cell, then coordinates
+            models.Index(
+                fields=['grid_cell', 'latitude', 'longitude', 'user'], name='pharmacy_active_grid_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.grid_cell = grid_cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'grid_cell'}
+        super().save(*args, **kwargs)
+
 class Medicine(models.Model):
     name = models.CharField(max_length=200)
     generic_name = models.CharField(max_length=200, blank=True)
@@ -36,37 +66,188 @@ class Medicine(models.Model):
     class Meta:
         unique_together = ['name', 'generic_name']
 
+class CacheGeneration(models.Model):
+    """Counters shared by every process (web workers, the import worker),
+    for in-process caches to notice that what they hold has gone stale."""
+    key = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+    @classmethod
+    def get_many(cls, keys):
+        """{key: value} for the keys that have been bumped."""
+        return dict(cls.objects.filter(key__in=keys).values_list('key', 'value'))
+
+    @classmethod
+    def bump(cls, keys):
+        """Give each key a new value. Values are timestamps, so a counter
+        lost with a restored database can't repeat one seen before."""
+        value = time.time_ns()
+        cls.objects.bulk_create(
+            [cls(key=key, value=value) for key in keys],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['value'],
+        )
+
+class InventoryQuerySet(models.QuerySet):
+    def low_stock(self):
+        return self.filter(quantity__lte=Inventory.LOW_STOCK_THRESHOLD)
+
+    def expiring_soon(self, today=None):
+        """Not yet expired, but expiring within EXPIRY_WARNING_DAYS."""
+        today = today or date.today()
+        return self.filter(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=Inventory.EXPIRY_WARNING_DAYS))
+
+    def expired(self, today=None):
+        return self.filter(expiry_date__lt=today or date.today())
+
+    def name_startswith(self, prefix):
+        """Rows whose medicine name starts with ``prefix``, ignoring case.
+
+        A range on LOWER(medicine_name), served by inventory_name_lower_idx;
+        istartswith is a LIKE on SQLite, which can't use an index.
+        """
+        low = prefix.lower()
+        rows = self.alias(medicine_name_lower=Lower('medicine_name')).filter(medicine_name_lower__gte=low)
+        if ord(low[-1]) < sys.maxunicode:
+            rows = rows.filter(medicine_name_lower__lt=low[:-1] + chr(ord(low[-1]) + 1))
+        return rows
+
+    def dashboard_stats(self, today=None):
+        """Item, availability, low stock and expiry counts in one aggregate query."""
+        today = today or date.today()
+        return self.aggregate(
+            total_items=models.Count('id'),
+            available_items=models.Count('id', filter=models.Q(is_available=True)),
+            low_stock_count=models.Count('id', filter=models.Q(quantity__lte=Inventory.LOW_STOCK_THRESHOLD)),
+            expiring_soon_count=models.Count('id', filter=models.Q(
+                expiry_date__gte=today,
+                expiry_date__lte=today + timedelta(days=Inventory.EXPIRY_WARNING_DAYS),
+            )),
+            expired_count=models.Count('id', filter=models.Q(expiry_date__lt=today)),
+        )
+
 class Inventory(models.Model):
+    LOW_STOCK_THRESHOLD = 5
+    EXPIRY_WARNING_DAYS = 30
+
     pharmacy = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inventory_items')
     medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
+    # Copy of medicine.name, so the inventory list sorts by name on its own
+    # index; kept in step on save and by the Medicine post_save signal
+    medicine_name = models.CharField(max_length=200, editable=False, default='')
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(0)])
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     is_available = models.BooleanField(default=True)
     expiry_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.medicine.name} - {self.pharmacy.username} - Qty: {self.quantity}"
     
     @property
     def is_low_stock(self):
-        return self.quantity <= 5
+        return self.quantity <= self.LOW_STOCK_THRESHOLD
+
+    def save(self, *args, **kwargs):
+        self.medicine_name = self.medicine.name
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'medicine' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'medicine_name'}
+        super().save(*args, **kwargs)
 
     @property
     def is_expiring_soon(self):
-        from datetime import date, timedelta
         if self.expiry_date:
-            return self.expiry_date <= date.today() + timedelta(days=30)
+            return self.expiry_date <= date.today() + timedelta(days=self.EXPIRY_WARNING_DAYS)
         return False
 
     @property
     def is_expired(self):
-        from datetime import date
         return self.expiry_date and self.expiry_date < date.today()
 
     class Meta:
         unique_together = ['pharmacy', 'medicine']
+        indexes = [
+            # Delta sync pulls and the "recently updated" inventory sort
+            models.Index(fields=['pharmacy', 'updated_at', 'id'], name='inventory_updated_idx'),
+            # Keyset pages of the inventory list: WHERE pharmacy = ? ORDER BY <field>, id
+            models.Index(fields=['pharmacy', 'medicine_name', 'id'], name='inventory_name_idx'),
+            # Name prefix filter of the inventory list (name_startswith)
+            models.Index('pharmacy', Lower('medicine_name'), name='inventory_name_lower_idx'),
+            models.Index(fields=['pharmacy', 'quantity', 'id'], name='inventory_quantity_idx'),
+            models.Index(fields=['pharmacy', 'expiry_date', 'id'], name='inventory_expiry_idx'),
+            models.Index(fields=['pharmacy', 'price', 'id'], name='inventory_price_idx'),
+            # Covers the dashboard_stats() aggregate without touching the table
+            models.Index(fields=['pharmacy', 'is_available', 'quantity', 'expiry_date'], name='inventory_dashboard_idx'),
+        ]
+
+class InventoryTombstone(models.Model):
+    """A deleted Inventory row, reported by delta sync pulls so POS clients
+    can drop it too. One row per pharmacy and medicine, restamped when the
+    medicine is stocked and deleted again. Written by a post_delete signal."""
+    pharmacy = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inventory_tombstones')
+    # Not a foreign key: deleting the medicine is one way its stock goes away
+    medicine_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('pharmacy', 'medicine_id')
+        indexes = [
+            # Delta sync pulls, like Inventory(pharmacy, updated_at, id)
+            models.Index(fields=['pharmacy', 'deleted_at', 'id'], name='inventorytombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.pharmacy_id} medicine {self.medicine_id} deleted {self.deleted_at}"
+
+class ImportJob(models.Model):
+    """A bulk inventory upload queued for the run_import_worker command."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    pharmacy = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    file = models.FileField(upload_to='imports/%Y/%m/%d/')
+    file_name = models.CharField(max_length=255, help_text="Name of the uploaded file")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    processed_rows = models.PositiveIntegerField(default=0)
+    failed_rows = models.PositiveIntegerField(default=0)
+    created_medicines = models.PositiveIntegerField(default=0)
+    created_inventory = models.PositiveIntegerField(default=0)
+    error_rows = models.JSONField(default=list, blank=True, help_text="Rejected rows with their values and errors")
+    message = models.TextField(blank=True, help_text="Reason the whole job failed, if it did")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.pharmacy.username}) - {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # claim_next_job: the oldest pending jobs
+            models.Index(fields=['status', 'created_at'], name='importjob_queue_idx'),
+        ]
 
 class CustomerLocation(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='customer_location')
@@ -80,6 +261,42 @@ class CustomerLocation(models.Model):
         return f"{self.user.username} - {self.address}"
 
 # --- Reminders for regular users ---
+def parse_times(times, strict=False):
+    """Return the sorted, distinct minutes of the day in a comma-separated
+    "HH:MM" string. Entries that don't parse are ignored, or with ``strict``
+    raise ValueError; blank entries are always skipped."""
+    minutes = set()
+    for value in (times or '').split(','):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            hour, minute = value.split(':')
+            hour, minute = int(hour), int(minute)
+        except ValueError:
+            hour = minute = None
+        if hour is not None and 0 <= hour < 24 and 0 <= minute < 60:
+            minutes.add(hour * 60 + minute)
+        elif strict:
+            raise ValueError(f"Invalid time '{value}'")
+    return tuple(sorted(minutes))
+
+
+@lru_cache(maxsize=1)
+def timezone_names():
+    return frozenset(available_timezones())
+
+
+def validate_timezone(value):
+    if value not in timezone_names():
+        raise ValidationError(f"Unknown time zone '{value}'")
+
+
+def local_today(tz_name, now=None):
+    """Today's date in the time zone ``tz_name``."""
+    return (now or django_timezone.now()).astimezone(ZoneInfo(tz_name)).date()
+
+
 class Reminder(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminders')
     medicine_name = models.CharField(max_length=200)
@@ -87,6 +304,10 @@ class Reminder(models.Model):
         max_length=200,
         help_text="Comma-separated times in 24h format, e.g. 08:00, 20:00"
     )
+    timezone = models.CharField(
+        max_length=64, default='UTC', validators=[validate_timezone],
+        help_text="Time zone the times are in, e.g. Asia/Kolkata"
+    )
     notes = models.CharField(max_length=255, blank=True)
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -95,7 +316,91 @@ class Reminder(models.Model):
     def __str__(self):
         return f"{self.medicine_name} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            was_active = None
+            if not self._state.adding:
+                was_active = Reminder.objects.filter(pk=self.pk).values_list('active', flat=True).first()
+            super().save(*args, **kwargs)
+            self.schedule_times.all().delete()
+            ReminderTime.objects.bulk_create(ReminderTime.rows_for(self))
+            if self.active != (True if was_active is None else was_active):
+                self._record_pause(created=was_active is None)
+
+    def local_today(self, now=None):
+        return local_today(self.timezone, now)
+
+    def _record_pause(self, created):
+        today = self.local_today()
+        if not self.active:
+            # The day a reminder is switched off stays due, unless it never was on
+            ReminderPause.objects.create(reminder=self, start=today if created else today + timedelta(days=1))
+            return
+        pause = self.pauses.filter(end__isnull=True).first()
+        if pause is None:
+            return
+        if today <= pause.start:
+            pause.delete()
+        else:
+            pause.end = today
+            pause.save(update_fields=['end'])
+
+    class Meta:
+        indexes = [
+            # A user's active reminders, listed by medicine name. SQLite can't
+            # use a boolean column as an index equality, so active is the
+            # partial condition instead of a key column.
+            models.Index(
+                fields=['user', 'medicine_name'], name='reminder_user_active_idx',
+                condition=models.Q(active=True),
+            ),
+            # Edits polled by run_reminder_scheduler
+            models.Index(fields=['updated_at', 'id'], name='reminder_updated_idx'),
+        ]
+
+class ReminderTime(models.Model):
+    """One row per time of day of an active reminder, derived from
+    Reminder.times on save. Inactive reminders have no rows."""
+    reminder = models.ForeignKey(Reminder, on_delete=models.CASCADE, related_name='schedule_times')
+    minute_of_day = models.PositiveSmallIntegerField(validators=[MaxValueValidator(24 * 60 - 1)])
+    # Copied from the reminder so due lookups never join
+    timezone = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('reminder', 'minute_of_day')
+        indexes = [
+            # Reminders due in a window: one range of local minutes per time zone
+            models.Index(fields=['timezone', 'minute_of_day', 'reminder'], name='remindertime_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reminder_id} at {self.minute_of_day // 60:02d}:{self.minute_of_day % 60:02d} {self.timezone}"
+
+    @classmethod
+    def rows_for(cls, reminder):
+        """Unsaved rows for ``reminder``, for bulk_create."""
+        if not reminder.active:
+            return []
+        return [
+            cls(reminder=reminder, minute_of_day=minute, timezone=reminder.timezone)
+            for minute in parse_times(reminder.times)
+        ]
+
+class ReminderPause(models.Model):
+    """Days an inactive reminder was not due, in its time zone: from start
+    up to but not including end, which is null while it is still inactive.
+    Recorded by Reminder.save; read by authentication.adherence."""
+    reminder = models.ForeignKey(Reminder, on_delete=models.CASCADE, related_name='pauses')
+    start = models.DateField()
+    end = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.reminder_id} paused {self.start} to {self.end or 'now'}"
+
 class ReminderLog(models.Model):
+    # How far back logs may still be written; older months are archived
+    EDITABLE_DAYS = 31
+
     reminder = models.ForeignKey(Reminder, on_delete=models.CASCADE, related_name='logs')
     date = models.DateField()
     taken = models.BooleanField(default=False)
@@ -103,10 +408,101 @@ class ReminderLog(models.Model):
 
     class Meta:
         unique_together = ('reminder', 'date')
+        indexes = [
+            # Per-day adherence across all reminders
+            models.Index(fields=['date', 'taken', 'reminder'], name='reminderlog_date_taken_idx'),
+        ]
 
     def __str__(self):
         return f"{self.reminder.medicine_name} - {self.date} - {'taken' if self.taken else 'pending'}"
 
+class ReminderLogArchive(models.Model):
+    """A closed month of a reminder's ReminderLog rows folded into two
+    bitsets: bit ``day - 1`` of ``logged`` is set when the day had a log,
+    and the same bit of ``taken`` when it was taken. Written by the
+    compact_reminder_logs command; read back through
+    authentication.archive.reminder_log_days."""
+    reminder = models.ForeignKey(Reminder, on_delete=models.CASCADE, related_name='log_archives')
+    month = models.DateField(help_text="First day of the month")
+    logged = models.PositiveIntegerField(default=0)
+    taken = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('reminder', 'month')
+
+    def __str__(self):
+        return f"{self.reminder_id} {self.month:%Y-%m}: {bin(self.taken).count('1')}/{bin(self.logged).count('1')} taken"
+
+class AdherenceRollup(models.Model):
+    """Days a reminder was due vs taken, per day or per week (starting
+    Monday). Rows without a reminder total all of the user's reminders.
+    Maintained by authentication.adherence."""
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+    PERIOD_CHOICES = [
+        (PERIOD_DAY, 'Day'),
+        (PERIOD_WEEK, 'Week'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='adherence_rollups')
+    reminder = models.ForeignKey(
+        Reminder, on_delete=models.CASCADE, null=True, blank=True, related_name='adherence_rollups'
+    )
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    scheduled = models.PositiveIntegerField(default=0)
+    taken = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Two partial constraints, as NULL reminders never collide in a
+        # plain unique index. The overall one also serves reads:
+        # WHERE user = ? AND reminder IS NULL AND period = ? AND period_start >= ?
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'reminder', 'period', 'period_start'], name='adherencerollup_reminder_uniq',
+                condition=models.Q(reminder__isnull=False),
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'period', 'period_start'], name='adherencerollup_overall_uniq',
+                condition=models.Q(reminder__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.reminder_id or 'all'} {self.period} {self.period_start}: {self.taken}/{self.scheduled}"
+
+class AdherenceStreak(models.Model):
+    """Consecutive due days taken, per reminder or (without a reminder)
+    for days on which all of the user's due reminders were taken."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='adherence_streaks')
+    reminder = models.ForeignKey(
+        Reminder, on_delete=models.CASCADE, null=True, blank=True, related_name='adherence_streaks'
+    )
+    current = models.PositiveIntegerField(default=0)
+    longest = models.PositiveIntegerField(default=0)
+    last_day = models.DateField(null=True, blank=True, help_text="Last day of the current streak")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'reminder'], name='adherencestreak_reminder_uniq',
+                condition=models.Q(reminder__isnull=False),
+            ),
+            models.UniqueConstraint(
+                fields=['user'], name='adherencestreak_overall_uniq', condition=models.Q(reminder__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.reminder_id or 'all'}: {self.current} (longest {self.longest})"
+
+    def current_as_of(self, today=None):
+        """The current streak, or 0 once a due day after last_day was missed."""
+        today = today or date.today()
+        if self.last_day and self.last_day >= today - timedelta(days=1):
+            return self.current
+        return 0
+
 # --- Prescription Upload for regular users ---
 class Prescription(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='prescriptions')
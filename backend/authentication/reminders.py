@@ -0,0 +1,283 @@
+"""Reminder schedule lookups.
+
+Reminder.times is normalized into ReminderTime rows (one per active
+reminder and minute of the day, in the reminder's time zone), so
+due_reminder_times() finds the reminders due in a window with one
+indexed range query per time zone instead of parsing every reminder;
+run_reminder_scheduler --catch-up uses it to send the reminders that
+fell due while the scheduler was down.
+
+record_acknowledgements() applies a batch of "taken" ticks for one user
+as a single ownership-checked upsert on ReminderLog.
+
+ReminderSchedule keeps the next fire time of every active reminder on a
+min-heap for run_reminder_scheduler, so finding the next due batch is
+O(log n) and the scheduler can sleep until then. Edits are picked up
+incrementally by polling Reminder.updated_at (served by the
+(updated_at, id) index); superseded heap entries are left in place and
+skipped when popped. Deleted reminders leave no row to poll for, so
+every batch is re-read before dispatch and rows that are gone or
+inactive are dropped then.
+"""
+import bisect
+import functools
+import heapq
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .adherence import refresh_adherence
+from .models import Reminder, ReminderLog, ReminderTime, local_today
+
+# updated_at is stamped before the saving transaction commits, so each
+# poll re-reads this much history to catch rows that became visible late
+REMINDER_POLL_OVERLAP = timedelta(seconds=5)
+
+MAX_ACKNOWLEDGEMENTS = 1000
+# How far back an offline client may acknowledge doses
+MAX_ACKNOWLEDGEMENT_AGE = timedelta(days=ReminderLog.EDITABLE_DAYS)
+
+
+class AcknowledgementError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def parse_acknowledgements(acknowledgements, user, now=None):
+    """Validate an ``acknowledgements`` list of {"reminder_id", "date",
+    "taken"} objects for ``user``'s reminders; date defaults to the
+    reminder's today and taken to true.
+
+    Dates are checked against each reminder's own time zone, so clients
+    ahead of or behind the server can acknowledge their local today.
+    Returns {(reminder_id, date): taken}, later entries winning; raises
+    AcknowledgementError listing every invalid entry.
+    """
+    if not isinstance(acknowledgements, list) or not acknowledgements:
+        raise AcknowledgementError(['"acknowledgements" must be a non-empty list'])
+    if len(acknowledgements) > MAX_ACKNOWLEDGEMENTS:
+        raise AcknowledgementError([f'At most {MAX_ACKNOWLEDGEMENTS} acknowledgements can be sent at once'])
+
+    entries, errors = [], []
+    for index, item in enumerate(acknowledgements):
+        try:
+            reminder_id = int(item['reminder_id'])
+            day = date.fromisoformat(item['date']) if item.get('date') else None
+            taken = item.get('taken', True)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            errors.append(f'Acknowledgement {index}: reminder_id and an ISO date are required')
+            continue
+        if not isinstance(taken, bool):
+            errors.append(f'Acknowledgement {index}: taken must be true or false')
+        else:
+            entries.append((index, reminder_id, day, taken))
+
+    now = now or timezone.now()
+    zones = dict(
+        Reminder.objects.filter(user=user, pk__in={entry[1] for entry in entries}).values_list('id', 'timezone')
+    )
+    parsed, missing = {}, set()
+    for index, reminder_id, day, taken in entries:
+        if reminder_id not in zones:
+            missing.add(reminder_id)
+            continue
+        today = local_today(zones[reminder_id], now)
+        earliest = today - MAX_ACKNOWLEDGEMENT_AGE
+        day = day or today
+        if not earliest <= day <= today:
+            errors.append(f'Acknowledgement {index}: date must be between {earliest} and {today}')
+        else:
+            parsed[reminder_id, day] = taken
+    errors.extend(f'Reminder {reminder_id}: not found' for reminder_id in sorted(missing))
+    if errors:
+        raise AcknowledgementError(errors)
+    return parsed
+
+
+def record_acknowledgements(user, acknowledgements):
+    """Upsert {(reminder_id, date): taken} into ReminderLog for ``user``'s
+    reminders, all or nothing. Returns the number of logs written.
+
+    One query checks ownership and one INSERT ... ON CONFLICT DO UPDATE
+    writes every log, however many doses are acknowledged; the weeks they
+    fall in are then re-rolled up.
+    """
+    reminder_ids = {reminder_id for reminder_id, _ in acknowledgements}
+    owned = set(Reminder.objects.filter(user=user, pk__in=reminder_ids).values_list('id', flat=True))
+    missing = sorted(reminder_ids - owned)
+    if missing:
+        raise AcknowledgementError([f'Reminder {reminder_id}: not found' for reminder_id in missing])
+
+    with transaction.atomic():
+        ReminderLog.objects.bulk_create(
+            [ReminderLog(reminder_id=reminder_id, date=day, taken=taken)
+             for (reminder_id, day), taken in acknowledgements.items()],
+            update_conflicts=True,
+            unique_fields=['reminder', 'date'],
+            update_fields=['taken', 'marked_at'],
+        )
+        refresh_adherence(user.pk, {day for _, day in acknowledgements}, reminder_ids)
+    return len(acknowledgements)
+
+
+def _minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def due_reminder_times(start, end):
+    """ReminderTime rows due after ``start`` and up to ``end``, which must
+    be less than a day apart. Each time zone is one range of its local
+    minutes on the (timezone, minute_of_day) index."""
+    condition = Q()
+    for name in ReminderTime.objects.values_list('timezone', flat=True).distinct():
+        tz = ZoneInfo(name)
+        local_start, local_end = start.astimezone(tz), end.astimezone(tz)
+        after, until = _minute_of_day(local_start), _minute_of_day(local_end)
+        if local_start.date() == local_end.date():
+            minutes = Q(minute_of_day__gt=after, minute_of_day__lte=until)
+        else:
+            # The window crosses local midnight
+            minutes = Q(minute_of_day__gt=after) | Q(minute_of_day__lte=until)
+        condition |= Q(timezone=name) & minutes
+    if not condition:
+        return ReminderTime.objects.none()
+    return ReminderTime.objects.filter(condition)
+
+
+def next_fire_time(minutes, after, tz):
+    """Return the first of ``minutes`` (minutes of the day in ``tz``)
+    strictly after the aware datetime ``after``."""
+    local = after.astimezone(tz)
+    day = local.date()
+    index = bisect.bisect_right(minutes, _minute_of_day(local))
+    while True:
+        if index == len(minutes):
+            day, index = day + timedelta(days=1), 0
+        fire_at = _local_datetime(day, minutes[index], tz)
+        # Only differs from the bisect when a DST change shifts the clock
+        if fire_at > after:
+            return fire_at
+        index += 1
+
+
+@functools.lru_cache(maxsize=4096)
+def _local_datetime(day, minute, tz):
+    # The same few fire times recur across every reminder
+    return datetime.combine(day, time(minute // 60, minute % 60), tzinfo=tz)
+
+
+class ReminderSchedule:
+    """Min-heap of (fire_at, reminder_id, version) for active reminders.
+
+    ``entries`` maps reminder_id to (version, minutes, tz), version being
+    the reminder's updated_at; a popped heap entry whose version no longer
+    matches was superseded by an edit and is discarded.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.watermark = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, now=None):
+        """Build the schedule from the ReminderTime rows of every active reminder."""
+        now = now or timezone.now()
+        self.heap, self.entries = [], {}
+        self.watermark = now
+        rows = (
+            ReminderTime.objects.order_by('reminder_id', 'minute_of_day')
+            .values_list('reminder_id', 'minute_of_day', 'timezone', 'reminder__updated_at')
+        )
+        for pk, group in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0]):
+            group = list(group)
+            self._set(pk, [row[1] for row in group], group[0][2], group[0][3], now, push=False)
+        heapq.heapify(self.heap)
+        return len(self.entries)
+
+    def refresh(self, now=None):
+        """Apply reminders created, edited or deactivated since the last
+        load or refresh. Returns the number of schedule changes."""
+        now = now or timezone.now()
+        rows = Reminder.objects.all()
+        if self.watermark is not None:
+            rows = rows.filter(updated_at__gte=self.watermark - REMINDER_POLL_OVERLAP)
+        self.watermark = now
+        versions = {
+            pk: updated_at for pk, updated_at in rows.values_list('id', 'updated_at')
+            if self.entries.get(pk, (None,))[0] != updated_at
+        }
+        if not versions:
+            return 0
+
+        times = {pk: [] for pk in versions}
+        tz_names = {}
+        for pk, minute, name in (
+            ReminderTime.objects.filter(reminder_id__in=versions).order_by('minute_of_day')
+            .values_list('reminder_id', 'minute_of_day', 'timezone')
+        ):
+            times[pk].append(minute)
+            tz_names[pk] = name
+
+        changed = 0
+        for pk, minutes in times.items():
+            if minutes:
+                self._set(pk, minutes, tz_names[pk], versions[pk], now)
+                changed += 1
+            elif self.entries.pop(pk, None) is not None:
+                # Deactivated, or left without valid times
+                changed += 1
+        self._compact()
+        return changed
+
+    def next_fire_time(self):
+        """Return the earliest live fire time, or None when nothing is scheduled."""
+        while self.heap:
+            fire_at, pk, version = self.heap[0]
+            entry = self.entries.get(pk)
+            if entry is not None and entry[0] == version:
+                return fire_at
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now=None):
+        """Pop every live entry due at or before ``now`` and reschedule each
+        one for its next time. Returns the due reminder ids."""
+        now = now or timezone.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, pk, version = heapq.heappop(self.heap)
+            entry = self.entries.get(pk)
+            if entry is None or entry[0] != version:
+                continue
+            due.append(pk)
+            heapq.heappush(self.heap, (next_fire_time(entry[1], max(fire_at, now), entry[2]), pk, version))
+        return due
+
+    def discard(self, pks):
+        """Drop reminders found deleted or inactive at dispatch time."""
+        for pk in pks:
+            self.entries.pop(pk, None)
+
+    def _set(self, pk, minutes, tz_name, version, now, push=True):
+        minutes, tz = tuple(minutes), ZoneInfo(tz_name)
+        self.entries[pk] = (version, minutes, tz)
+        item = (next_fire_time(minutes, now, tz), pk, version)
+        if push:
+            heapq.heappush(self.heap, item)
+        else:
+            self.heap.append(item)
+
+    def _compact(self):
+        # Superseded entries are only removed when they reach the top;
+        # rebuild once they outnumber the live ones
+        if len(self.heap) > 2 * len(self.entries) + 1000:
+            self.heap = [item for item in self.heap if self.entries.get(item[1], (None,))[0] == item[2]]
+            heapq.heapify(self.heap)
@@ -0,0 +1,177 @@
+"""Medicine search: name lookups and the nearby-search result cache.
+
+Name lookups are backed by an SQLite FTS5 trigram index.
+
+The ``authentication_medicine_fts`` virtual table mirrors Medicine.name and
+Medicine.generic_name and is kept in sync by triggers (see migration 0008).
+A trigram phrase query is a case-insensitive substring match, the same
+semantics as ``icontains`` but answered from the index instead of a full
+table scan. Other database backends, and terms shorter than a trigram,
+fall back to ``icontains``.
+
+Nearby-search candidates are cached in the ``search`` cache, keyed by the
+normalized query, the customer's quantized cell, the radius and the
+generation of every pharmacy grid cell the search can reach. Changing an
+Inventory or PharmacyLocation row bumps its cell's generation (see
+``signals.py``), so only the searches covering that area miss afterwards.
+Changing a Medicine bumps the CATALOG_CELL generation instead, which every
+entry depends on, since names decide which items a query matches.
+
+Generations are CacheGeneration rows in the database rather than cache
+entries: the cached candidates may be per process (LocMemCache), but a
+change made by any process, such as the import worker, has to reach the
+searches of every web worker.
+
+Hit/miss counters are kept in process memory rather than in the culled
+``search`` cache, so evictions can't reset them. They are per process and
+best-effort: each worker reports only the searches it served.
+"""
+import hashlib
+import os
+import threading
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .geo import expand_box, grid_cells_for_box, quantize
+
+FTS_TABLE = 'authentication_medicine_fts'
+
+# Trigram indexes cannot answer queries shorter than one trigram
+MIN_FTS_TERM_LENGTH = 3
+
+_fts_tables = {}
+
+
+def fts_enabled():
+    """Whether the medicine FTS table exists on the default database."""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_tables[name] = cursor.fetchone() is not None
+    return _fts_tables[name]
+
+
+def fts_phrase(term):
+    """Quote a search term as a single FTS5 phrase."""
+    return '"%s"' % term.replace('"', '""')
+
+
+def medicine_name_filter(term, prefix=''):
+    """Return a Q matching medicines whose name or generic name contains
+    ``term``. ``prefix`` is the lookup path to the Medicine, e.g.
+    ``'medicine__'`` when filtering Inventory."""
+    term = term.strip()
+    if len(term) >= MIN_FTS_TERM_LENGTH and fts_enabled():
+        matching_ids = RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [fts_phrase(term)],
+        )
+        return Q(**{f'{prefix}id__in': matching_ids})
+    return Q(**{f'{prefix}name__icontains': term}) | Q(**{f'{prefix}generic_name__icontains': term})
+
+
+# Customer positions are snapped to ~2 km cells for cache keys; candidates
+# are fetched for the whole cell grown by the radius, so every customer in
+# the cell can be served from the same entry.
+SEARCH_CELL_DEGREES = 0.02
+
+# Pseudo grid cell whose generation is part of every cache key
+CATALOG_CELL = 'catalog'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def normalize_query(medicine_name):
+    return ' '.join(medicine_name.split()).lower()
+
+
+def _generation_key(cell):
+    return f'search:{cell}'
+
+
+def cell_generations(cells):
+    """Current generation of each grid cell; 0 for cells never changed."""
+    from .models import CacheGeneration
+
+    keys = [_generation_key(cell) for cell in cells]
+    generations = CacheGeneration.get_many(keys)
+    return [generations.get(key, 0) for key in keys]
+
+
+def invalidate_cells(cells):
+    """Drop cached searches touching any of ``cells`` once the current
+    transaction commits, so a search cannot re-cache pre-commit stock."""
+    from .models import CacheGeneration
+
+    keys = sorted({_generation_key(cell) for cell in cells if cell})
+    if keys:
+        transaction.on_commit(lambda: CacheGeneration.bump(keys))
+
+
+def invalidate_pharmacies(pharmacy_ids):
+    """Invalidate the cells of the given pharmacy users' locations."""
+    from .models import PharmacyLocation
+
+    invalidate_cells(PharmacyLocation.objects.filter(user_id__in=pharmacy_ids).values_list('grid_cell', flat=True))
+
+
+def invalidate_catalog():
+    """Drop every cached search once the current transaction commits."""
+    invalidate_cells([CATALOG_CELL])
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Hit/miss counts of this worker process since it started."""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'scope': 'process',
+        'pid': os.getpid(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+def cached_candidates(medicine_name, lat, lng, max_distance, fetch):
+    """Return ``fetch(query, box)`` for the customer's cell, from cache when
+    nothing in the covered cells has changed since it was stored.
+
+    ``box`` is the bounding box of every point within ``max_distance`` km
+    of the customer's quantized cell, so callers still filter the
+    candidates by exact distance.
+    """
+    query = normalize_query(medicine_name)
+    cell, cell_box = quantize(lat, lng, SEARCH_CELL_DEGREES)
+    box = expand_box(cell_box, max_distance)
+    cells = grid_cells_for_box(*box)
+    if cells is None:
+        # Too many cells to track invalidation for
+        return fetch(query, box)
+
+    generations = cell_generations([CATALOG_CELL, *cells])
+    digest = hashlib.sha1(repr((query, cell, max_distance, generations)).encode()).hexdigest()
+    key = f'search:result:{digest}'
+
+    cache = caches['search']
+    candidates = cache.get(key)
+    if candidates is not None:
+        _count('hits')
+        return candidates
+    _count('misses')
+    candidates = fetch(query, box)
+    cache.set(key, candidates)
+    return candidates
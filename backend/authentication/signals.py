@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .adherence import rebuild_rollups, refresh_streaks
+from .catalog import CATALOG_GENERATION, medicine_names
+from .models import (
+    AdherenceRollup, CacheGeneration, Inventory, InventoryTombstone, Medicine, PharmacyLocation, Reminder, User,
+)
+from .search import invalidate_catalog, invalidate_cells, invalidate_pharmacies
+
+
+@receiver(post_save, sender=Medicine)
+def index_medicine(sender, instance, **kwargs):
+    # A rolled back save must not leave its name in the in-memory index
+    transaction.on_commit(lambda: medicine_names.add_medicine(instance))
+
+
+@receiver(post_save, sender=Medicine)
+def copy_medicine_name(sender, instance, created, **kwargs):
+    # Keeps Inventory.medicine_name, the inventory list's sort key, in step.
+    # update() bypasses auto_now; the new stamp sends renames to sync pulls.
+    if not created:
+        stale = Inventory.objects.filter(medicine=instance).exclude(medicine_name=instance.name)
+        stale.update(medicine_name=instance.name, updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Medicine)
+def unindex_medicine(sender, instance, **kwargs):
+    # delete() clears instance.pk before the transaction commits
+    medicine = Medicine(pk=instance.pk, name=instance.name)
+    transaction.on_commit(lambda: medicine_names.remove_medicine(medicine))
+
+
+@receiver(post_save, sender=Medicine)
+@receiver(post_delete, sender=Medicine)
+def bump_catalog_generation(sender, instance, created=False, **kwargs):
+    # Other processes only pick up new ids by themselves; a rename or a
+    # delete makes them rebuild their name indexes
+    if not created:
+        transaction.on_commit(lambda: CacheGeneration.bump([CATALOG_GENERATION]))
+
+
+@receiver(post_save, sender=Medicine)
+@receiver(post_delete, sender=Medicine)
+def invalidate_medicine_searches(sender, instance, **kwargs):
+    # A renamed medicine can match different queries in every cell
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def invalidate_inventory_searches(sender, instance, **kwargs):
+    invalidate_pharmacies([instance.pharmacy_id])
+
+
+def _deleting_user(origin):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(origin_model, User)
+
+
+@receiver(post_delete, sender=Inventory)
+def record_inventory_tombstone(sender, instance, origin=None, **kwargs):
+    # Deleting the pharmacy deletes its tombstones too; don't write new ones
+    if _deleting_user(origin):
+        return
+    InventoryTombstone.objects.bulk_create(
+        [InventoryTombstone(pharmacy_id=instance.pharmacy_id, medicine_id=instance.medicine_id, deleted_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=['pharmacy', 'medicine_id'],
+        update_fields=['deleted_at'],
+    )
+
+
+@receiver(pre_delete, sender=Reminder)
+def remember_adherence_weeks(sender, instance, origin=None, **kwargs):
+    # Read before the reminder's own rollups are cascade deleted
+    if _deleting_user(origin):
+        return
+    instance._adherence_weeks = list(
+        AdherenceRollup.objects.filter(reminder=instance, period=AdherenceRollup.PERIOD_WEEK)
+        .values_list('period_start', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Reminder)
+def rebuild_user_adherence(sender, instance, **kwargs):
+    # The user's combined rollups and streak still count the deleted reminder
+    weeks = getattr(instance, '_adherence_weeks', None)
+    if weeks:
+        rebuild_rollups([instance.user_id], weeks)
+        refresh_streaks(instance.user_id, reminder_ids=[])
+
+
+@receiver(pre_save, sender=PharmacyLocation)
+def remember_previous_grid_cell(sender, instance, **kwargs):
+    instance._previous_grid_cell = None
+    if instance.pk:
+        instance._previous_grid_cell = (
+            PharmacyLocation.objects.filter(pk=instance.pk).values_list('grid_cell', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=PharmacyLocation)
+@receiver(post_delete, sender=PharmacyLocation)
+def invalidate_location_searches(sender, instance, **kwargs):
+    # A moved pharmacy disappears from its old cell and appears in the new one
+    invalidate_cells([instance.grid_cell, getattr(instance, '_previous_grid_cell', None)])
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to each new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,176 @@
+"""Incremental inventory sync for POS integrations.
+
+Pushes apply quantity/price deltas with F() expressions in one
+transaction; pulls page through rows changed since a watermark over
+(updated_at, id), served by the Inventory(pharmacy, updated_at, id) index.
+Deleted rows leave an InventoryTombstone, read the same way over
+(deleted_at, id) and merged into the feed. Both cost O(changes) rather
+than O(catalog).
+"""
+import base64
+import heapq
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importers import MAX_PRICE, MAX_QUANTITY
+from .models import Inventory, InventoryTombstone
+from .search import invalidate_pharmacies
+
+MAX_SYNC_CHANGES = 1000
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+
+# Rows stamped within this window are held back from pulls. A push stamps
+# updated_at before it commits, so without the delay a reader could move
+# its watermark past a row that becomes visible a moment later.
+SYNC_SETTLE_TIME = timedelta(seconds=5)
+
+MAX_PRICE_DECIMAL = Decimal(f'{MAX_PRICE:.2f}')
+
+# Second watermark key: at the same timestamp, updates sort before deletions
+CHANGE_UPDATED, CHANGE_DELETED = 0, 1
+
+
+class SyncError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def parse_deltas(changes):
+    """Validate a push payload's ``changes`` list.
+
+    Returns {medicine_id: (quantity_delta, price_delta)}, summing repeated
+    medicines; raises SyncError listing every invalid entry.
+    """
+    if not isinstance(changes, list) or not changes:
+        raise SyncError(['"changes" must be a non-empty list'])
+    if len(changes) > MAX_SYNC_CHANGES:
+        raise SyncError([f'At most {MAX_SYNC_CHANGES} changes can be sent at once'])
+
+    deltas, errors = {}, []
+    for index, change in enumerate(changes):
+        try:
+            medicine_id = int(change['medicine_id'])
+            quantity_delta = Decimal(str(change.get('quantity_delta', 0)))
+            price_delta = Decimal(str(change.get('price_delta', 0)))
+        except (KeyError, TypeError, ValueError, AttributeError, InvalidOperation):
+            errors.append(f'Change {index}: medicine_id and numeric quantity_delta/price_delta are required')
+            continue
+        if not quantity_delta.is_finite() or quantity_delta != quantity_delta.to_integral_value():
+            errors.append(f'Change {index}: quantity_delta must be a whole number')
+        elif abs(quantity_delta) > MAX_QUANTITY:
+            errors.append(f'Change {index}: quantity_delta must be between -{MAX_QUANTITY} and {MAX_QUANTITY}')
+        elif not price_delta.is_finite():
+            errors.append(f'Change {index}: price_delta must be a number')
+        elif abs(price_delta) > MAX_PRICE_DECIMAL:
+            errors.append(f'Change {index}: price_delta must be between -{MAX_PRICE:.2f} and {MAX_PRICE:.2f}')
+        else:
+            quantity, price = deltas.get(medicine_id, (0, Decimal('0.00')))
+            deltas[medicine_id] = (quantity + int(quantity_delta), price + price_delta.quantize(Decimal('0.01')))
+    if errors:
+        raise SyncError(errors)
+    return deltas
+
+
+def apply_deltas(pharmacy, deltas):
+    """Apply {medicine_id: (quantity_delta, price_delta)} to ``pharmacy``'s
+    inventory, all or nothing.
+
+    Each medicine is one conditional UPDATE, so concurrent sales from
+    several tills add up instead of overwriting each other, and a delta
+    that would take quantity or price below zero or above MAX_QUANTITY or
+    MAX_PRICE fails the whole batch. Returns the number of rows updated.
+    """
+    now = timezone.now()
+    errors, total = [], 0
+    with transaction.atomic():
+        for medicine_id, (quantity_delta, price_delta) in deltas.items():
+            if not quantity_delta and not price_delta:
+                continue
+            rows = Inventory.objects.filter(pharmacy=pharmacy, medicine_id=medicine_id)
+            guarded = rows
+            if quantity_delta < 0:
+                guarded = guarded.filter(quantity__gte=-quantity_delta)
+            elif quantity_delta > 0:
+                guarded = guarded.filter(quantity__lte=MAX_QUANTITY - quantity_delta)
+            if price_delta < 0:
+                guarded = guarded.filter(price__gte=-price_delta)
+            elif price_delta > 0:
+                guarded = guarded.filter(price__lte=MAX_PRICE_DECIMAL - price_delta)
+            updated = guarded.update(
+                quantity=F('quantity') + quantity_delta,
+                price=F('price') + price_delta,
+                # update() bypasses auto_now, and pulls depend on this stamp
+                updated_at=now,
+            )
+            total += updated
+            if not updated:
+                if rows.exists():
+                    errors.append(
+                        f'Medicine {medicine_id}: change would take quantity or price below zero '
+                        f'or above {MAX_QUANTITY} / {MAX_PRICE:.2f}'
+                    )
+                else:
+                    errors.append(f'Medicine {medicine_id}: not in inventory')
+        if errors:
+            transaction.set_rollback(True)
+            raise SyncError(errors)
+        # update() skips the signals that invalidate cached searches
+        invalidate_pharmacies([pharmacy.pk])
+    return total
+
+
+def encode_watermark(stamp, kind, pk):
+    return base64.urlsafe_b64encode(f'{stamp.isoformat()}|{pk}|{kind}'.encode()).decode()
+
+
+def decode_watermark(watermark):
+    """Return (timestamp, kind, id). Watermarks issued before deletions were
+    reported have no kind and resume after an updated row."""
+    stamp, pk, *kind = base64.urlsafe_b64decode(watermark.encode()).decode().split('|')
+    kind = int(kind[0]) if kind else CHANGE_UPDATED
+    if kind not in (CHANGE_UPDATED, CHANGE_DELETED):
+        raise ValueError(f'Unknown change kind {kind}')
+    return datetime.fromisoformat(stamp), kind, int(pk)
+
+
+def changes_since(pharmacy, since=None, limit=SYNC_PAGE_SIZE):
+    """Return (changes, next_watermark, has_more) for inventory rows changed
+    and deleted after the ``since`` (timestamp, kind, id) watermark, oldest
+    first. Changes are Inventory rows, or InventoryTombstones for deletions.
+    """
+    settled = timezone.now() - SYNC_SETTLE_TIME
+    items = (
+        Inventory.objects.filter(pharmacy=pharmacy, updated_at__lte=settled)
+        .select_related('medicine')
+        .order_by('updated_at', 'id')
+    )
+    tombstones = InventoryTombstone.objects.filter(pharmacy=pharmacy, deleted_at__lte=settled).order_by('deleted_at', 'id')
+    if since is not None:
+        stamp, kind, pk = since
+        if kind == CHANGE_UPDATED:
+            items = items.filter(Q(updated_at__gt=stamp) | Q(updated_at=stamp, id__gt=pk))
+            tombstones = tombstones.filter(deleted_at__gte=stamp)
+        else:
+            items = items.filter(updated_at__gt=stamp)
+            tombstones = tombstones.filter(Q(deleted_at__gt=stamp) | Q(deleted_at=stamp, id__gt=pk))
+
+    # Each stream is already in watermark order; the first limit + 1 of
+    # both together are among the first limit + 1 of each
+    changes = list(islice(heapq.merge(
+        ((item.updated_at, CHANGE_UPDATED, item.pk, item) for item in items[:limit + 1]),
+        ((tombstone.deleted_at, CHANGE_DELETED, tombstone.pk, tombstone) for tombstone in tombstones[:limit + 1]),
+    ), limit + 1))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        next_watermark = encode_watermark(*changes[-1][:3])
+    else:
+        next_watermark = encode_watermark(*since) if since is not None else None
+    return [change[3] for change in changes], next_watermark, has_more
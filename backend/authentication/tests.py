@@ -1,3 +1,1326 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .adherence import adherence_summary, rebuild_rollups, refresh_adherence, refresh_streaks, week_start
+from .archive import compact_reminder_logs, reminder_log_days
+from .catalog import MedicineNameIndex
+from .forms import ReminderForm
+from .geo import (
+    bounding_box, grid_cell_for, grid_cells_for_box, haversine_km, haversine_km_array, nearby_location_filter,
+    nearest_within,
+)
+from .importers import (
+    IMPORT_BATCH_SIZE, MissingColumnsError, claim_next_job, import_inventory_file, import_inventory_frame,
+    requeue_stale_jobs, run_import_job,
+)
+from .management.commands import run_reminder_scheduler
+from .models import (
+    AdherenceRollup, AdherenceStreak, CacheGeneration, CustomerLocation, ImportJob, Inventory, InventoryTombstone, Medicine, PharmacyLocation,
+    Prescription, Reminder, ReminderLog, ReminderLogArchive, User, parse_times,
+)
+from .reminders import AcknowledgementError, ReminderSchedule, due_reminder_times, parse_acknowledgements
+from .search import cache_stats, fts_enabled, medicine_name_filter
+from .views import (
+    decode_inventory_cursor, inventory_page, nearby_inventory, search_basket_nearby, search_medicine_nearby,
+)
+
+
+def make_pharmacy(username, latitude, longitude, **kwargs):
+    pharmacy = User.objects.create(username=username, is_pharmacy=True)
+    PharmacyLocation.objects.create(
+        user=pharmacy, name=username.title(), address=f'{username} street',
+        latitude=Decimal(str(latitude)), longitude=Decimal(str(longitude)), **kwargs,
+    )
+    return pharmacy
+
+
+class PharmacyGridTests(TestCase):
+    def test_grid_cell_follows_the_location(self):
+        pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+        location = pharmacy.pharmacy_location
+        self.assertEqual(location.grid_cell, grid_cell_for(15.49, 73.82))
+
+        location.latitude, location.longitude = Decimal('28.61'), Decimal('77.21')
+        location.save(update_fields=['latitude', 'longitude'])
+        location.refresh_from_db()
+        self.assertEqual(location.grid_cell, grid_cell_for(28.61, 77.21))
+
+    def test_cells_wrap_across_the_antimeridian(self):
+        cells = grid_cells_for_box(*bounding_box(0, 179.99, 5))
+        self.assertIn(grid_cell_for(0, 179.99), cells)
+        self.assertIn(grid_cell_for(0, -179.99), cells)
+        self.assertIsNone(grid_cells_for_box(-60, 60, -170, 170))
+
+    def test_pharmacy_on_the_antimeridian_is_found(self):
+        self.assertEqual(grid_cell_for(0, 180), grid_cell_for(0, -180))
+        make_pharmacy('dateline', 0, 180)
+        for lng in (179.99, -179.99):
+            locations = PharmacyLocation.objects.filter(**nearby_location_filter(0, lng, 5))
+            self.assertEqual([location.user.username for location in locations], ['dateline'])
+
+    def test_nearby_filter_excludes_other_cells(self):
+        near = make_pharmacy('near', 15.49, 73.82)
+        make_pharmacy('far', 15.80, 73.82)
+        filters = nearby_location_filter(15.50, 73.83, 10)
+        self.assertEqual(list(PharmacyLocation.objects.filter(**filters).values_list('user_id', flat=True)), [near.pk])
+
+
+class DistanceTests(SimpleTestCase):
+    def test_vectorized_haversine_matches_scalar(self):
+        rng = np.random.default_rng(42)
+        lats, lngs = rng.uniform(-89, 89, 200), rng.uniform(-180, 180, 200)
+        distances = haversine_km_array(15.49, 73.82, lats, lngs)
+        expected = [haversine_km(15.49, 73.82, lat, lng) for lat, lng in zip(lats, lngs)]
+        np.testing.assert_allclose(distances, expected, rtol=1e-9)
+        self.assertEqual(haversine_km_array(0, 0, [0.0], [180.0])[0], haversine_km(0, 0, 0, 180))
+
+    def test_nearest_within_filters_and_orders(self):
+        lats = [15.60, 15.50, 15.55, 16.50, 15.52]
+        lngs = [73.82] * 5
+        indices, distances = nearest_within(15.49, 73.82, lats, lngs, 20)
+        self.assertEqual(indices.tolist(), [1, 4, 2, 0])
+        self.assertTrue(np.all(np.diff(distances) >= 0))
+
+        indices, _ = nearest_within(15.49, 73.82, lats, lngs, 20, limit=2)
+        self.assertEqual(indices.tolist(), [1, 4])
+        self.assertEqual(len(nearest_within(15.49, 73.82, [], [], 20)[0]), 0)
+
+
+class NearbySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.paracetamol = Medicine.objects.create(name='Paracetamol', generic_name='Acetaminophen')
+        # Roughly 1 km, 5 km and 30 km north of the customer
+        cls.near = make_pharmacy('near', 15.509, 73.82)
+        cls.mid = make_pharmacy('mid', 15.545, 73.82)
+        cls.far = make_pharmacy('far', 15.77, 73.82)
+        cls.closed = make_pharmacy('closed', 15.501, 73.82, is_active=False)
+        for pharmacy in (cls.near, cls.mid, cls.far, cls.closed):
+            Inventory.objects.create(pharmacy=pharmacy, medicine=cls.paracetamol, quantity=10, price=Decimal('2.50'))
+
+    def setUp(self):
+        caches['search'].clear()
+        # Look the FTS table up now, so query counts only see the search
+        fts_enabled()
+
+    def test_results_are_in_stock_and_nearest_first(self):
+        Inventory.objects.filter(pharmacy=self.mid).update(quantity=0)
+        results = search_medicine_nearby('paracetamol', Decimal('15.5'), Decimal('73.82'), 10)
+        self.assertEqual([result['pharmacy'] for result in results], [self.near])
+        self.assertAlmostEqual(results[0]['distance'], 1.0, places=1)
+
+        Inventory.objects.filter(pharmacy=self.mid).update(quantity=3)
+        caches['search'].clear()
+        results = search_medicine_nearby('acetaminophen', Decimal('15.5'), Decimal('73.82'), 10)
+        self.assertEqual([result['pharmacy'] for result in results], [self.near, self.mid])
+
+    def test_search_is_one_query_plus_the_cell_generations(self):
+        with self.assertNumQueries(2):
+            results = search_medicine_nearby('Paracetamol', Decimal('15.5'), Decimal('73.82'), 50)
+            for result in results:
+                result['pharmacy_location'].name, result['medicine'].name
+        self.assertEqual(len(results), 3)
+
+
+class MedicineNameFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.amoxicillin = Medicine.objects.create(name='Amoxicillin 500mg', generic_name='Amoxicillin')
+        cls.ibuprofen = Medicine.objects.create(name='Brufen', generic_name='Ibuprofen')
+
+    def matching(self, term):
+        return set(Medicine.objects.filter(medicine_name_filter(term)).values_list('name', flat=True))
+
+    def test_substrings_match_case_insensitively(self):
+        self.assertIn('MATCH', str(Medicine.objects.filter(medicine_name_filter('oxicill')).query))
+        self.assertEqual(self.matching('OXICILL'), {'Amoxicillin 500mg'})
+        self.assertEqual(self.matching('profen'), {'Brufen'})
+        self.assertEqual(self.matching('500mg amox'), set())
+        self.assertEqual(self.matching('"quoted" name'), set())
+
+    def test_short_terms_fall_back_to_icontains(self):
+        self.assertEqual(self.matching('am'), {'Amoxicillin 500mg'})
+        self.assertIn('icontains', str(medicine_name_filter('am')))
+
+    def test_index_follows_renames_and_deletes(self):
+        self.ibuprofen.name = 'Advil'
+        self.ibuprofen.save()
+        self.assertEqual(self.matching('brufen'), set())
+        self.assertEqual(self.matching('advil'), {'Advil'})
+        self.amoxicillin.delete()
+        self.assertEqual(self.matching('amoxicillin'), set())
+
+
+class MedicineNameIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.amoxicillin = Medicine.objects.create(id=10, name='Amoxicillin', generic_name='Amoxicillin Trihydrate')
+        cls.paracetamol = Medicine.objects.create(id=11, name='Crocin', generic_name='Paracetamol')
+
+    def setUp(self):
+        self.index = MedicineNameIndex()
+
+    def test_typos_match_the_closest_names(self):
+        self.assertEqual(self.index.match('amoxcillin')[0][0], self.amoxicillin.pk)
+        self.assertEqual(self.index.match('paracetmol')[0][0], self.paracetamol.pk)
+        self.assertEqual(self.index.match('zzzz'), [])
+
+    def test_refresh_loads_ids_below_locally_saved_ones(self):
+        self.index.refresh()
+        local = Medicine.objects.create(id=30, name='Azithromycin')
+        self.index.add_medicine(local)
+        # Saved by another process (no signal here) with a lower id
+        Medicine.objects.bulk_create([Medicine(id=20, name='Cetirizine')])
+
+        self.index.refresh()
+        self.assertEqual(self.index.match('cetirizin')[0][0], 20)
+        self.assertEqual(self.index.complete('a'), ['Amoxicillin', 'Amoxicillin Trihydrate', 'Azithromycin'])
+
+    def test_renames_and_deletes_in_other_processes_are_picked_up(self):
+        # self.index gets no signals, like the index of another process
+        self.index.refresh()
+        self.amoxicillin.name = 'Augmentin'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.amoxicillin.save()
+        self.index.refresh()
+        self.assertEqual(self.index.complete('au'), ['Augmentin'])
+        self.assertEqual(self.index.complete('amoxicillin'), ['Amoxicillin Trihydrate'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paracetamol.delete()
+        self.index.refresh()
+        self.assertEqual(self.index.match('paracetamol'), [])
+
+    def test_nearby_search_falls_back_to_typo_matches(self):
+        pharmacy = make_pharmacy('pharmacy', 15.509, 73.82)
+        Inventory.objects.create(pharmacy=pharmacy, medicine=self.paracetamol, quantity=5, price=Decimal('1.00'))
+        caches['search'].clear()
+        with mock.patch('authentication.views.medicine_names', self.index):
+            results = search_medicine_nearby('paracetmol', Decimal('15.5'), Decimal('73.82'), 10)
+        self.assertEqual([result['medicine'] for result in results], [self.paracetamol])
+
+
+class SearchCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medicine = Medicine.objects.create(name='Paracetamol')
+        cls.near = make_pharmacy('near', 15.509, 73.82)
+        cls.distant = make_pharmacy('distant', 19.07, 72.87)
+        for pharmacy in (cls.near, cls.distant):
+            Inventory.objects.create(pharmacy=pharmacy, medicine=cls.medicine, quantity=10, price=Decimal('2.50'))
+
+    def setUp(self):
+        caches['search'].clear()
+
+    def search(self, name='paracetamol'):
+        """Run a search and return whether it was served from cache."""
+        hits = cache_stats()['hits']
+        results = search_medicine_nearby(name, Decimal('15.5'), Decimal('73.82'), 10)
+        return cache_stats()['hits'] > hits, results
+
+    def test_repeated_searches_hit(self):
+        self.assertFalse(self.search()[0])
+        self.assertTrue(self.search()[0])
+        self.assertTrue(self.search(' Paracetamol ')[0])
+
+    def test_inventory_changes_invalidate_only_their_cells(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            Inventory.objects.filter(pharmacy=self.distant).get().save()
+        self.assertTrue(self.search()[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Inventory.objects.filter(pharmacy=self.near).update(quantity=0)
+            Inventory.objects.filter(pharmacy=self.near).get().save()
+        cached, results = self.search()
+        self.assertFalse(cached)
+        self.assertEqual(results, [])
+
+    def test_invalidations_reach_other_processes(self):
+        self.search()
+        # Another process (e.g. the import worker) changes stock and bumps
+        # the shared generation; this process's cached entry is bypassed
+        Inventory.objects.filter(pharmacy=self.near).update(quantity=0)
+        CacheGeneration.bump([f'search:{self.near.pharmacy_location.grid_cell}'])
+        cached, results = self.search()
+        self.assertFalse(cached)
+        self.assertEqual(results, [])
+
+    def test_medicine_renames_invalidate(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medicine.name = 'Crocin'
+            self.medicine.save()
+        cached, results = self.search('crocin')
+        self.assertFalse(cached)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(self.search()[1], [])
+
+    def test_stats_survive_cache_eviction(self):
+        self.search()
+        self.search()
+        stats = cache_stats()
+        caches['search'].clear()
+        self.assertEqual(cache_stats(), stats)
+        self.assertEqual(stats['scope'], 'process')
+
+
+class MedicineSearchApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        CustomerLocation.objects.create(user=cls.customer, address='Home', latitude=Decimal('15.5'), longitude=Decimal('73.82'))
+        medicine = Medicine.objects.create(name='Paracetamol')
+        for index in range(7):
+            pharmacy = make_pharmacy(f'pharmacy{index}', 15.5 + 0.005 * (index % 4), 73.82)
+            Inventory.objects.create(pharmacy=pharmacy, medicine=medicine, quantity=5, price=Decimal('1.00'))
+
+    def setUp(self):
+        caches['search'].clear()
+        self.client.force_login(self.customer)
+
+    def search(self, **params):
+        return self.client.get(reverse('authentication:api_medicine_search'), {'medicine_name': 'paracetamol', 'max_distance': 10, **params})
+
+    def test_cursor_pages_cover_every_result_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            data = self.search(limit=3, **({'cursor': cursor} if cursor else {})).json()
+            self.assertLessEqual(len(data['results']), 3)
+            seen += [(result['distance'], result['inventory']['id']) for result in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        # Ties on distance are broken by inventory id
+        self.assertEqual(seen, sorted(seen))
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.search(limit=0).status_code, 400)
+        self.assertEqual(self.search(cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.client.get(reverse('authentication:api_medicine_search')).status_code, 400)
+        self.client.force_login(make_pharmacy('pharmacy', 15.5, 73.82))
+        self.assertEqual(self.search().status_code, 403)
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Medicine.objects.create(name='Paracetamol 500mg', generic_name='Paracetamol')
+        Medicine.objects.create(name='Pantoprazole', generic_name='')
+        Medicine.objects.create(name='Crocin', generic_name='Paracetamol')
+
+    def setUp(self):
+        patcher = mock.patch('authentication.views.medicine_names', MedicineNameIndex())
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def complete(self, **params):
+        return self.client.get(reverse('authentication:api_medicine_autocomplete'), params)
+
+    def test_prefix_suggestions(self):
+        response = self.complete(q='  PARA ')
+        self.assertEqual(response.json()['suggestions'], ['Paracetamol', 'Paracetamol 500mg'])
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertEqual(self.complete(q='pa', limit=1).json()['suggestions'], ['Pantoprazole'])
+        self.assertEqual(self.complete(q='').json()['suggestions'], [])
+
+    def test_new_medicines_are_suggested_without_reload(self):
+        self.complete(q='a')
+        self.index.add_medicine(Medicine.objects.create(name='Azithromycin'))
+        self.assertEqual(self.complete(q='azi').json()['suggestions'], ['Azithromycin'])
+
+    def test_names_in_text_finds_whole_leading_words(self):
+        text = 'Rx: Tab. PARACETAMOL 500 mg twice daily, pantoprazole before food; crocinx'
+        self.assertEqual(self.index.names_in_text(text), ['paracetamol', 'pantoprazole'])
+
+
+class BasketSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        CustomerLocation.objects.create(user=cls.customer, address='Home', latitude=Decimal('15.5'), longitude=Decimal('73.82'))
+        paracetamol = Medicine.objects.create(name='Paracetamol')
+        cetirizine = Medicine.objects.create(name='Cetirizine')
+        combination = Medicine.objects.create(name='Paracetamol + Cetirizine Cold Tablet')
+        cls.combination_pharmacy = make_pharmacy('combination', 15.509, 73.82)
+        cls.cheap = make_pharmacy('cheap', 15.545, 73.82)
+        cls.partial = make_pharmacy('partial', 15.501, 73.82)
+        distant = make_pharmacy('distant', 15.77, 73.82)
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=cls.combination_pharmacy, medicine=combination, quantity=5, price=Decimal('5.00')),
+            Inventory(pharmacy=cls.cheap, medicine=paracetamol, quantity=5, price=Decimal('2.00')),
+            Inventory(pharmacy=cls.cheap, medicine=cetirizine, quantity=5, price=Decimal('1.00')),
+            Inventory(pharmacy=cls.partial, medicine=paracetamol, quantity=5, price=Decimal('0.50')),
+            Inventory(pharmacy=cls.partial, medicine=cetirizine, quantity=0, price=Decimal('0.50')),
+            Inventory(pharmacy=distant, medicine=paracetamol, quantity=5, price=Decimal('0.10')),
+            Inventory(pharmacy=distant, medicine=cetirizine, quantity=5, price=Decimal('0.10')),
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def basket(self, **params):
+        return self.client.get(reverse('authentication:api_basket_search'), {'max_distance': 10, **params})
+
+    def test_pharmacies_rank_by_coverage_then_price(self):
+        results = search_basket_nearby(['paracetamol', 'cetirizine'], Decimal('15.5'), Decimal('73.82'), 10)
+        self.assertEqual(
+            [(result['pharmacy_id'], result['covered'], result['total_price']) for result in results],
+            [(self.cheap.pk, 2, Decimal('3.00')), (self.combination_pharmacy.pk, 2, Decimal('10.00')),
+             (self.partial.pk, 1, Decimal('0.50'))],
+        )
+        self.assertEqual(results[2]['missing'], ['cetirizine'])
+
+    def test_combination_product_covers_every_term_it_matches(self):
+        data = self.basket(medicine_names='paracetamol, cetirizine').json()
+        combination = next(result for result in data['results'] if result['pharmacy']['name'] == 'Combination')
+        self.assertEqual(combination['prices'], {'paracetamol': '5.00', 'cetirizine': '5.00'})
+        self.assertEqual(combination['missing'], [])
+
+    def test_prescription_names_are_added_to_the_basket(self):
+        prescription = Prescription.objects.create(
+            user=self.customer, image='prescriptions/rx.jpg', extracted_text='1. Cetirizine 10mg at night',
+        )
+        with mock.patch('authentication.views.medicine_names', MedicineNameIndex()):
+            data = self.basket(medicine_names='paracetamol', prescription=prescription.pk).json()
+        self.assertEqual(data['medicines'], ['paracetamol', 'cetirizine'])
+        self.assertEqual(data['results'][0]['pharmacy']['name'], 'Cheap')
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.basket().status_code, 400)
+        self.assertEqual(self.basket(medicine_names=','.join(f'm{i}' for i in range(11))).status_code, 400)
+        self.customer.customer_location.delete()
+        self.assertEqual(self.basket(medicine_names='paracetamol').status_code, 400)
+
+
+class InventoryImportTests(TestCase):
+    CSV = (
+        'medicine_name,quantity,price,expiry_date\n'
+        'Paracetamol,10,2.50,2030-01-31\n'
+        'Zinc Tablets,4,1.00,\n'
+        ',5,1.00,\n'
+        'Cetirizine,inf,1.00,\n'
+        'Cetirizine,1e30,1.00,\n'
+        'Cetirizine,2.5,1.00,\n'
+        'Cetirizine,-1,1.00,\n'
+        'Cetirizine,3,abc,\n'
+        'Cetirizine,3,1e12,\n'
+        'Cetirizine,3,1.00,soon\n'
+        'Paracetamol,12,2.75,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+        cls.paracetamol = Medicine.objects.create(name='Paracetamol')
+
+    def upload(self, content, name='stock.csv', batch_size=IMPORT_BATCH_SIZE):
+        return import_inventory_file(self.pharmacy, SimpleUploadedFile(name, content.encode()), batch_size=batch_size)
+
+    def test_valid_rows_are_upserted(self):
+        Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.paracetamol, quantity=1, price=Decimal('1.00'))
+        result = self.upload(self.CSV, batch_size=4)
+        self.assertEqual((result.processed_rows, result.failed_rows), (11, 8))
+        self.assertEqual((result.created_medicines, result.created_inventory), (1, 1))
+        stock = dict(Inventory.objects.filter(pharmacy=self.pharmacy).values_list('medicine__name', 'quantity'))
+        self.assertEqual(stock, {'Paracetamol': 12, 'Zinc Tablets': 4})
+
+    def test_invalid_rows_report_their_first_problem(self):
+        errors = {row['row']: row['error'] for row in self.upload(self.CSV).error_rows}
+        self.assertEqual(errors, {
+            4: 'Medicine name is required',
+            5: "Invalid quantity 'inf'",
+            6: 'Quantity cannot be more than 2147483647',
+            7: "Quantity must be a whole number, not '2.5'",
+            8: 'Quantity cannot be negative',
+            9: "Invalid price 'abc'",
+            10: 'Price cannot be more than 99999999.99',
+            11: "Invalid expiry date 'soon'",
+        })
+        row = self.upload(self.CSV).error_rows[0]
+        self.assertEqual(row['values'], {'medicine_name': '', 'quantity': '5', 'price': '1.00', 'expiry_date': ''})
+
+    def test_availability_spellings(self):
+        result = self.upload(
+            'medicine_name,quantity,price,is_available\n'
+            'A,1,1.00,0\nB,1,1.00,no\nC,1,1.00,False \nD,1,1.00,1\nE,1,1.00, Yes\nF,1,1.00,\nG,1,1.00,maybe\n'
+        )
+        self.assertEqual(
+            {row['row']: row['error'] for row in result.error_rows}, {8: "Invalid is_available 'maybe'; use yes or no"},
+        )
+        available = dict(Inventory.objects.filter(pharmacy=self.pharmacy).values_list('medicine__name', 'is_available'))
+        self.assertEqual(available, {'A': False, 'B': False, 'C': False, 'D': True, 'E': True, 'F': True})
+
+        # Spreadsheet cells arrive as numbers and booleans
+        frame = pd.DataFrame({
+            'medicine_name': ['A', 'B'], 'quantity': [1, 1], 'price': [1.0, 1.0], 'is_available': [1, False],
+        })
+        import_inventory_frame(self.pharmacy, frame)
+        available = dict(Inventory.objects.filter(pharmacy=self.pharmacy).values_list('medicine__name', 'is_available'))
+        self.assertEqual((available['A'], available['B']), (True, False))
+
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaises(MissingColumnsError) as raised:
+            self.upload('medicine_name,price\nParacetamol,1.00\n')
+        self.assertEqual(raised.exception.columns, ['quantity'])
+
+    def test_new_medicines_are_indexed_on_commit(self):
+        index = MedicineNameIndex()
+        index.refresh()
+        with mock.patch('authentication.importers.medicine_names', index):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.upload('medicine_name,quantity,price\nZinc Tablets,4,1.00\n')
+            self.assertEqual(index.complete('zinc'), [])
+            for callback in callbacks:
+                callback()
+        self.assertEqual(index.complete('zinc'), ['Zinc Tablets'])
+
+
+class ImportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+
+    def setUp(self):
+        media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def make_job(self, content, **kwargs):
+        return ImportJob.objects.create(
+            pharmacy=self.pharmacy, file=ContentFile(content.encode(), name='stock.csv'), file_name='stock.csv', **kwargs,
+        )
+
+    def test_failed_rows_are_counted_past_the_error_row_cap(self):
+        content = 'medicine_name,quantity,price\n' + 'Paracetamol,-1,1.00\n' * 5 + 'Cetirizine,3,1.00\n'
+        with mock.patch('authentication.importers.MAX_ERROR_ROWS', 2):
+            result = run_import_job(self.make_job(content, status=ImportJob.STATUS_RUNNING))
+        self.assertEqual((result.processed_rows, result.failed_rows, len(result.error_rows)), (6, 5, 2))
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.failed_rows, len(job.error_rows), job.file.name), ('completed', 5, 2, ''))
+
+    def test_failed_job_keeps_committed_batches(self):
+        rows = ['Bad,x,1.00'] + [f'Medicine {i},1,1.00' for i in range(IMPORT_BATCH_SIZE)]
+        job = self.make_job('medicine_name,quantity,price\n' + '\n'.join(rows) + '\n', status=ImportJob.STATUS_RUNNING)
+        calls = []
+
+        def fail_second_batch(*args, **kwargs):
+            calls.append(args)
+            if len(calls) > 1:
+                raise RuntimeError('disk full')
+            return import_inventory_frame(*args, **kwargs)
+
+        with mock.patch('authentication.importers.import_inventory_frame', fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                run_import_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ('failed', 'disk full'))
+        self.assertEqual(
+            (job.processed_rows, job.failed_rows, job.created_inventory), (IMPORT_BATCH_SIZE, 1, IMPORT_BATCH_SIZE - 1),
+        )
+        self.assertEqual(job.error_rows[0]['error'], "Invalid quantity 'x'")
+
+    def test_jobs_are_claimed_oldest_first_and_once(self):
+        first = self.make_job('medicine_name,quantity,price\n')
+        second = self.make_job('medicine_name,quantity,price\n')
+        self.assertEqual(claim_next_job(), first)
+        self.assertEqual(claim_next_job(), second)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(ImportJob.objects.filter(status=ImportJob.STATUS_RUNNING, started_at__isnull=False).count(), 2)
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale = self.make_job('', status=ImportJob.STATUS_RUNNING, processed_rows=10, error_rows=[{'row': 2}])
+        busy = self.make_job('', status=ImportJob.STATUS_RUNNING)
+        ImportJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(minutes=20))
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.processed_rows, stale.error_rows), ('pending', 0, []))
+        self.assertEqual(ImportJob.objects.get(pk=busy.pk).status, ImportJob.STATUS_RUNNING)
+
+    def test_upload_queues_a_job_and_reports_its_progress(self):
+        self.client.force_login(self.pharmacy)
+        upload = SimpleUploadedFile('stock.csv', b'medicine_name,quantity,price\nParacetamol,x,1.00\nCrocin,2,1.00\n')
+        response = self.client.post(reverse('authentication:bulk_medicine_upload'), {'excel_file': upload})
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, f"{reverse('authentication:bulk_medicine_upload')}?job={job.pk}")
+
+        status_url = reverse('authentication:import_job_status', args=[job.pk])
+        self.assertEqual(self.client.get(status_url).json()['job']['status'], 'pending')
+        run_import_job(claim_next_job())
+        data = self.client.get(status_url).json()['job']
+        self.assertEqual((data['status'], data['processed_rows'], data['failed_rows']), ('completed', 2, 1))
+        self.assertEqual(data['errors'], ["Row 2: Invalid quantity 'x'"])
+
+        response = self.client.get(data['errors_url'])
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:5], ['row', 'error', 'medicine_name', 'quantity', 'price'])
+        self.assertTrue(lines[1].startswith("2,Invalid quantity 'x',Paracetamol,x,1.00"))
+
+    def test_jobs_are_private_to_their_pharmacy(self):
+        job = self.make_job('')
+        self.client.force_login(make_pharmacy('other', 15.49, 73.82))
+        self.assertEqual(self.client.get(reverse('authentication:import_job_status', args=[job.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('authentication:import_job_errors', args=[job.pk])).status_code, 404)
+
+
+class InventoryExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+        Inventory.objects.create(
+            pharmacy=cls.pharmacy, medicine=Medicine.objects.create(name='Zinc, 50mg', category='Supplements'),
+            quantity=4, price=Decimal('1.25'), is_available=False,
+        )
+        Inventory.objects.create(
+            pharmacy=cls.pharmacy, medicine=Medicine.objects.create(name='Crocin', generic_name='Paracetamol'),
+            quantity=10, price=Decimal('2.50'), expiry_date=date(2030, 1, 31),
+        )
+        Inventory.objects.create(
+            pharmacy=make_pharmacy('other', 15.49, 73.82), medicine=Medicine.objects.create(name='Brufen'),
+            quantity=1, price=Decimal('1.00'),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.pharmacy)
+
+    def export(self, export_format):
+        return self.client.get(reverse('authentication:inventory_export'), {'format': export_format})
+
+    def test_csv_export_streams_the_pharmacys_inventory(self):
+        response = self.export('csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [
+            'medicine_name,quantity,price,generic_name,description,category,expiry_date,is_available',
+            'Crocin,10,2.50,Paracetamol,,,2030-01-31,TRUE',
+            '"Zinc, 50mg",4,1.25,,,Supplements,,FALSE',
+        ])
+
+    def test_xlsx_export_can_be_imported_again(self):
+        from openpyxl import load_workbook
+
+        content = b''.join(self.export('xlsx').streaming_content)
+        workbook = load_workbook(io.BytesIO(content), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        workbook.close()
+        self.assertEqual(rows[1], ('Crocin', 10, 2.5, 'Paracetamol', None, None, datetime(2030, 1, 31), True))
+        self.assertEqual(len(rows), 3)
+
+        Inventory.objects.filter(pharmacy=self.pharmacy).update(quantity=0, is_available=True)
+        result = import_inventory_file(self.pharmacy, SimpleUploadedFile('stock.xlsx', content))
+        self.assertEqual((result.processed_rows, result.failed_rows, result.created_medicines), (2, 0, 0))
+        self.assertEqual(
+            set(Inventory.objects.filter(pharmacy=self.pharmacy).values_list('quantity', 'is_available')),
+            {(10, True), (4, False)},
+        )
+
+    def test_unknown_formats_redirect(self):
+        self.assertRedirects(self.export('pdf'), reverse('authentication:inventory_list'), fetch_redirect_response=False)
+
+
+@mock.patch('authentication.sync.SYNC_SETTLE_TIME', timedelta(0))
+class InventorySyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+        cls.medicines = Medicine.objects.bulk_create([Medicine(name=f'Medicine {i}') for i in range(4)])
+        for medicine in cls.medicines:
+            Inventory.objects.create(pharmacy=cls.pharmacy, medicine=medicine, quantity=10, price=Decimal('1.00'))
+        Inventory.objects.create(
+            pharmacy=make_pharmacy('other', 15.49, 73.82), medicine=cls.medicines[0], quantity=1, price=Decimal('1.00'),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.pharmacy)
+
+    def pull(self, **params):
+        return self.client.get(reverse('authentication:api_inventory_sync'), params)
+
+    def push(self, changes):
+        return self.client.post(
+            reverse('authentication:api_inventory_sync'), json.dumps({'changes': changes}), content_type='application/json',
+        )
+
+    def pull_all(self, since='', limit=3):
+        changes = []
+        while True:
+            data = self.pull(since=since, limit=limit).json()
+            changes += data['changes']
+            since = data['since']
+            if not data['has_more']:
+                return changes, since
+
+    def test_pulls_resume_from_the_watermark(self):
+        changes, since = self.pull_all(limit=3)
+        self.assertEqual([change['medicine_id'] for change in changes], [medicine.pk for medicine in self.medicines])
+        self.assertEqual(self.pull(since=since).json()['changes'], [])
+
+        medicine = self.medicines[1]
+        response = self.push([{'medicine_id': medicine.pk, 'quantity_delta': -3, 'price_delta': '0.50'}])
+        self.assertEqual(response.json(), {'success': True, 'updated': 1})
+        data = self.pull(since=since).json()
+        self.assertEqual(
+            [(change['medicine_id'], change['quantity'], change['price']) for change in data['changes']],
+            [(medicine.pk, 7, '1.50')],
+        )
+        self.assertEqual(self.pull(since=data['since']).json()['changes'], [])
+
+    def test_deletions_are_reported(self):
+        _, since = self.pull_all()
+        restocked, discontinued = self.medicines[2:]
+        discontinued_id = discontinued.pk
+        Inventory.objects.filter(pharmacy=self.pharmacy, medicine=restocked).delete()
+        discontinued.delete()
+        Inventory.objects.create(pharmacy=self.pharmacy, medicine=restocked, quantity=1, price=Decimal('2.00'))
+
+        changes, since = self.pull_all(since, limit=1)
+        self.assertEqual(
+            [(change['medicine_id'], change['deleted']) for change in changes],
+            [(restocked.pk, True), (discontinued_id, True), (restocked.pk, False)],
+        )
+        self.assertEqual(self.pull(since=since).json()['changes'], [])
+
+    def test_renames_are_pulled(self):
+        _, since = self.pull_all()
+        medicine = self.medicines[1]
+        medicine.name = 'Renamed'
+        medicine.save()
+        changes, _ = self.pull_all(since)
+        self.assertEqual(
+            [(change['medicine_id'], change['medicine_name']) for change in changes], [(medicine.pk, 'Renamed')],
+        )
+
+    def test_deleting_a_pharmacy_leaves_no_tombstones(self):
+        Inventory.objects.filter(pharmacy=self.pharmacy, medicine=self.medicines[0]).delete()
+        self.pharmacy.delete()
+        self.assertFalse(InventoryTombstone.objects.exists())
+
+    def test_pushes_are_all_or_nothing(self):
+        first, second = self.medicines[:2]
+        response = self.push([
+            {'medicine_id': first.pk, 'quantity_delta': -1},
+            {'medicine_id': second.pk, 'quantity_delta': -11},
+            {'medicine_id': 999999, 'quantity_delta': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            f'Medicine {second.pk}: change would take quantity or price below zero or above 2147483647 / 99999999.99',
+            'Medicine 999999: not in inventory',
+        ])
+        self.assertEqual(Inventory.objects.get(pharmacy=self.pharmacy, medicine=first).quantity, 10)
+        self.assertEqual(self.push([{'medicine_id': first.pk, 'quantity_delta': 0}]).json()['updated'], 0)
+
+    def test_out_of_range_deltas_are_rejected(self):
+        medicine_id = self.medicines[0].pk
+        response = self.push([
+            {'medicine_id': medicine_id, 'quantity_delta': 10 ** 30},
+            {'medicine_id': medicine_id, 'quantity_delta': 2.7},
+            {'medicine_id': medicine_id, 'quantity_delta': True},
+            {'medicine_id': medicine_id, 'price_delta': '1e20'},
+            {'medicine_id': medicine_id, 'price_delta': 'NaN'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            'Change 0: quantity_delta must be between -2147483647 and 2147483647',
+            'Change 1: quantity_delta must be a whole number',
+            'Change 2: medicine_id and numeric quantity_delta/price_delta are required',
+            'Change 3: price_delta must be between -99999999.99 and 99999999.99',
+            'Change 4: price_delta must be a number',
+        ])
+
+        # Each delta is in range, but the results would not be
+        for change in ({'quantity_delta': 2147483647}, {'price_delta': '99999999.99'}):
+            response = self.push([{'medicine_id': medicine_id, **change}])
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.push([{'medicine_id': medicine_id, 'quantity_delta': 2.0}]).json()['updated'], 1)
+        item = Inventory.objects.get(pharmacy=self.pharmacy, medicine_id=medicine_id)
+        self.assertEqual((item.quantity, item.price), (12, Decimal('1.00')))
+
+    def test_invalid_watermarks_are_rejected(self):
+        self.assertEqual(self.pull(since='not a watermark').status_code, 400)
+        self.assertEqual(self.pull(limit=0).status_code, 400)
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date(2026, 3, 1)
+        cls.pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+        stock = [
+            # (quantity, is_available, expiry_date)
+            (50, True, None),
+            (5, True, date(2026, 3, 31)),
+            (0, False, date(2026, 2, 28)),
+            (20, True, date(2026, 3, 1)),
+            (20, False, date(2026, 4, 1)),
+        ]
+        for index, (quantity, is_available, expiry_date) in enumerate(stock):
+            Inventory.objects.create(
+                pharmacy=cls.pharmacy, medicine=Medicine.objects.create(name=f'Medicine {index}'),
+                quantity=quantity, price=Decimal('1.00'), is_available=is_available, expiry_date=expiry_date,
+            )
+        Inventory.objects.create(
+            pharmacy=make_pharmacy('other', 15.49, 73.82), medicine=Medicine.objects.create(name='Other'),
+            quantity=0, price=Decimal('1.00'), expiry_date=date(2020, 1, 1),
+        )
+
+    def test_counts_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            stats = Inventory.objects.filter(pharmacy=self.pharmacy).dashboard_stats(self.today)
+        self.assertEqual(stats, {
+            'total_items': 5, 'available_items': 3, 'low_stock_count': 2, 'expiring_soon_count': 2, 'expired_count': 1,
+        })
+
+    def test_counts_match_the_warning_filters(self):
+        items = Inventory.objects.filter(pharmacy=self.pharmacy)
+        stats = items.dashboard_stats(self.today)
+        self.assertEqual(stats['low_stock_count'], items.low_stock().count())
+        self.assertEqual(stats['expiring_soon_count'], items.expiring_soon(self.today).count())
+        self.assertEqual(stats['expired_count'], items.expired(self.today).count())
+
+    def test_homepage_shows_the_pharmacy_counts(self):
+        self.client.force_login(self.pharmacy)
+        response = self.client.get(reverse('authentication:homepage'))
+        self.assertEqual((response.context['total_items'], response.context['available_items']), (5, 3))
+
+
+class InventoryListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = make_pharmacy('pharmacy', 15.49, 73.82)
+        stock = [
+            # (name, generic_name, category, quantity, price, expiry_date)
+            ('Cetirizine', 'Cetirizine', 'Allergy', 3, '2.00', date(2030, 1, 1)),
+            ('Amoxicillin', '', 'Antibiotic', 3, '5.00', None),
+            ('Cetirizine', 'Levocetirizine', 'Allergy', 10, '2.00', date(2029, 6, 1)),
+            ('Zinc', '', 'Supplements', 40, '1.00', None),
+            ('Brufen', 'Ibuprofen', 'Pain', 0, '3.50', date(2029, 6, 1)),
+        ]
+        for name, generic_name, category, quantity, price, expiry_date in stock:
+            medicine = Medicine.objects.create(name=name, generic_name=generic_name, category=category)
+            Inventory.objects.create(
+                pharmacy=cls.pharmacy, medicine=medicine, quantity=quantity, price=Decimal(price), expiry_date=expiry_date,
+            )
+        cls.items = {item.pk: item for item in Inventory.objects.filter(pharmacy=cls.pharmacy)}
+
+    def walk(self, sort, items=None, limit=2):
+        """Every page of ``items`` in ``sort`` order, following encoded cursors."""
+        items = items if items is not None else Inventory.objects.filter(pharmacy=self.pharmacy)
+        pks, cursor = [], None
+        while True:
+            page, next_cursor = inventory_page(items, sort, cursor, limit=limit)
+            pks += [item.pk for item in page]
+            if next_cursor is None:
+                return pks
+            cursor = decode_inventory_cursor(next_cursor, sort)
+
+    def ordered(self, key, reverse=False):
+        return [item.pk for item in sorted(self.items.values(), key=key, reverse=reverse)]
+
+    def test_cursors_round_trip_for_every_sort(self):
+        expected = {
+            'name': self.ordered(lambda item: (item.medicine_name, item.pk)),
+            'quantity': self.ordered(lambda item: (item.quantity, item.pk)),
+            'expiry': self.ordered(lambda item: (item.expiry_date is None, item.expiry_date or date.min, item.pk)),
+            'price': self.ordered(lambda item: (item.price, item.pk)),
+            'updated': self.ordered(lambda item: (item.updated_at, item.pk), reverse=True),
+        }
+        for sort, pks in expected.items():
+            for limit in (1, 2, 5):
+                with self.subTest(sort=sort, limit=limit):
+                    self.assertEqual(self.walk(sort, limit=limit), pks)
+
+    def test_name_sort_reads_the_denormalized_name(self):
+        medicine = Medicine.objects.get(name='Zinc')
+        medicine.name = 'Acidity Relief'
+        medicine.save()
+        self.assertEqual(Inventory.objects.get(medicine=medicine).medicine_name, 'Acidity Relief')
+        with self.assertNumQueries(1):
+            page, _ = inventory_page(Inventory.objects.filter(pharmacy=self.pharmacy), 'name', limit=2)
+        self.assertEqual([item.medicine_name for item in page], ['Acidity Relief', 'Amoxicillin'])
+
+        items = Inventory.objects.filter(pharmacy=self.pharmacy).order_by('medicine_name', 'id')
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {items.query}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('inventory_name_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_filters_apply_across_pages(self):
+        self.client.force_login(self.pharmacy)
+        url = reverse('authentication:inventory_list')
+
+        def names(**params):
+            return [item.medicine_name for item in self.client.get(url, params).context['inventory_items']]
+
+        self.assertEqual(names(q='cet'), ['Cetirizine', 'Cetirizine'])
+        self.assertEqual(names(category='allergy', sort='quantity'), ['Cetirizine', 'Cetirizine'])
+        self.assertEqual(names(status='low', sort='quantity'), ['Brufen', 'Cetirizine', 'Amoxicillin'])
+        self.assertEqual(names(after='not a cursor'), ['Amoxicillin', 'Brufen', 'Cetirizine', 'Cetirizine', 'Zinc'])
+
+        low_stock = Inventory.objects.filter(pharmacy=self.pharmacy).low_stock()
+        self.assertEqual(self.walk('expiry', low_stock, limit=1), [
+            pk for pk in self.ordered(lambda item: (item.expiry_date is None, item.expiry_date or date.min, item.pk))
+            if self.items[pk].quantity <= Inventory.LOW_STOCK_THRESHOLD
+        ])
+
+
+class HotQueryIndexTests(TestCase):
+    """EXPLAIN the hot query shapes and check each one is served by its index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = User.objects.create(username='pharmacy', is_pharmacy=True)
+        cls.customer = User.objects.create(username='customer')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f'{index_name} not used:\n{plan}')
+
+    def test_nearby_search_uses_active_pharmacy_grid_index(self):
+        queryset = nearby_inventory(Q(medicine_id__in=[1, 2, 3]), bounding_box(15.49, 73.82, 10))
+        self.assertUsesIndex(queryset, 'pharmacy_active_grid_idx')
+
+    def test_dashboard_stats_use_covering_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            Inventory.objects.filter(pharmacy=self.pharmacy).dashboard_stats()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('COVERING INDEX inventory_dashboard_idx', plan)
+
+    def test_inventory_list_sorts_use_keyset_indexes(self):
+        for field, index_name in (
+            ('medicine_name', 'inventory_name_idx'),
+            ('quantity', 'inventory_quantity_idx'),
+            ('expiry_date', 'inventory_expiry_idx'),
+            ('price', 'inventory_price_idx'),
+            ('updated_at', 'inventory_updated_idx'),
+        ):
+            with self.subTest(field=field):
+                queryset = Inventory.objects.filter(pharmacy=self.pharmacy).order_by(field, 'id')
+                self.assertUsesIndex(queryset, index_name)
+                self.assertNotIn('TEMP B-TREE', queryset.explain())
+
+    def test_inventory_name_filter_uses_lower_name_index(self):
+        queryset = Inventory.objects.filter(pharmacy=self.pharmacy).name_startswith('Para')
+        self.assertUsesIndex(queryset, 'inventory_name_lower_idx')
+
+    def test_pending_import_jobs_use_queue_index(self):
+        queryset = ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).order_by('created_at', 'id')
+        self.assertUsesIndex(queryset, 'importjob_queue_idx')
+
+    def test_active_reminders_use_partial_index(self):
+        queryset = Reminder.objects.filter(user=self.customer, active=True).order_by('medicine_name')
+        self.assertUsesIndex(queryset, 'reminder_user_active_idx')
+        self.assertNotIn('TEMP B-TREE', queryset.explain())
+
+    def test_reminder_logs_by_day_use_date_taken_index(self):
+        queryset = ReminderLog.objects.filter(date=date.today(), taken=True)
+        self.assertUsesIndex(queryset, 'reminderlog_date_taken_idx')
+
+    def test_due_reminders_use_due_index(self):
+        Reminder.objects.create(user=self.customer, medicine_name='A', times='08:00')
+        now = datetime(2026, 1, 5, 8, 0, tzinfo=dt_timezone.utc)
+        self.assertUsesIndex(due_reminder_times(now - timedelta(minutes=1), now), 'remindertime_due_idx')
+
+
+class ReminderScheduleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='customer')
+        self.morning = datetime(2026, 1, 5, 7, 0, tzinfo=dt_timezone.utc)
+
+    def test_parse_times_skips_invalid_entries(self):
+        self.assertEqual(parse_times('20:00, 08:00,bad, 25:00, 08:00'), (480, 1200))
+
+    def test_reminders_fire_in_their_own_time_zone(self):
+        reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00', timezone='Asia/Kolkata')
+        schedule = ReminderSchedule()
+        schedule.load(self.morning)
+        # 08:00 in Kolkata is 02:30 UTC the next day
+        self.assertEqual(schedule.next_fire_time(), datetime(2026, 1, 6, 2, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(schedule.pop_due(datetime(2026, 1, 6, 2, 30, tzinfo=dt_timezone.utc)), [reminder.pk])
+
+    def test_fire_times_ignore_the_active_time_zone(self):
+        Reminder.objects.create(user=self.user, medicine_name='A', times='08:00', timezone='Asia/Kolkata')
+        for name in ('UTC', 'America/New_York'):
+            with self.subTest(active=name), timezone.override(name):
+                schedule = ReminderSchedule()
+                schedule.load(self.morning)
+                self.assertEqual(schedule.next_fire_time(), datetime(2026, 1, 6, 2, 30, tzinfo=dt_timezone.utc))
+
+    def test_fire_times_follow_daylight_saving_changes(self):
+        reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00', timezone='Europe/London')
+        schedule = ReminderSchedule()
+        schedule.load(datetime(2026, 3, 28, 9, 0, tzinfo=dt_timezone.utc))
+        # Clocks go forward overnight, so 08:00 is 07:00 UTC on the 29th
+        self.assertEqual(schedule.next_fire_time(), datetime(2026, 3, 29, 7, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(schedule.pop_due(datetime(2026, 3, 29, 7, 0, tzinfo=dt_timezone.utc)), [reminder.pk])
+        self.assertEqual(schedule.next_fire_time(), datetime(2026, 3, 30, 7, 0, tzinfo=dt_timezone.utc))
+
+    def test_due_reminders_are_rescheduled(self):
+        reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00, 20:00')
+        schedule = ReminderSchedule()
+        schedule.load(self.morning)
+        self.assertEqual(schedule.next_fire_time(), self.morning + timedelta(hours=1))
+        self.assertEqual(schedule.pop_due(self.morning + timedelta(hours=1)), [reminder.pk])
+        self.assertEqual(schedule.next_fire_time(), self.morning + timedelta(hours=13))
+
+    def test_refresh_applies_edits_and_deactivations(self):
+        reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00')
+        schedule = ReminderSchedule()
+        schedule.load(self.morning)
+
+        reminder.times = '09:30'
+        reminder.save()
+        self.assertEqual(schedule.refresh(self.morning), 1)
+        # The superseded 08:00 entry is skipped
+        self.assertEqual(schedule.pop_due(self.morning + timedelta(hours=2)), [])
+        self.assertEqual(schedule.pop_due(self.morning + timedelta(hours=3)), [reminder.pk])
+
+        reminder.active = False
+        reminder.save()
+        schedule.refresh(self.morning)
+        self.assertEqual(len(schedule), 0)
+        self.assertIsNone(schedule.next_fire_time())
+
+
+class ReminderTimeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='customer')
+
+    def test_times_are_synced_on_save(self):
+        reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='20:00, 08:00', timezone='Asia/Kolkata')
+        self.assertEqual(
+            list(reminder.schedule_times.order_by('minute_of_day').values_list('minute_of_day', 'timezone')),
+            [(480, 'Asia/Kolkata'), (1200, 'Asia/Kolkata')],
+        )
+        reminder.active = False
+        reminder.save()
+        self.assertFalse(reminder.schedule_times.exists())
+
+    def test_due_reminders_are_found_in_each_time_zone(self):
+        utc = Reminder.objects.create(user=self.user, medicine_name='A', times='02:30')
+        kolkata = Reminder.objects.create(user=self.user, medicine_name='B', times='08:00', timezone='Asia/Kolkata')
+        Reminder.objects.create(user=self.user, medicine_name='C', times='09:00', timezone='Asia/Kolkata')
+        # 02:30 UTC is 08:00 in Kolkata
+        now = datetime(2026, 1, 5, 2, 30, tzinfo=dt_timezone.utc)
+        due = due_reminder_times(now - timedelta(minutes=1), now).values_list('reminder_id', flat=True)
+        self.assertCountEqual(due, [utc.pk, kolkata.pk])
+
+    def test_due_window_can_cross_midnight(self):
+        late = Reminder.objects.create(user=self.user, medicine_name='A', times='23:59')
+        early = Reminder.objects.create(user=self.user, medicine_name='B', times='00:00')
+        now = datetime(2026, 1, 5, 0, 0, tzinfo=dt_timezone.utc)
+        due = due_reminder_times(now - timedelta(minutes=5), now).values_list('reminder_id', flat=True)
+        self.assertCountEqual(due, [late.pk, early.pk])
+
+    def test_form_normalizes_and_validates_times(self):
+        form = ReminderForm(data={'medicine_name': 'A', 'times': '20:00,8:00, 08:00', 'timezone': 'UTC', 'active': True})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['times'], '08:00, 20:00')
+        form = ReminderForm(data={'medicine_name': 'A', 'times': '8am', 'timezone': 'Mars/Base'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'times', 'timezone'})
+        self.assertEqual(form.errors['times'], ["Invalid time '8am'; use 24h HH:MM, e.g. 08:00"])
+
+    def test_strict_parsing_rejects_what_lenient_parsing_skips(self):
+        self.assertEqual(parse_times('08:00, 24:00, x, '), (480,))
+        with self.assertRaisesMessage(ValueError, "Invalid time '24:00'"):
+            parse_times('08:00, 24:00', strict=True)
+        self.assertEqual(parse_times(' , 08:00,', strict=True), (480,))
+
+    def test_scheduler_catches_up_on_reminders_due_before_startup(self):
+        missed = Reminder.objects.create(user=self.user, medicine_name='A', times='07:58')
+        Reminder.objects.create(user=self.user, medicine_name='B', times='07:50')
+        Reminder.objects.create(user=self.user, medicine_name='C', times='08:05')
+        now = datetime(2026, 1, 5, 8, 0, tzinfo=dt_timezone.utc)
+        schedule = ReminderSchedule()
+        schedule.load(now)
+        command = run_reminder_scheduler.Command(stdout=io.StringIO())
+        with mock.patch.object(run_reminder_scheduler, 'notify_medicine_reminder') as notify:
+            command.catch_up(schedule, now, timedelta(minutes=5), dry_run=False)
+        self.assertEqual([call.args[1].pk for call in notify.call_args_list], [missed.pk])
+
+    def test_scheduler_counts_only_sent_reminders(self):
+        first = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00')
+        second = Reminder.objects.create(user=self.user, medicine_name='B', times='08:00')
+        stdout = io.StringIO()
+        command = run_reminder_scheduler.Command(stdout=stdout)
+        with mock.patch('authentication.views.send_user_notification', side_effect=[None, Exception('gone')]), \
+                mock.patch('builtins.print'):
+            command.dispatch_batch(ReminderSchedule(), [first.pk, second.pk], dry_run=False)
+        self.assertEqual(stdout.getvalue().strip(), 'Sent 1 of 2 due reminders')
+
+
+class ReminderAcknowledgeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer')
+        cls.other = User.objects.create(username='other')
+        cls.morning = Reminder.objects.create(user=cls.user, medicine_name='A', times='08:00')
+        cls.evening = Reminder.objects.create(user=cls.user, medicine_name='B', times='20:00')
+        cls.foreign = Reminder.objects.create(user=cls.other, medicine_name='C', times='08:00')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def acknowledge(self, acknowledgements):
+        return self.client.post(
+            reverse('authentication:api_reminder_acknowledge'),
+            json.dumps({'acknowledgements': acknowledgements}), content_type='application/json',
+        )
+
+    def test_batch_is_upserted_in_one_statement(self):
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        ReminderLog.objects.create(reminder=self.morning, date=date.today(), taken=False)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.acknowledge([
+                {'reminder_id': self.morning.pk},
+                {'reminder_id': self.evening.pk, 'date': yesterday, 'taken': False},
+                {'reminder_id': self.evening.pk, 'date': yesterday},
+            ])
+        self.assertEqual(response.json(), {'success': True, 'updated': 2})
+        self.assertEqual(sum('INSERT INTO "authentication_reminderlog"' in query['sql'] for query in queries), 1)
+        self.assertEqual(
+            set(ReminderLog.objects.values_list('reminder_id', 'date', 'taken')),
+            {(self.morning.pk, date.today(), True), (self.evening.pk, date.fromisoformat(yesterday), True)},
+        )
+
+    def test_other_users_reminders_reject_the_whole_batch(self):
+        response = self.acknowledge([{'reminder_id': self.morning.pk}, {'reminder_id': self.foreign.pk}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [f'Reminder {self.foreign.pk}: not found'])
+        self.assertFalse(ReminderLog.objects.exists())
+
+    def test_dates_follow_each_reminders_time_zone(self):
+        ahead = Reminder.objects.create(user=self.user, medicine_name='D', times='08:00', timezone='Pacific/Kiritimati')
+        behind = Reminder.objects.create(user=self.user, medicine_name='E', times='08:00', timezone='Pacific/Pago_Pago')
+        now = datetime(2026, 1, 5, 12, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            self.assertEqual(
+                parse_acknowledgements([{'reminder_id': ahead.pk}, {'reminder_id': behind.pk}], self.user),
+                {(ahead.pk, date(2026, 1, 6)): True, (behind.pk, date(2026, 1, 5)): True},
+            )
+            with self.assertRaisesMessage(AcknowledgementError, 'date must be between 2025-12-05 and 2026-01-05'):
+                parse_acknowledgements([{'reminder_id': behind.pk, 'date': '2026-01-06'}], self.user)
+
+    def test_invalid_entries_are_listed(self):
+        response = self.acknowledge([{'date': 'today'}, {'reminder_id': self.morning.pk, 'date': '2000-01-01'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+
+
+class AdherenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='customer')
+        self.today = date(2026, 1, 15)  # a Thursday
+        self.reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00')
+        created = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        Reminder.objects.filter(pk=self.reminder.pk).update(created_at=created, updated_at=created)
+
+    def log(self, day, taken=True):
+        ReminderLog.objects.create(reminder=self.reminder, date=date(2026, 1, day), taken=taken)
+
+    def rebuild(self):
+        rebuild_rollups([self.user.pk], [week_start(date(2026, 1, 5)), week_start(self.today)], self.today)
+        refresh_streaks(self.user.pk, full=True, today=self.today)
+
+    def test_days_without_logs_count_as_missed(self):
+        for day in (5, 6, 7, 9, 10, 11, 12, 13, 14):
+            self.log(day)
+        self.rebuild()
+        week = AdherenceRollup.objects.get(
+            user=self.user, reminder__isnull=True, period=AdherenceRollup.PERIOD_WEEK, period_start=date(2026, 1, 5),
+        )
+        # Jan 8 was due but never logged
+        self.assertEqual((week.scheduled, week.taken), (7, 6))
+
+        summary = adherence_summary(self.user, weeks=2, today=self.today)
+        self.assertEqual((summary['overall']['scheduled'], summary['overall']['taken']), (10, 9))
+        self.assertEqual(summary['overall']['current_streak'], 6)
+        self.assertEqual(summary['reminders'][0]['longest_streak'], 6)
+
+    def test_summary_reads_week_rollups_only(self):
+        self.log(14)
+        self.rebuild()
+        with CaptureQueriesContext(connection) as queries:
+            adherence_summary(self.user, weeks=52, today=self.today)
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('reminderlog', ' '.join(query['sql'] for query in queries))
+
+    def test_rebuilds_update_rows_in_place_and_overall_rows_stay_unique(self):
+        self.log(5)
+        self.rebuild()
+        ids = set(AdherenceRollup.objects.values_list('id', flat=True))
+        self.log(6)
+        self.rebuild()
+        self.assertEqual(set(AdherenceRollup.objects.values_list('id', flat=True)), ids)
+        self.assertEqual(AdherenceStreak.objects.filter(user=self.user, reminder__isnull=True).count(), 1)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AdherenceRollup.objects.create(
+                user=self.user, period=AdherenceRollup.PERIOD_WEEK, period_start=date(2026, 1, 5),
+            )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AdherenceStreak.objects.create(user=self.user)
+
+    def test_acknowledgements_update_rollups(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('authentication:api_reminder_acknowledge'),
+            json.dumps({'acknowledgements': [{'reminder_id': self.reminder.pk}]}), content_type='application/json',
+        )
+        response = self.client.get(reverse('authentication:api_reminder_adherence'), {'weeks': 1})
+        overall = response.json()['overall']
+        self.assertEqual(overall['taken'], 1)
+        self.assertEqual(overall['current_streak'], 1)
+
+
+class AdherencePauseTests(TestCase):
+    """Pauses, deletions, partial streak refreshes and per-reminder time zones."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='customer')
+        self.reminder = self.create_reminder('A', datetime(2026, 1, 5, 9, 0, tzinfo=dt_timezone.utc))
+
+    def at(self, day, hour=9):
+        return mock.patch('django.utils.timezone.now', return_value=datetime(2026, 1, day, hour, 0, tzinfo=dt_timezone.utc))
+
+    def create_reminder(self, name, created, **kwargs):
+        with mock.patch('django.utils.timezone.now', return_value=created):
+            return Reminder.objects.create(user=self.user, medicine_name=name, times='08:00', **kwargs)
+
+    def set_active(self, day, active, **fields):
+        with self.at(day):
+            self.reminder.active = active
+            for name, value in fields.items():
+                setattr(self.reminder, name, value)
+            self.reminder.save()
+
+    def week(self, reminder=None):
+        with self.at(15):
+            rebuild_rollups([self.user.pk], [date(2026, 1, 5), date(2026, 1, 12)])
+            refresh_streaks(self.user.pk)
+        rows = AdherenceRollup.objects.filter(user=self.user, reminder=reminder, period=AdherenceRollup.PERIOD_DAY)
+        return sorted(day.day for day in rows.values_list('period_start', flat=True))
+
+    def test_paused_days_are_not_due(self):
+        self.set_active(7, False)
+        self.set_active(12, True)
+        # Switched off on the 7th and back on the 12th; the 15th is today
+        self.assertEqual(self.week(self.reminder), [5, 6, 7, 12, 13, 14])
+
+    def test_editing_an_inactive_reminder_does_not_extend_it(self):
+        self.set_active(7, False)
+        self.set_active(12, False, notes='Edited')
+        self.assertEqual(self.week(self.reminder), [5, 6, 7])
+        self.assertEqual(self.reminder.pauses.count(), 1)
+
+    def test_reactivating_the_same_day_leaves_no_pause(self):
+        self.set_active(7, False)
+        self.set_active(7, True)
+        self.assertFalse(self.reminder.pauses.exists())
+        self.assertEqual(self.week(self.reminder), list(range(5, 15)))
+
+    def test_logged_days_count_even_while_paused(self):
+        self.set_active(7, False)
+        ReminderLog.objects.create(reminder=self.reminder, date=date(2026, 1, 10), taken=True)
+        self.assertEqual(self.week(self.reminder), [5, 6, 7, 10])
+
+    def test_deleting_a_reminder_rebuilds_the_user_rollups(self):
+        other = self.create_reminder('B', datetime(2026, 1, 12, 9, 0, tzinfo=dt_timezone.utc))
+        self.week()
+        overall = AdherenceRollup.objects.filter(
+            user=self.user, reminder__isnull=True, period=AdherenceRollup.PERIOD_WEEK, period_start=date(2026, 1, 12),
+        )
+        self.assertEqual(overall.get().scheduled, 3 + 3)
+        with self.at(15):
+            other.delete()
+        self.assertEqual(overall.get().scheduled, 3)
+
+    def test_streaks_of_other_reminders_are_left_alone(self):
+        other = self.create_reminder('B', datetime(2026, 1, 5, 9, 0, tzinfo=dt_timezone.utc))
+        self.week()
+        AdherenceStreak.objects.filter(reminder=other).update(current=99)
+        streak_ids = set(AdherenceStreak.objects.values_list('id', flat=True))
+        ReminderLog.objects.create(reminder=self.reminder, date=date(2026, 1, 14), taken=True)
+        with self.at(15):
+            refresh_adherence(self.user.pk, {date(2026, 1, 14)}, [self.reminder.pk])
+        self.assertEqual(set(AdherenceStreak.objects.values_list('id', flat=True)), streak_ids)
+        self.assertEqual(AdherenceStreak.objects.get(reminder=other).current, 99)
+        self.assertEqual(AdherenceStreak.objects.get(reminder=self.reminder).current, 1)
+
+    def test_nightly_rollup_uses_each_reminder_date(self):
+        self.set_active(7, False)
+        with self.at(15):
+            call_command('rollup_adherence', '--full', stdout=io.StringIO())
+        rows = AdherenceRollup.objects.filter(reminder=self.reminder, period=AdherenceRollup.PERIOD_DAY)
+        self.assertEqual(sorted(day.day for day in rows.values_list('period_start', flat=True)), [5, 6, 7])
+        self.assertEqual(AdherenceStreak.objects.filter(user=self.user).count(), 2)
+
+    def test_days_follow_the_reminder_time_zone(self):
+        # 12:00 UTC on the 15th is already the 16th in Kiritimati (UTC+14)
+        ahead = self.create_reminder(
+            'B', datetime(2026, 1, 12, 9, 0, tzinfo=dt_timezone.utc), timezone='Pacific/Kiritimati',
+        )
+        with self.at(15, hour=12):
+            rebuild_rollups([self.user.pk], [date(2026, 1, 12)])
+        days = AdherenceRollup.objects.filter(reminder=ahead, period=AdherenceRollup.PERIOD_DAY)
+        self.assertEqual(sorted(day.day for day in days.values_list('period_start', flat=True)), [12, 13, 14, 15])
+
+        self.client.force_login(self.user)
+        with self.at(15, hour=12):
+            self.client.post(reverse('authentication:reminder_mark_taken', args=[ahead.pk]))
+            summary = adherence_summary(self.user, weeks=1)
+        self.assertEqual(ReminderLog.objects.get(reminder=ahead).date, date(2026, 1, 16))
+        entry = next(entry for entry in summary['reminders'] if entry['id'] == ahead.pk)
+        self.assertEqual(entry['current_streak'], 1)
+
+
+class ReminderLogArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='customer')
+        self.reminder = Reminder.objects.create(user=self.user, medicine_name='A', times='08:00')
+        ReminderLog.objects.bulk_create([
+            ReminderLog(reminder=self.reminder, date=date(2025, 1, 1) + timedelta(days=day), taken=day % 3 != 0)
+            for day in range(90) if day != 40
+        ])
+
+    def read(self):
+        return sorted(reminder_log_days(date(2025, 1, 1), date(2025, 3, 31), user_id=self.user.pk))
+
+    def test_compaction_keeps_history_readable(self):
+        history = self.read()
+        folded, written = compact_reminder_logs(before=date(2025, 3, 15))
+        self.assertEqual((folded, written), (58, 2))
+        self.assertEqual(ReminderLog.objects.count(), 31)
+        self.assertEqual(self.read(), history)
+
+    def test_live_rows_override_archived_bits(self):
+        compact_reminder_logs(before=date(2025, 2, 1))
+        ReminderLog.objects.create(reminder=self.reminder, date=date(2025, 1, 1), taken=True)
+        self.assertIn((self.reminder.pk, date(2025, 1, 1), True), self.read())
+
+        # Compacting again merges the new row into the existing archive row
+        compact_reminder_logs(before=date(2025, 2, 1))
+        archive = ReminderLogArchive.objects.get(reminder=self.reminder, month=date(2025, 1, 1))
+        self.assertEqual(archive.logged, (1 << 31) - 1)
+        self.assertTrue(archive.taken & 1)
+        self.assertIn((self.reminder.pk, date(2025, 1, 1), True), self.read())
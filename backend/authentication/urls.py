@@ -15,6 +15,8 @@ urlpatterns = [
     path('pharmacy/inventory/', views.inventory_list_view, name='inventory_list'),
     path('pharmacy/inventory/add/', views.inventory_add_view, name='inventory_add'),
     path('pharmacy/inventory/bulk-upload/', views.bulk_medicine_upload_view, name='bulk_medicine_upload'),
+    path('pharmacy/inventory/export/', views.inventory_export_view, name='inventory_export'),
+    path('pharmacy/inventory/imports/<int:pk>/errors/', views.import_job_errors_view, name='import_job_errors'),
     path('pharmacy/inventory/<int:pk>/edit/', views.inventory_edit_view, name='inventory_edit'),
     path('pharmacy/inventory/<int:pk>/delete/', views.inventory_delete_view, name='inventory_delete'),
     
@@ -34,4 +36,12 @@ urlpatterns = [
     # API routes (no CORS)
     path('api/login/', views.api_login, name='api_login'),
     path('api/signup/', views.api_signup, name='api_signup'),
+    path('api/medicines/search/', views.api_medicine_search, name='api_medicine_search'),
+    path('api/medicines/autocomplete/', views.api_medicine_autocomplete, name='api_medicine_autocomplete'),
+    path('api/medicines/basket/', views.api_basket_search, name='api_basket_search'),
+    path('api/inventory/sync/', views.api_inventory_sync, name='api_inventory_sync'),
+    path('api/reminders/acknowledge/', views.api_reminder_acknowledge, name='api_reminder_acknowledge'),
+    path('api/reminders/adherence/', views.api_reminder_adherence, name='api_reminder_adherence'),
+    path('api/imports/<int:pk>/', views.import_job_status_view, name='import_job_status'),
+    path('api/search/cache-stats/', views.search_cache_stats_view, name='search_cache_stats'),
 ]
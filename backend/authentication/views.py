@@ -1,17 +1,39 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.db.models import FloatField, Min, Q
+from django.db.models.functions import Cast
 from webpush import send_user_notification
 from .forms import (
     UserRegistrationForm, UserLoginForm, PharmacyLocationForm, 
     MedicineForm, InventoryForm, CustomerLocationForm, MedicineSearchForm,
-    BulkMedicineUploadForm, ReminderForm, PrescriptionUploadForm
+    BasketSearchForm, BulkMedicineUploadForm, InventoryFilterForm, ReminderForm, PrescriptionUploadForm
 )
-from .models import User, PharmacyLocation, Medicine, Inventory, CustomerLocation, Reminder, ReminderLog, Prescription
-import math
+from .models import (
+    User, PharmacyLocation, Medicine, Inventory, InventoryTombstone, CustomerLocation, ImportJob, Reminder, ReminderLog,
+    Prescription,
+)
+from .geo import box_location_filter, haversine_km_array, nearby_location_filter, nearest_within
+from .search import cached_candidates, cache_stats, medicine_name_filter
+from .catalog import medicine_names
+from .adherence import ADHERENCE_WEEKS, adherence_summary
+from .reminders import AcknowledgementError, parse_acknowledgements, record_acknowledgements
+from .sync import (
+    SYNC_MAX_PAGE_SIZE, SYNC_PAGE_SIZE, SyncError, apply_deltas, changes_since, decode_watermark, parse_deltas,
+)
+from datetime import date, datetime
+from decimal import Decimal
+import base64
+import binascii
+import csv
+import heapq
+import json
+import numpy as np
 
 def signup_view(request):
     if request.user.is_authenticated:
@@ -78,8 +100,8 @@ def homepage_view(request):
 
         inventory_items = Inventory.objects.filter(pharmacy=request.user)
         context['inventory_items'] = inventory_items
-        context['total_items'] = inventory_items.count()
-        context['available_items'] = inventory_items.filter(is_available=True).count()
+        # One aggregate query for every dashboard count
+        context.update(inventory_items.dashboard_stats())
     else:
         # Get customer location
         try:
@@ -90,10 +112,14 @@ def homepage_view(request):
 
         # Load active reminders for overlay
         reminders = Reminder.objects.filter(user=request.user, active=True).order_by('medicine_name')
-        # Build 'taken today' map
-        from datetime import date
-        today = date.today()
-        taken_ids = [log.reminder_id for log in ReminderLog.objects.filter(reminder__in=reminders, date=today, taken=True)]
+        # Build 'taken today' map, today being each reminder's own date
+        todays = {reminder.pk: reminder.local_today() for reminder in reminders}
+        taken_ids = [
+            reminder_id for reminder_id, day in ReminderLog.objects.filter(
+                reminder__in=reminders, date__in=set(todays.values()), taken=True,
+            ).values_list('reminder_id', 'date')
+            if todays[reminder_id] == day
+        ]
         context['reminders'] = reminders
         context['reminders_taken_today_ids'] = taken_ids
 
@@ -128,6 +154,71 @@ def pharmacy_location_view(request):
     })
 
 # Inventory Management
+# Rows listed in each inventory warning panel; the rest are counted
+WARNING_PANEL_LIMIT = 20
+INVENTORY_PAGE_SIZE = 50
+
+# sort option -> (field, descending, cursor value parser); every ordering
+# ends with the primary key so keyset cursors are unambiguous
+INVENTORY_SORTS = {
+    'name': ('medicine_name', False, str),
+    'quantity': ('quantity', False, int),
+    'expiry': ('expiry_date', False, lambda value: date.fromisoformat(value)),
+    'price': ('price', False, Decimal),
+    'updated': ('updated_at', True, lambda value: datetime.fromisoformat(value)),
+}
+
+def encode_inventory_cursor(value, pk):
+    if value is not None and not isinstance(value, (str, int)):
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode()
+
+def decode_inventory_cursor(cursor, sort):
+    value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    parse = INVENTORY_SORTS[sort][2]
+    return (None if value is None else parse(value)), int(pk)
+
+def inventory_page(items, sort, cursor=None, limit=INVENTORY_PAGE_SIZE):
+    """Return (page, next_cursor) using keyset pagination.
+
+    Rows after ``cursor`` are found with a WHERE on (sort value, id) rather
+    than OFFSET, so every page costs the same however deep it is. Items
+    without an expiry date sort last under 'expiry'; they are read as a
+    second range so both halves can walk the (pharmacy, expiry_date, id)
+    index.
+    """
+    field, descending, _ = INVENTORY_SORTS[sort]
+    value, pk = cursor if cursor is not None else (None, None)
+    page = []
+
+    if descending:
+        items = items.order_by(f'-{field}', '-id')
+        if cursor is not None:
+            items = items.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+        page = list(items[:limit + 1])
+    else:
+        nullable = field == 'expiry_date'
+        if cursor is None or value is not None:
+            ranged = items.order_by(field, 'id')
+            if nullable:
+                ranged = ranged.filter(**{f'{field}__isnull': False})
+            if cursor is not None:
+                ranged = ranged.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+            page = list(ranged[:limit + 1])
+            pk = None
+        if nullable and len(page) <= limit:
+            tail = items.filter(**{f'{field}__isnull': True}).order_by('id')
+            if pk is not None:
+                tail = tail.filter(id__gt=pk)
+            page += list(tail[:limit + 1 - len(page)])
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_inventory_cursor(getattr(last, field), last.pk)
+    return page, next_cursor
+
 @login_required
 def inventory_list_view(request):
     if not request.user.is_pharmacy:
@@ -136,16 +227,49 @@ def inventory_list_view(request):
     
     inventory_items = Inventory.objects.filter(pharmacy=request.user).select_related('medicine')
 
-    # Gather low stock and expiry warnings
-    low_stock_items = [item for item in inventory_items if item.is_low_stock]
-    expiring_soon_items = [item for item in inventory_items if item.is_expiring_soon and not item.is_expired]
-    expired_items = [item for item in inventory_items if item.is_expired]
+    # Warning counts come from one aggregate; only the rows shown in the
+    # warning panels are fetched
+    today = date.today()
+    stats = inventory_items.dashboard_stats(today)
+    warning_items = inventory_items.only('quantity', 'expiry_date', 'medicine__name')
+    low_stock_items = warning_items.low_stock().order_by('quantity', 'id')[:WARNING_PANEL_LIMIT] if stats['low_stock_count'] else []
+    expiring_soon_items = warning_items.expiring_soon(today).order_by('expiry_date', 'id')[:WARNING_PANEL_LIMIT] if stats['expiring_soon_count'] else []
+    expired_items = warning_items.expired(today).order_by('expiry_date', 'id')[:WARNING_PANEL_LIMIT] if stats['expired_count'] else []
+
+    filter_form = InventoryFilterForm(request.GET)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {'q': '', 'status': '', 'category': '', 'sort': 'name'}
+    if filters['q']:
+        inventory_items = inventory_items.name_startswith(filters['q'])
+    if filters['category']:
+        inventory_items = inventory_items.filter(medicine__category__iexact=filters['category'])
+    if filters['status'] == 'low':
+        inventory_items = inventory_items.low_stock()
+    elif filters['status'] == 'expiring':
+        inventory_items = inventory_items.expiring_soon(today)
+    elif filters['status'] == 'expired':
+        inventory_items = inventory_items.expired(today)
+
+    try:
+        cursor = decode_inventory_cursor(request.GET['after'], filters['sort']) if request.GET.get('after') else None
+    except (ValueError, TypeError, UnicodeDecodeError, binascii.Error, ArithmeticError):
+        cursor = None
+    page, next_cursor = inventory_page(inventory_items, filters['sort'], cursor)
+
+    # Filter parameters carried over to the next-page link
+    query = request.GET.copy()
+    query.pop('after', None)
 
     return render(request, 'authentication/inventory_list.html', {
-        'inventory_items': inventory_items,
+        'inventory_items': page,
         'low_stock_items': low_stock_items,
         'expiring_soon_items': expiring_soon_items,
         'expired_items': expired_items,
+        'filter_form': filter_form,
+        'is_filtered': any(filters[key] for key in ('q', 'status', 'category')),
+        'is_first_page': cursor is None,
+        'next_cursor': next_cursor,
+        'page_query': query.urlencode(),
+        **stats,
     })
 
 @login_required
@@ -304,57 +428,128 @@ def medicine_search_view(request):
 
 def search_medicine_nearby(medicine_name, lat, lng, max_distance):
     """Search for medicine in nearby pharmacies"""
-    # Simple distance calculation (Haversine formula)
-    def calculate_distance(lat1, lng1, lat2, lng2):
-        R = 6371  # Earth's radius in kilometers
-        
-        lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return R * c
-    
-    # Search for medicine
-    medicine_query = Q(name__icontains=medicine_name) | Q(generic_name__icontains=medicine_name)
-    medicines = Medicine.objects.filter(medicine_query)
-    
+    inventory_items, similarity = cached_candidates(
+        medicine_name, lat, lng, max_distance, fetch_search_candidates
+    )
+    results = rank_by_distance(inventory_items, lat, lng, max_distance)
+    if similarity:
+        # Typo fallback: best name match first, nearest first within each medicine
+        results.sort(key=lambda result: -similarity[result['medicine'].pk])
+    return results
+
+def fetch_search_candidates(medicine_name, box):
+    """In-stock inventory matching ``medicine_name`` at pharmacies inside ``box``.
+
+    Returns ``(inventory_items, similarity)``; ``similarity`` maps medicine
+    ids to name similarity when nothing in the catalog matched the typed
+    name and the closest spellings were used instead.
+    """
+    inventory_items = list(nearby_inventory(medicine_name_filter(medicine_name, prefix='medicine__'), box))
+    similarity = {}
+    if not inventory_items and not Medicine.objects.filter(medicine_name_filter(medicine_name)).exists():
+        similarity = dict(medicine_names.match(medicine_name))
+        if similarity:
+            inventory_items = list(nearby_inventory(Q(medicine_id__in=similarity), box))
+    return inventory_items, similarity
+
+def nearby_inventory(medicine_filter, box):
+    """In-stock inventory matching ``medicine_filter`` at active pharmacies inside ``box``"""
+    # One joined query: Inventory -> Medicine -> User -> PharmacyLocation.
+    # Only pharmacies in grid cells overlapping the box are loaded.
+    return Inventory.objects.filter(
+        medicine_filter,
+        is_available=True,
+        quantity__gt=0,
+        pharmacy__pharmacy_location__is_active=True,
+        **box_location_filter(box, prefix='pharmacy__pharmacy_location__')
+    ).select_related('medicine', 'pharmacy', 'pharmacy__pharmacy_location').annotate(
+        # Cast in SQL so the coordinates arrive as floats rather than Decimals
+        location_lat=Cast('pharmacy__pharmacy_location__latitude', FloatField()),
+        location_lng=Cast('pharmacy__pharmacy_location__longitude', FloatField()),
+    )
+
+def rank_by_distance(inventory_items, lat, lng, max_distance):
+    """Result rows for the items within ``max_distance`` km, nearest first"""
+    lats = np.fromiter((item.location_lat for item in inventory_items), dtype=np.float64, count=len(inventory_items))
+    lngs = np.fromiter((item.location_lng for item in inventory_items), dtype=np.float64, count=len(inventory_items))
+
+    # Distances computed in one vectorized pass, nearest first
+    indices, distances = nearest_within(lat, lng, lats, lngs, max_distance)
+
     results = []
-    for medicine in medicines:
-        # Find pharmacies with this medicine
-        inventory_items = Inventory.objects.filter(
-            medicine=medicine,
-            is_available=True,
-            quantity__gt=0
-        ).select_related('pharmacy', 'pharmacy__pharmacy_location')
-        
-        for item in inventory_items:
-            try:
-                pharmacy_location = item.pharmacy.pharmacy_location
-                if pharmacy_location and pharmacy_location.is_active:
-                    distance = calculate_distance(
-                        lat, lng, 
-                        float(pharmacy_location.latitude), 
-                        float(pharmacy_location.longitude)
-                    )
-                    
-                    if distance <= max_distance:
-                        results.append({
-                            'pharmacy': item.pharmacy,
-                            'pharmacy_location': pharmacy_location,
-                            'medicine': medicine,
-                            'inventory_item': item,
-                            'distance': round(distance, 2)
-                        })
-            except PharmacyLocation.DoesNotExist:
-                continue
-    
-    # Sort by distance
-    results.sort(key=lambda x: x['distance'])
+    for index, distance in zip(indices.tolist(), distances.tolist()):
+        item = inventory_items[index]
+        results.append({
+            'pharmacy': item.pharmacy,
+            'pharmacy_location': item.pharmacy.pharmacy_location,
+            'medicine': item.medicine,
+            'inventory_item': item,
+            'distance': round(distance, 2)
+        })
+    return results
+
+def search_basket_nearby(terms, lat, lng, max_distance):
+    """Rank nearby pharmacies by how many of ``terms`` they stock, then by
+    the total of the cheapest match for each term, then by distance.
+
+    A single grouped query returns one row per pharmacy with the cheapest
+    in-stock price of each term, one filtered MIN per term, so a
+    combination product matching several terms counts toward all of them.
+    Pharmacies outside the radius are dropped by the vectorized distance
+    filter.
+    """
+    term_filters = [medicine_name_filter(term, prefix='medicine__') for term in terms]
+    any_term = Q()
+    for term_filter in term_filters:
+        any_term |= term_filter
+
+    rows = Inventory.objects.filter(
+        any_term,
+        is_available=True,
+        quantity__gt=0,
+        pharmacy__pharmacy_location__is_active=True,
+        **nearby_location_filter(lat, lng, max_distance, prefix='pharmacy__pharmacy_location__')
+    ).annotate(
+        location_lat=Cast('pharmacy__pharmacy_location__latitude', FloatField()),
+        location_lng=Cast('pharmacy__pharmacy_location__longitude', FloatField()),
+    ).values('pharmacy_id', 'location_lat', 'location_lng').annotate(**{
+        f'term_{index}': Min('price', filter=term_filter) for index, term_filter in enumerate(term_filters)
+    }).order_by()
+
+    pharmacies = {}
+    for row in rows:
+        pharmacies[row['pharmacy_id']] = {
+            'lat': row['location_lat'],
+            'lng': row['location_lng'],
+            'prices': {
+                term: row[f'term_{index}'] for index, term in enumerate(terms) if row[f'term_{index}'] is not None
+            },
+        }
+
+    pharmacy_ids = list(pharmacies)
+    lats = np.fromiter((pharmacies[pk]['lat'] for pk in pharmacy_ids), dtype=np.float64, count=len(pharmacy_ids))
+    lngs = np.fromiter((pharmacies[pk]['lng'] for pk in pharmacy_ids), dtype=np.float64, count=len(pharmacy_ids))
+    indices, distances = nearest_within(lat, lng, lats, lngs, max_distance)
+
+    results = []
+    for index, distance in zip(indices.tolist(), distances.tolist()):
+        prices = pharmacies[pharmacy_ids[index]]['prices']
+        results.append({
+            'pharmacy_id': pharmacy_ids[index],
+            'distance': round(distance, 2),
+            'covered': len(prices),
+            'total_price': sum(prices.values()),
+            'prices': prices,
+            'missing': [term for term in terms if term not in prices],
+        })
+    results.sort(key=lambda result: (-result['covered'], result['total_price'], result['distance']))
     return results
 
+@staff_member_required
+def search_cache_stats_view(request):
+    """Hit/miss counters of the nearby-search cache, for this worker process only"""
+    return JsonResponse({'success': True, 'stats': cache_stats()})
+
 # API endpoints
 def api_login(request):
     """API endpoint for login (no CORS)"""
@@ -437,9 +632,231 @@ def api_signup(request):
     
     return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
 
+AUTOCOMPLETE_LIMIT = 10
+
+@cache_control(public=True, max_age=300)
+def api_medicine_autocomplete(request):
+    """API endpoint suggesting medicine names for a prefix, served from memory"""
+    prefix = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 50)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    if not prefix or limit < 1:
+        return JsonResponse({'success': True, 'suggestions': []})
+    return JsonResponse({'success': True, 'suggestions': medicine_names.complete(prefix, limit=limit)})
+
+BASKET_RESULTS_LIMIT = 20
+
+@login_required
+def api_basket_search(request):
+    """API endpoint finding nearby pharmacies that stock a whole prescription"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    if request.user.is_pharmacy:
+        return JsonResponse({'success': False, 'message': 'This feature is for customers only.'}, status=403)
+
+    form = BasketSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors.get_json_data()}, status=400)
+
+    terms = form.cleaned_data['medicine_names']
+    if form.cleaned_data.get('prescription'):
+        prescription = get_object_or_404(Prescription, pk=form.cleaned_data['prescription'], user=request.user)
+        terms += [name for name in medicine_names.names_in_text(prescription.extracted_text) if name not in terms]
+        terms = terms[:BasketSearchForm.MAX_MEDICINES]
+    if not terms:
+        return JsonResponse({'success': False, 'message': 'No known medicines found in this prescription.'}, status=400)
+
+    try:
+        customer_location = request.user.customer_location
+    except CustomerLocation.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Please set your location first to search for medicines.'}, status=400)
+
+    ranked = search_basket_nearby(
+        terms, customer_location.latitude, customer_location.longitude, form.cleaned_data['max_distance']
+    )[:BASKET_RESULTS_LIMIT]
+    locations = PharmacyLocation.objects.in_bulk([result['pharmacy_id'] for result in ranked], field_name='user_id')
+
+    results = []
+    for result in ranked:
+        location = locations[result['pharmacy_id']]
+        results.append({
+            'pharmacy': {
+                'name': location.name,
+                'address': location.address,
+                'phone': location.phone,
+                'latitude': float(location.latitude),
+                'longitude': float(location.longitude),
+            },
+            'distance': result['distance'],
+            'covered': result['covered'],
+            'total_price': f"{result['total_price']:.2f}",
+            'prices': {term: f'{price:.2f}' for term, price in result['prices'].items()},
+            'missing': result['missing'],
+        })
+
+    return JsonResponse({'success': True, 'medicines': terms, 'results': results})
+
+SEARCH_API_PAGE_SIZE = 20
+SEARCH_API_MAX_PAGE_SIZE = 100
+
+def encode_search_cursor(distance, pk):
+    return base64.urlsafe_b64encode(f'{distance!r}:{pk}'.encode()).decode()
+
+def decode_search_cursor(cursor):
+    distance, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+    return float(distance), int(pk)
+
+@login_required
+def api_medicine_search(request):
+    """API endpoint returning the nearest matches for a medicine, one page at a time.
+
+    Results are ordered by (distance, inventory id). Each page is the
+    ``limit`` smallest entries after the cursor, picked with a heap, so the
+    full result list is never sorted.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    if request.user.is_pharmacy:
+        return JsonResponse({'success': False, 'message': 'This feature is for customers only.'}, status=403)
+
+    form = MedicineSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors.get_json_data()}, status=400)
+    medicine_name = form.cleaned_data['medicine_name']
+    max_distance = form.cleaned_data['max_distance']
+
+    try:
+        limit = min(int(request.GET.get('limit', SEARCH_API_PAGE_SIZE)), SEARCH_API_MAX_PAGE_SIZE)
+        after = decode_search_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return JsonResponse({'success': False, 'message': 'Invalid limit or cursor'}, status=400)
+    if limit < 1:
+        return JsonResponse({'success': False, 'message': 'Invalid limit or cursor'}, status=400)
+
+    try:
+        customer_location = request.user.customer_location
+    except CustomerLocation.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Please set your location first to search for medicines.'}, status=400)
+    lat, lng = customer_location.latitude, customer_location.longitude
+
+    inventory_items, similarity = cached_candidates(
+        medicine_name, lat, lng, max_distance, fetch_search_candidates
+    )
+    lats = np.fromiter((item.location_lat for item in inventory_items), dtype=np.float64, count=len(inventory_items))
+    lngs = np.fromiter((item.location_lng for item in inventory_items), dtype=np.float64, count=len(inventory_items))
+    distances = haversine_km_array(lat, lng, lats, lngs).tolist()
+
+    def remaining():
+        for index, distance in enumerate(distances):
+            if distance > max_distance:
+                continue
+            key = (distance, inventory_items[index].pk)
+            if after is None or key > after:
+                yield key + (index,)
+
+    # One extra entry tells us whether there is a next page
+    page = heapq.nsmallest(limit + 1, remaining())
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    results = []
+    for distance, pk, index in page:
+        item = inventory_items[index]
+        location = item.pharmacy.pharmacy_location
+        results.append({
+            'distance': round(distance, 2),
+            'pharmacy': {
+                'name': location.name,
+                'address': location.address,
+                'phone': location.phone,
+                'latitude': float(location.latitude),
+                'longitude': float(location.longitude),
+            },
+            'medicine': {
+                'id': item.medicine.pk,
+                'name': item.medicine.name,
+                'generic_name': item.medicine.generic_name,
+                'similarity': similarity.get(item.medicine.pk),
+            },
+            'inventory': {
+                'id': item.pk,
+                'quantity': item.quantity,
+                'price': str(item.price),
+                'expiry_date': item.expiry_date.isoformat() if item.expiry_date else None,
+            },
+        })
+
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'next_cursor': encode_search_cursor(page[-1][0], page[-1][1]) if has_more else None,
+    })
+
+@login_required
+def api_inventory_sync(request):
+    """Incremental inventory sync for POS systems.
+
+    GET pulls rows changed or deleted since the ``since`` watermark returned
+    by the previous pull (omit it for a full initial sync); deletions come
+    back as ``{"medicine_id": 1, "deleted": true}``. POST pushes a JSON body
+    like ``{"changes": [{"medicine_id": 1, "quantity_delta": -2,
+    "price_delta": "0.50"}]}``, applied all or nothing.
+    """
+    if not request.user.is_pharmacy:
+        return JsonResponse({'success': False, 'message': 'Pharmacy account required.'}, status=403)
+    
+    if request.method == 'POST':
+        try:
+            payload = json.loads(request.body)
+            deltas = parse_deltas(payload.get('changes') if isinstance(payload, dict) else None)
+            updated = apply_deltas(request.user, deltas)
+        except ValueError as e:
+            # SyncError lists every rejected change; anything else is malformed JSON
+            errors = e.errors if isinstance(e, SyncError) else ['Request body must be valid JSON']
+            return JsonResponse({'success': False, 'errors': errors}, status=400)
+        return JsonResponse({'success': True, 'updated': updated})
+    
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    
+    try:
+        limit = min(int(request.GET.get('limit', SYNC_PAGE_SIZE)), SYNC_MAX_PAGE_SIZE)
+        since = decode_watermark(request.GET['since']) if request.GET.get('since') else None
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return JsonResponse({'success': False, 'message': 'Invalid limit or watermark'}, status=400)
+    if limit < 1:
+        return JsonResponse({'success': False, 'message': 'Invalid limit or watermark'}, status=400)
+    
+    changes, next_since, has_more = changes_since(request.user, since, limit)
+    return JsonResponse({
+        'success': True,
+        'changes': [{
+            'medicine_id': change.medicine_id,
+            'deleted': True,
+            'updated_at': change.deleted_at.isoformat(),
+        } if isinstance(change, InventoryTombstone) else {
+            'medicine_id': change.medicine_id,
+            'medicine_name': change.medicine.name,
+            'quantity': change.quantity,
+            'price': f'{change.price:.2f}',
+            'is_available': change.is_available,
+            'expiry_date': change.expiry_date.isoformat() if change.expiry_date else None,
+            'deleted': False,
+            'updated_at': change.updated_at.isoformat(),
+        } for change in changes],
+        'since': next_since,
+        'has_more': has_more,
+    })
+
 @login_required
 def bulk_medicine_upload_view(request):
-    """View for bulk uploading medicines via Excel file"""
+    """View for bulk uploading medicines via Excel or CSV file.
+
+    The file is stored as an ImportJob and processed by the
+    run_import_worker command; the page then polls the job's status.
+    """
     if not request.user.is_pharmacy:
         messages.error(request, 'Access denied. Pharmacy account required.')
         return redirect('authentication:homepage')
@@ -447,111 +864,103 @@ def bulk_medicine_upload_view(request):
     if request.method == 'POST':
         form = BulkMedicineUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            excel_file = form.cleaned_data['excel_file']
-            
-            try:
-                # Import pandas and openpyxl for Excel processing
-                import pandas as pd
-                
-                # Read Excel file
-                df = pd.read_excel(excel_file)
-                
-                # Validate required columns
-                required_columns = ['medicine_name', 'quantity', 'price']
-                optional_columns = ['generic_name', 'description', 'category', 'expiry_date', 'is_available']
-                
-                missing_columns = [col for col in required_columns if col not in df.columns]
-                if missing_columns:
-                    messages.error(request, f'Missing required columns: {", ".join(missing_columns)}')
-                    return render(request, 'authentication/bulk_medicine_upload.html', {'form': form})
-                
-                # Process each row
-                created_medicines = 0
-                created_inventory = 0
-                errors = []
-                
-                for index, row in df.iterrows():
-                    try:
-                        # Create or get medicine
-                        medicine_name = str(row['medicine_name']).strip()
-                        generic_name = str(row.get('generic_name', '')).strip() if pd.notna(row.get('generic_name')) else ''
-                        description = str(row.get('description', '')).strip() if pd.notna(row.get('description')) else ''
-                        category = str(row.get('category', 'General')).strip() if pd.notna(row.get('category')) else 'General'
-                        
-                        if not medicine_name or medicine_name.lower() == 'nan':
-                            errors.append(f'Row {index + 2}: Medicine name is required')
-                            continue
-                        
-                        medicine, medicine_created = Medicine.objects.get_or_create(
-                            name=medicine_name,
-                            defaults={
-                                'generic_name': generic_name,
-                                'description': description,
-                                'category': category
-                            }
-                        )
-                        
-                        if medicine_created:
-                            created_medicines += 1
-                        
-                        # Create or update inventory
-                        quantity = int(row['quantity']) if pd.notna(row['quantity']) else 0
-                        price = float(row['price']) if pd.notna(row['price']) else 0.0
-                        is_available = bool(row.get('is_available', True)) if pd.notna(row.get('is_available')) else True
-                        expiry_date = pd.to_datetime(row['expiry_date']).date() if pd.notna(row.get('expiry_date')) else None
-                        
-                        if quantity < 0:
-                            errors.append(f'Row {index + 2}: Quantity cannot be negative')
-                            continue
-                        
-                        if price < 0:
-                            errors.append(f'Row {index + 2}: Price cannot be negative')
-                            continue
-                        
-                        inventory, inventory_created = Inventory.objects.update_or_create(
-                            pharmacy=request.user,
-                            medicine=medicine,
-                            defaults={
-                                'quantity': quantity,
-                                'price': price,
-                                'is_available': is_available,
-                                'expiry_date': expiry_date
-                            }
-                        )
-                        
-                        if inventory_created:
-                            created_inventory += 1
-                    
-                    except Exception as e:
-                        errors.append(f'Row {index + 2}: {str(e)}')
-                        continue
-                
-                # Show results
-                success_msg = f'Successfully processed: {created_medicines} new medicines, {created_inventory} inventory items'
-                messages.success(request, success_msg)
-                
-                if errors:
-                    error_msg = f'{len(errors)} errors occurred: ' + '; '.join(errors[:5])
-                    if len(errors) > 5:
-                        error_msg += f' and {len(errors) - 5} more...'
-                    messages.warning(request, error_msg)
-                
-                return redirect('authentication:inventory_list')
-                
-            except ImportError:
-                messages.error(request, 'Excel processing libraries not installed. Please install pandas and openpyxl.')
-                return render(request, 'authentication/bulk_medicine_upload.html', {'form': form})
-            
-            except Exception as e:
-                messages.error(request, f'Error processing file: {str(e)}')
-                return render(request, 'authentication/bulk_medicine_upload.html', {'form': form})
+            upload = form.cleaned_data['excel_file']
+            job = ImportJob.objects.create(pharmacy=request.user, file=upload, file_name=upload.name)
+            messages.success(request, f'{upload.name} uploaded. It is being processed in the background.')
+            return redirect(f"{reverse('authentication:bulk_medicine_upload')}?job={job.pk}")
     else:
         form = BulkMedicineUploadForm()
     
-    return render(request, 'authentication/bulk_medicine_upload.html', {'form': form})
+    job = None
+    if request.GET.get('job', '').isdigit():
+        job = ImportJob.objects.filter(pk=request.GET['job'], pharmacy=request.user).first()
+    recent_jobs = ImportJob.objects.filter(pharmacy=request.user).defer('error_rows')[:5]
+    
+    return render(request, 'authentication/bulk_medicine_upload.html', {
+        'form': form,
+        'job': job,
+        'recent_jobs': recent_jobs,
+    })
+
+def import_job_data(job):
+    return {
+        'id': job.pk,
+        'file_name': job.file_name,
+        'status': job.status,
+        'finished': job.is_finished,
+        'processed_rows': job.processed_rows,
+        'failed_rows': job.failed_rows,
+        'created_medicines': job.created_medicines,
+        'created_inventory': job.created_inventory,
+        'message': job.message,
+        'errors': [f"Row {row['row']}: {row['error']}" for row in job.error_rows[:5]],
+        'errors_url': reverse('authentication:import_job_errors', args=[job.pk]) if job.failed_rows else None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+@login_required
+def import_job_status_view(request, pk):
+    """JSON progress of one of the pharmacy's bulk upload jobs."""
+    if not request.user.is_pharmacy:
+        return JsonResponse({'success': False, 'message': 'Pharmacy account required.'}, status=403)
+    job = ImportJob.objects.filter(pk=pk, pharmacy=request.user).first()
+    if job is None:
+        return JsonResponse({'success': False, 'message': 'Import job not found.'}, status=404)
+    return JsonResponse({'success': True, 'job': import_job_data(job)})
+
+@login_required
+def import_job_errors_view(request, pk):
+    """Download the rows a bulk upload rejected, as CSV."""
+    if not request.user.is_pharmacy:
+        messages.error(request, 'Access denied. Pharmacy account required.')
+        return redirect('authentication:homepage')
+    job = get_object_or_404(ImportJob, pk=pk, pharmacy=request.user)
+    from .importers import OPTIONAL_COLUMNS, REQUIRED_COLUMNS
+    
+    columns = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+    for row in job.error_rows:
+        columns += [col for col in row['values'] if col not in columns]
+    
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="import-{job.pk}-errors.csv"'
+    writer = csv.writer(response)
+    writer.writerow(['row', 'error'] + columns)
+    for row in job.error_rows:
+        writer.writerow([row['row'], row['error']] + [row['values'].get(col, '') for col in columns])
+    return response
+
+@login_required
+def inventory_export_view(request):
+    """Download the pharmacy's full inventory as CSV or Excel.
 
+    Rows are streamed from the database in chunks, so large inventories
+    are never loaded into memory at once.
+    """
+    if not request.user.is_pharmacy:
+        messages.error(request, 'Access denied. Pharmacy account required.')
+        return redirect('authentication:homepage')
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        messages.error(request, 'Unsupported export format.')
+        return redirect('authentication:inventory_list')
+    
+    from .exporters import iter_csv, write_xlsx
+    filename = f'inventory-{request.user.username}-{date.today().isoformat()}.{export_format}'
+    if export_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(request.user), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    return FileResponse(
+        write_xlsx(request.user), as_attachment=True, filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
 # --- Reminders ---
+REMINDERS_PAGE_ADHERENCE_WEEKS = 4
+MAX_ADHERENCE_WEEKS = 260
+
 @login_required
 def reminders_view(request):
     if request.user.is_pharmacy:
@@ -572,12 +981,37 @@ def reminders_view(request):
         form = ReminderForm()
 
     reminders = Reminder.objects.filter(user=request.user).order_by('-active', 'medicine_name')
+    adherence = adherence_summary(request.user, weeks=REMINDERS_PAGE_ADHERENCE_WEEKS)
+    adherence_by_reminder = {entry['id']: entry for entry in adherence['reminders']}
+    for reminder in reminders:
+        reminder.adherence = adherence_by_reminder.get(reminder.pk)
     return render(request, 'authentication/reminders.html', {
         'form': form,
         'reminders': reminders,
+        'adherence': adherence,
+        'adherence_weeks': REMINDERS_PAGE_ADHERENCE_WEEKS,
     })
 
 
+@login_required
+def api_reminder_adherence(request):
+    """Adherence over the last ``weeks`` weeks (default 52): a weekly
+    series for all reminders, plus totals and streaks per reminder."""
+    if request.user.is_pharmacy:
+        return JsonResponse({'success': False, 'message': 'Not allowed'}, status=403)
+    try:
+        weeks = int(request.GET.get('weeks', ADHERENCE_WEEKS))
+    except ValueError:
+        weeks = 0
+    if not 1 <= weeks <= MAX_ADHERENCE_WEEKS:
+        return JsonResponse({'success': False, 'message': f'weeks must be between 1 and {MAX_ADHERENCE_WEEKS}'}, status=400)
+
+    summary = adherence_summary(request.user, weeks=weeks)
+    for week in summary['weeks']:
+        week['week_start'] = week['week_start'].isoformat()
+    return JsonResponse({'success': True, **summary, 'since': summary['since'].isoformat()})
+
+
 @login_required
 def reminder_mark_taken_today(request, pk):
     if request.user.is_pharmacy:
@@ -586,14 +1020,37 @@ def reminder_mark_taken_today(request, pk):
         return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
 
     reminder = get_object_or_404(Reminder, pk=pk, user=request.user)
-    from datetime import date
-    today = date.today()
-    log, _ = ReminderLog.objects.get_or_create(reminder=reminder, date=today)
-    log.taken = True
-    log.save()
+    record_acknowledgements(request.user, {(reminder.pk, reminder.local_today()): True})
     return JsonResponse({'success': True})
 
 
+@login_required
+def api_reminder_acknowledge(request):
+    """Record many doses as taken (or not) in one request.
+
+    POST a JSON body like ``{"acknowledgements": [{"reminder_id": 1,
+    "date": "2026-01-05", "taken": true}]}``; date defaults to today in
+    the reminder's time zone and taken to true. Applied all or nothing,
+    so offline clients can replay a day of ticks in one round trip.
+    """
+    if request.user.is_pharmacy:
+        return JsonResponse({'success': False, 'message': 'Not allowed'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body)
+        acknowledgements = parse_acknowledgements(
+            payload.get('acknowledgements') if isinstance(payload, dict) else None, request.user
+        )
+        updated = record_acknowledgements(request.user, acknowledgements)
+    except ValueError as e:
+        # AcknowledgementError lists every rejected entry; anything else is malformed JSON
+        errors = e.errors if isinstance(e, AcknowledgementError) else ['Request body must be valid JSON']
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    return JsonResponse({'success': True, 'updated': updated})
+
+
 @login_required
 def reminder_delete_view(request, pk):
     """Delete a reminder owned by the current (non-pharmacy) user."""
@@ -783,8 +1240,8 @@ def notify_expiring_items(pharmacy_user):
 
 
 def notify_medicine_reminder(user, reminder):
-    """Send notification for medicine reminder to customer"""
-    send_push_notification(
+    """Send notification for medicine reminder to customer; returns whether it was sent"""
+    return send_push_notification(
         user=user,
         title=f'💊 Medicine Reminder',
         body=f'Time to take your medicine: {reminder.medicine_name}',
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -81,6 +84,62 @@ DATABASES = {
     }
 }
 
+# SQLite profile, chosen with the DJANGO_DB_PROFILE environment variable.
+# 'development' keeps Django's stock setup. 'production' keeps connections
+# open between requests, starts transactions with BEGIN IMMEDIATE (so a
+# writer waits for the lock up front instead of failing on upgrade) and
+# applies SQLITE_PRAGMAS to every new connection (authentication.signals):
+# WAL lets reads proceed during writes and synchronous=NORMAL drops the
+# per-commit fsync, which together remove most "database is locked" errors
+# under concurrent writes. Compare with `manage.py bench_sqlite_writes`.
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+SQLITE_PRAGMAS = {}
+
+# The production profile, also read by bench_sqlite_writes
+PRODUCTION_SQLITE_OPTIONS = {'transaction_mode': 'IMMEDIATE'}
+PRODUCTION_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # ms
+    'mmap_size': 256 * 1024 * 1024,  # bytes
+    'cache_size': -64000,  # negative means KiB, so ~64 MB
+    'temp_store': 'MEMORY',
+}
+
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': dict(PRODUCTION_SQLITE_OPTIONS),
+    })
+    SQLITE_PRAGMAS = dict(PRODUCTION_SQLITE_PRAGMAS)
+elif DB_PROFILE != 'development':
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_PROFILE {DB_PROFILE!r}; use 'development' or 'production'")
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# 'search' holds nearby medicine search candidates (LRU-culled, 5 minute
+# TTL). LocMemCache is per process, which is fine: the per-grid-cell
+# generations that invalidate entries are CacheGeneration rows in the
+# database, so changes made by any web worker or the import worker reach
+# every process. Hit/miss counters are not stored here; they are
+# per-process (see authentication.search).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'medicine-search',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
 CSRF_TRUSTED_ORIGINS = [
     "https://pharmacy-app-byteme.onrender.com",
 ]